@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Benchmarks for each stage of the encoder.  Every stage is timed on its own,
+# for every version and error correction level asked for, with numeric,
+# alphanumeric and byte payloads which fill the symbol, along with an end to
+# end case giving codes per second.  Results are written as JSON and may be
+# compared against an earlier run, any stage slower than the baseline by more
+# than the threshold is reported and the exit status is 1.
+#
+#   python Benchmark.py --output baseline.json
+#   python Benchmark.py --versions 1,10,27,40 --baseline baseline.json
+#   python Benchmark.py --stages error_codewords,mask_numpy --levels M
+
+from QR import QR, encode, MaskNumPy
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+# Characters used to fill each kind of payload, chosen so the whole payload
+# is a single segment in that mode.
+PAYLOAD_CHARACTERS = {
+    'numeric': '0123456789',
+    'alphanumeric': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:',
+    'byte': 'abcdefghijklmnopqrstuvwxyz',
+}
+MODE_CHARS = {'numeric': 'N', 'alphanumeric': 'A', 'byte': 'B'}
+STAGES = ('segment', 'data_codewords', 'error_codewords', 'placement',
+    'mask_apply', 'test_one', 'test_two', 'test_three', 'test_four',
+    'mask_numpy', 'mask_bitboard', 'mask_pruned', 'mask_sampled', 'format',
+    'svg', 'png', 'save_svg')
+
+
+def make_payload(mode, version, error_char):
+    # The longest single mode payload which fits version at error_char.
+    mode_char = MODE_CHARS[mode]
+    available = (QR.get_data_codeword_count(version, error_char) * 8 - 4 -
+        QR.get_count_bits(version, mode_char))
+    length = 0
+    while QR.get_bit_length(mode_char, length + 1) <= available:
+        length += 1
+    characters = PAYLOAD_CHARACTERS[mode]
+    return (characters * (length // len(characters) + 1))[:length]
+
+
+def measure(function, repeat, target):
+    # Seconds per call, the best of repeat runs each lasting about target
+    # seconds.
+    timer = timeit.Timer(function)
+    elapsed = timer.timeit(1)
+    number = max(1, int(target / elapsed)) if elapsed else 1000
+    return min(timer.repeat(repeat, number)) / number
+
+
+def get_stages(version, error_char, payload, directory):
+    # (name, callable) for every stage, each fed the output of the stage
+    # before it.
+    qr = QR(error_char, payload, version=version)
+    segments = qr.segments
+    data_codewords = qr.generate_data_codewords(version, error_char,
+        segments)
+    data_blocks = qr.get_blocks(version, error_char, data_codewords)
+    codewords = qr.get_stream(version, error_char, segments)
+    code = qr.generate_blank_array(version)
+    qr.place_codewords(code, version, codewords)
+    candidate = qr.apply_mask(code, qr.get_mask(version, 0))
+    matrix = qr.matrix
+    filename = os.path.join(directory, 'code')
+
+    def error_codewords():
+        error_blocks = [qr.generate_error_codewords(version, error_char,
+            block) for block in data_blocks]
+        return qr.interleave(data_blocks) + qr.interleave(error_blocks)
+
+    def placement():
+        qr.place_codewords(qr.generate_blank_array(version), version,
+            codewords)
+
+    def add_format():
+        array = [column[:] for column in candidate]
+        qr.add_format_information(array, qr.format, version)
+        qr.add_version_information(array, version)
+
+    stages = {
+        'segment': lambda: qr.get_version(error_char, payload, version),
+        'data_codewords': lambda: qr.generate_data_codewords(version,
+            error_char, segments),
+        'error_codewords': error_codewords,
+        'placement': placement,
+        'mask_apply': lambda: [qr.apply_mask(code, qr.get_mask(version, n))
+            for n in range(8)],
+        'test_one': lambda: qr.test_one(candidate),
+        'test_two': lambda: qr.test_two(candidate),
+        'test_three': lambda: qr.test_three(candidate),
+        'test_four': lambda: qr.test_four(candidate),
+        'mask_bitboard': lambda: qr.select_mask(code, version, 'bitboard'),
+        'mask_pruned': lambda: qr.select_mask(code, version, 'bitboard',
+            'pruned'),
+        'mask_sampled': lambda: qr.select_mask(code, version, 'bitboard',
+            'sampled'),
+        'format': add_format,
+        'svg': lambda: matrix.to_svg(),
+        'png': lambda: matrix.to_png(),
+        'save_svg': lambda: matrix.save_svg(filename),
+    }
+    if MaskNumPy is not None:
+        stages['mask_numpy'] = lambda: qr.select_mask(code, version, 'numpy')
+    return [(name, stages[name]) for name in STAGES if name in stages]
+
+
+def end_to_end(error_char, count):
+    # Seconds per code to encode and render count short URLs with serial
+    # numbers, the usual production payload.
+    payloads = ['https://x.io/ABC%08d' % i for i in range(count)]
+    start = time.perf_counter()
+    for payload in payloads:
+        encode(error_char, payload).to_svg()
+    return (time.perf_counter() - start) / count
+
+
+def parse_versions(text):
+    # '1-10,27,40' to [1, 2, ..., 10, 27, 40].
+    versions = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            versions.extend(range(int(first), int(last) + 1))
+        else:
+            versions.append(int(part))
+    for version in versions:
+        if not 1 <= version <= 40:
+            raise argparse.ArgumentTypeError('QR code versions run from 1 '
+                'to 40, got ' + str(version))
+    return versions
+
+
+def parse_list(choices):
+    def parse(text):
+        items = text.split(',')
+        for item in items:
+            if item not in choices:
+                raise argparse.ArgumentTypeError('unknown item ' + repr(item)
+                    + ', choose from ' + ', '.join(choices))
+        return items
+    return parse
+
+
+def compare(results, baseline, threshold):
+    # (key, baseline seconds, seconds) for every result slower than its
+    # baseline by more than threshold, a fraction.
+    regressions = []
+    for key in sorted(results):
+        before = baseline.get(key)
+        if before and results[key] > before * (1 + threshold):
+            regressions.append((key, before, results[key]))
+    return regressions
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Time each stage of the '
+        'encoder and compare against a baseline.')
+    parser.add_argument('--versions', type=parse_versions,
+        default=list(range(1, 41)), help='versions to time, such as '
+        '1-10,27,40 (default: 1-40)')
+    parser.add_argument('--levels', default='LMQH', type=str.upper,
+        help='error correction levels (default: LMQH)')
+    parser.add_argument('--modes', type=parse_list(tuple(MODE_CHARS)),
+        default=list(MODE_CHARS), help='payload modes, comma separated '
+        '(default: numeric,alphanumeric,byte)')
+    parser.add_argument('--stages', type=parse_list(STAGES),
+        default=list(STAGES), help='stages to time, comma separated '
+        '(default: all of ' + ','.join(STAGES) + ')')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs '
+        'per stage, the best is kept (default: 3)')
+    parser.add_argument('--target', type=float, default=0.01, help='seconds '
+        'each run should last (default: 0.01)')
+    parser.add_argument('--throughput-count', type=int, default=500,
+        help='codes encoded for the end to end case, 0 to skip it '
+        '(default: 500)')
+    parser.add_argument('-o', '--output', help='write the results to this '
+        'JSON file')
+    parser.add_argument('-b', '--baseline', help='JSON file from an earlier '
+        'run to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=0.20,
+        help='fraction slower than the baseline which counts as a '
+        'regression (default: 0.20)')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only '
+        'print regressions')
+    arguments = parser.parse_args(argv)
+    for level in arguments.levels:
+        if level not in 'LMQH':
+            parser.error('error correction levels are L, M, Q and H')
+    return arguments
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    def report(key, seconds):
+        if not arguments.quiet:
+            sys.stdout.write('%-40s %12.1f us\n' % (key, seconds * 1e6))
+            sys.stdout.flush()
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for mode in arguments.modes:
+            for version in arguments.versions:
+                for error_char in arguments.levels:
+                    payload = make_payload(mode, version, error_char)
+                    for name, function in get_stages(version, error_char,
+                            payload, directory):
+                        if name not in arguments.stages:
+                            continue
+                        key = '%s/%s/%d%s' % (name, mode, version, error_char)
+                        results[key] = measure(function, arguments.repeat,
+                            arguments.target)
+                        report(key, results[key])
+    finally:
+        shutil.rmtree(directory)
+    if arguments.throughput_count:
+        for error_char in arguments.levels:
+            key = 'end_to_end/url/' + error_char
+            results[key] = min(end_to_end(error_char,
+                arguments.throughput_count) for i in range(arguments.repeat))
+            if not arguments.quiet:
+                sys.stdout.write('%-40s %12.1f codes/s\n' % (key,
+                    1 / results[key]))
+    document = {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'numpy': MaskNumPy.numpy.__version__ if MaskNumPy else None,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'repeat': arguments.repeat,
+            'target': arguments.target,
+        },
+        # Seconds per call for each stage/mode/version and level.
+        'results': results,
+    }
+    if arguments.output:
+        with open(arguments.output, 'w') as f:
+            json.dump(document, f, indent=1, sort_keys=True)
+            f.write('\n')
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, arguments.threshold)
+        for key, before, after in regressions:
+            sys.stdout.write('REGRESSION %-40s %12.1f us -> %12.1f us '
+                '(+%.0f%%)\n' % (key, before * 1e6, after * 1e6,
+                (after / before - 1) * 100))
+        sys.stdout.write('%d of %d compared results regressed by more than '
+            '%.0f%%\n' % (len(regressions), len(set(results) &
+            set(baseline)), arguments.threshold * 100))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
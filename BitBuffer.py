@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+class BitBuffer(object):
+
+    # Collects a stream of bits most significant bit first.  Values are
+    # shifted into an integer accumulator and whole bytes are flushed into a
+    # bytearray, so appending never copies what has already been written.
+
+    def __init__(self):
+        self.data = bytearray()
+        self.accumulator = 0
+        self.pending = 0
+
+    def __len__(self):
+        # Number of bits written so far.
+        return len(self.data) * 8 + self.pending
+
+    def write(self, value, length):
+        # Append the lowest length bits of value.
+        self.accumulator = (self.accumulator << length) | (value &
+            ((1 << length) - 1))
+        self.pending += length
+        if self.pending >= 8:
+            whole = self.pending >> 3
+            self.pending &= 7
+            self.data += (self.accumulator >> self.pending).to_bytes(whole,
+                'big')
+            self.accumulator &= (1 << self.pending) - 1
+
+    def write_bytes(self, data):
+        # Append every byte of a bytes-like object, eight bits each.
+        if self.pending == 0:
+            self.data += data
+        elif len(data):
+            self.write(int.from_bytes(data, 'big'), len(data) * 8)
+
+    def pad_to_byte(self):
+        # Fill the current byte with zeros.
+        if self.pending:
+            self.write(0, 8 - self.pending)
+
+    def get_bytes(self):
+        # The bytes written so far, any incomplete final byte is padded with
+        # zeros.
+        if self.pending:
+            return bytes(self.data) + bytes([self.accumulator <<
+                (8 - self.pending) & 0xFF])
+        return bytes(self.data)
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Command line tool for generating QR codes in bulk.  Records are streamed
+# from stdin or a file, one per line, or from a column of a CSV file or a
+# field of a JSON lines file, encoded in parallel by QR.encode_many and
+# written out one at a time, either to files named from a template or into a
+# single zip or tar archive.
+#
+#   python CLI.py -e M -o 'codes/{index}.{ext}' < urls.txt
+#   python CLI.py -e H products.csv --column url -o '{sku}.svg'
+#   python CLI.py tickets.jsonl --field id --archive tickets.zip
+#   python CLI.py -e Q labels.csv --sheet labels.pdf --caption '{sku}'
+
+from QR import encode_many
+from Sheet import Sheet
+from collections import deque
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import string
+import sys
+import tarfile
+import time
+import zipfile
+
+# Template fields every record has.
+RECORD_FIELDS = frozenset(('index', 'ext', 'data'))
+# Output formats and the command line options each of them takes.
+FORMATS = {
+    'svg': ('module_size', 'quiet_zone', 'dark', 'light'),
+    'png': ('module_size', 'quiet_zone'),
+    'pbm': ('module_size', 'quiet_zone'),
+    'pgm': ('module_size', 'quiet_zone'),
+}
+
+
+def render(matrix, arguments):
+    # The bytes of the output file for a QRMatrix.
+    options = {}
+    for name in FORMATS[arguments.format]:
+        if getattr(arguments, name) is not None:
+            options[name] = getattr(arguments, name)
+    return matrix.to_bytes(arguments.format, **options)
+
+
+def write_sheet(items, arguments):
+    # Lay (matrix, caption) pairs out on label sheets, a PDF or one SVG file
+    # per page, and return the number of bytes written.
+    options = {}
+    for name in ('quiet_zone', 'dark', 'light'):
+        if getattr(arguments, name) is not None:
+            options[name] = getattr(arguments, name)
+    columns, rows = arguments.grid
+    sheet = Sheet(columns, rows, **options)
+    if arguments.sheet.lower().endswith('.pdf'):
+        with open(arguments.sheet, 'wb') as f:
+            sheet.write_pdf(items, f)
+            return f.tell()
+    name = os.path.splitext(arguments.sheet)[0]
+    written = 0
+    for page, content in enumerate(sheet.svg_pages(items), 1):
+        with open('%s-%d.svg' % (name, page), 'wb') as f:
+            f.write(content)
+        written += len(content)
+    return written
+
+
+def parse_grid(text):
+    # '4x6' to (4, 6), columns then rows.
+    try:
+        columns, rows = [int(part) for part in text.lower().split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('grid must be columns x rows, such '
+            'as 4x6')
+    if columns < 1 or rows < 1:
+        raise argparse.ArgumentTypeError('grid needs at least one column and '
+            'row')
+    return columns, rows
+
+
+def get_template_fields(template):
+    # The names of the fields a str.format template uses, raising ValueError
+    # if it is malformed or has positional fields.
+    names = set()
+    for literal, name, spec, conversion in string.Formatter().parse(
+            template):
+        if name is None:
+            continue
+        name = re.split(r'[.\[]', name, 1)[0]
+        if not name or name.isdigit():
+            raise ValueError('fields must be named, such as {index}')
+        names.add(name)
+        if spec:
+            names |= get_template_fields(spec)
+    return names
+
+
+def get_name_fields(fields):
+    # fields with every value substituted into a filename made safe: path
+    # separators and '..' are replaced so no record can name a file outside
+    # the directory the template gives.  Numbers are kept for format specs.
+    safe = {}
+    for name, value in fields.items():
+        if not isinstance(value, (int, float)):
+            value = str(value)
+            for separator in ('/', '\\', os.sep, os.altsep, '\0'):
+                if separator:
+                    value = value.replace(separator, '_')
+            value = value.replace('..', '__')
+        safe[name] = value
+    return safe
+
+
+def read_records(stream, input_format, column=None, field='data',
+        fields=()):
+    # Yields (record, None) for each record, a dict whose 'data' is the text
+    # to be encoded and whose other keys may be used in the output filename
+    # template, or (None, message) for a record which cannot be read.
+    # stream may be a csv.DictReader for CSV input.  fields are the JSON
+    # fields every record must have.
+    if input_format == 'csv':
+        reader = stream if isinstance(stream, csv.DictReader) else \
+            csv.DictReader(stream)
+        column = column or (reader.fieldnames or [None])[0]
+        for row in reader:
+            if row.get(column) is None:
+                yield None, 'no ' + repr(column) + ' column'
+                continue
+            record = dict(row)
+            record['data'] = row[column]
+            yield record, None
+    elif input_format == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as error:
+                yield None, 'malformed JSON: ' + str(error)
+                continue
+            if not isinstance(record, dict):
+                yield None, 'not a JSON object'
+            elif field not in record:
+                yield None, 'no ' + repr(field) + ' field'
+            elif not set(fields).issubset(record):
+                yield None, 'no ' + ', '.join(repr(name) for name in
+                    sorted(set(fields).difference(record))) + ' field'
+            else:
+                record['data'] = str(record[field])
+                yield record, None
+    else:
+        for line in stream:
+            line = line.rstrip('\r\n')
+            if line:
+                yield {'data': line}, None
+
+
+class FileWriter(object):
+
+    # Writes each output to its own file, creating directories as needed.
+    def __init__(self):
+        self.directories = set()
+
+    def write(self, name, content):
+        directory = os.path.dirname(name)
+        if directory and directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            self.directories.add(directory)
+        with open(name, 'wb') as f:
+            f.write(content)
+
+    def close(self):
+        pass
+
+
+class ZipWriter(object):
+
+    # Adds each output to a zip archive as it is produced.
+    def __init__(self, filename):
+        self.archive = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED)
+
+    def write(self, name, content):
+        self.archive.writestr(name, content)
+
+    def close(self):
+        self.archive.close()
+
+
+class TarWriter(object):
+
+    # Adds each output to a tar archive, '-' streams the archive to stdout.
+    def __init__(self, filename):
+        compression = 'gz' if filename.endswith(('.tar.gz', '.tgz')) else ''
+        if filename == '-':
+            self.archive = tarfile.open(fileobj=sys.stdout.buffer,
+                mode='w|' + compression)
+        else:
+            self.archive = tarfile.open(filename, 'w:' + compression)
+        self.now = time.time()
+
+    def write(self, name, content):
+        info = tarfile.TarInfo(name)
+        info.size = len(content)
+        info.mtime = self.now
+        self.archive.addfile(info, io.BytesIO(content))
+
+    def close(self):
+        self.archive.close()
+
+
+def get_writer(arguments):
+    if arguments.archive is None:
+        return FileWriter()
+    elif arguments.archive.endswith('.zip'):
+        return ZipWriter(arguments.archive)
+    return TarWriter(arguments.archive)
+
+
+def check_templates(parser, arguments, known):
+    # The template fields each record must have beyond known, the fields
+    # every record is known to have, or None if any may be missing.  Fails
+    # through parser for a malformed template or one using a field no
+    # record can have.
+    templates = [('--caption', arguments.caption)] if arguments.sheet else \
+        [('--output', arguments.output)]
+    required = set()
+    for option, template in templates:
+        if template is None:
+            continue
+        try:
+            names = get_template_fields(template)
+        except ValueError as error:
+            parser.error(option + ' ' + repr(template) + ': ' + str(error))
+        unknown = names - known
+        if unknown and arguments.input_format != 'jsonl':
+            parser.error(option + ' ' + repr(template) + ' uses ' +
+                ', '.join('{' + name + '}' for name in sorted(unknown)) +
+                ', records only have ' + ', '.join('{' + name + '}' for name
+                in sorted(known)))
+        required |= unknown
+    return required
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description='Generate QR codes in bulk '
+        'from stdin or a file, one code per record.')
+    parser.add_argument('input', nargs='?', default='-', help='file of '
+        'records, one per line, CSV or JSON lines (default: stdin)')
+    parser.add_argument('-e', '--error', default='M', choices='LMQH',
+        type=str.upper, help='error correction level (default: M)')
+    parser.add_argument('-f', '--format', default='svg',
+        choices=sorted(FORMATS), help='output format (default: svg)')
+    parser.add_argument('-s', '--module-size', type=int, help='size of a '
+        'module in pixels (default: 20 for svg, 4 for the raster formats)')
+    parser.add_argument('--quiet-zone', type=int, help='width of the light '
+        'border in modules (default: 4)')
+    parser.add_argument('--dark', help='svg colour of the dark modules '
+        '(default: #000)')
+    parser.add_argument('--light', help='svg background colour (default: '
+        'transparent)')
+    parser.add_argument('--input-format', choices=('lines', 'csv', 'jsonl'),
+        help='format of the input, by default worked out from the file '
+        'extension and lines for stdin')
+    parser.add_argument('--column', help='CSV column to encode (default: '
+        'the first column)')
+    parser.add_argument('--field', default='data', help='JSON field to '
+        'encode (default: data)')
+    parser.add_argument('-o', '--output', default='code-{index}.{ext}',
+        help='filename template, may use {index}, {ext}, {data} and any CSV '
+        'column or JSON field (default: code-{index}.{ext})')
+    parser.add_argument('-a', '--archive', help='write every code into this '
+        '.zip, .tar or .tar.gz archive instead, named by the template; - '
+        'streams a tar archive to stdout')
+    parser.add_argument('--sheet', help='lay every code out on label '
+        'sheets instead, a .pdf file or one SVG file per page named '
+        '<name>-<page>.svg')
+    parser.add_argument('--grid', type=parse_grid, default=(4, 6),
+        help='codes per sheet, columns x rows (default: 4x6)')
+    parser.add_argument('--caption', help='caption under each code on a '
+        'sheet, a template like --output (default: none)')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes '
+        '(default: one per CPU)')
+    parser.add_argument('--chunksize', type=int, default=64, help='records '
+        'sent to a worker at a time (default: 64)')
+    parser.add_argument('--mask', type=int, choices=range(8), help='use '
+        'this mask pattern for every code instead of the lowest scoring')
+    parser.add_argument('--mask-strategy', choices=('full', 'pruned',
+        'sampled'), help='how the mask is chosen: full scores all eight, '
+        'pruned gives the same mask faster, sampled is faster still but '
+        'may pick a slightly worse one (default: full)')
+    parser.add_argument('--eci', action='store_true', help='encode byte '
+        'segments as UTF-8 and say so with an ECI header')
+    parser.add_argument('--verify', action='store_true', help='decode '
+        'every code again and fail any which does not read back as its '
+        'record')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not '
+        'print the summary')
+    return parser
+
+
+def parse_arguments(argv, parser=None):
+    arguments = (parser or make_parser()).parse_args(argv)
+    if arguments.input_format is None:
+        extension = os.path.splitext(arguments.input)[1].lower()
+        arguments.input_format = {'.csv':'csv', '.jsonl':'jsonl',
+            '.ndjson':'jsonl'}.get(extension, 'lines')
+    return arguments
+
+
+def main(argv=None):
+    parser = make_parser()
+    arguments = parse_arguments(argv, parser)
+    if arguments.input == '-':
+        stream = sys.stdin
+    else:
+        stream = open(arguments.input, newline='', encoding='utf-8')
+    # Templates are checked against the fields records have before anything
+    # is encoded, JSON lines records are checked one by one.
+    source = stream
+    known = RECORD_FIELDS
+    if arguments.input_format == 'csv':
+        source = csv.DictReader(stream)
+        known = known | set(source.fieldnames or ())
+    try:
+        required = check_templates(parser, arguments, known)
+    except SystemExit:
+        if stream is not sys.stdin:
+            stream.close()
+        raise
+    # Records are held only while their data is being encoded, encode_many
+    # returns results in the same order they were read.  Records are
+    # numbered in the order they are read, those which cannot be read are
+    # reported and counted as failed without being encoded.
+    records = deque()
+    count = 0
+    written = 0
+    failed = 0
+    def report(index, message):
+        nonlocal failed
+        failed += 1
+        sys.stderr.write('record ' + str(index) + ': ' + message + '\n')
+    def data():
+        nonlocal count
+        for record, message in read_records(source, arguments.input_format,
+                arguments.column, arguments.field, required):
+            index = count
+            count += 1
+            if record is None:
+                report(index, message)
+                continue
+            records.append(dict(record, index=index, ext=arguments.format))
+            yield record['data']
+    writer = None if arguments.sheet else get_writer(arguments)
+    start = time.time()
+    def encoded():
+        # (matrix, template fields) for every record which encodes.
+        for result in encode_many(data(), arguments.error,
+                arguments.workers, arguments.chunksize, arguments.verify,
+                mask=arguments.mask, strategy=arguments.mask_strategy,
+                eci=arguments.eci or None):
+            fields = records.popleft()
+            if not result.ok:
+                report(fields['index'], str(result.error))
+                continue
+            yield result.matrix, fields
+    try:
+        if arguments.sheet:
+            written = write_sheet(((matrix, arguments.caption.format(**fields)
+                if arguments.caption else None) for matrix, fields in
+                encoded()), arguments)
+        else:
+            for matrix, fields in encoded():
+                content = render(matrix, arguments)
+                writer.write(arguments.output.format(**get_name_fields(
+                    fields)), content)
+                written += len(content)
+    finally:
+        if writer is not None:
+            writer.close()
+        if stream is not sys.stdin:
+            stream.close()
+    elapsed = time.time() - start
+    if not arguments.quiet:
+        sys.stderr.write('%d codes (%d failed) in %.2fs, %.1f codes/s, '
+            '%d bytes written\n' % (count - failed, failed, elapsed,
+            (count - failed) / elapsed if elapsed else 0.0, written))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
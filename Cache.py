@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Caching of encoded symbols and rendered output.  Repeat requests for the
+# same payload at the same error correction level, with the same encoding
+# options and (for rendered output) the same format and render options, are
+# answered without running the encoder again.  Results are held in a size
+# bounded, least recently used, in-memory store and optionally in a content
+# addressed directory which survives restarts.
+
+from QR import encode, QRMatrix
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
+import threading
+
+# Part of every on-disk key, bump it when the encoder output changes so old
+# entries are no longer found.
+CACHE_VERSION = 1
+
+# encode options which do not change the symbol, left out of keys.
+UNKEYED_OPTIONS = frozenset(('observer', 'backend'))
+# Types of option values allowed in keys, whose repr is their value.
+LITERAL_TYPES = (type(None), bool, int, float, str, bytes)
+
+
+def get_key_data(data):
+    # data as it goes into a key, bytes-like input as bytes so a bytearray
+    # can be hashed and a memoryview's repr holds its contents rather than
+    # its address.
+    if isinstance(data, (bytearray, memoryview)):
+        return bytes(data)
+    return data
+
+
+def get_key_options(options):
+    # options as they go into a key, sorted and without UNKEYED_OPTIONS.
+    # Values must be literals, or tuples or lists of them, so that equal
+    # options give equal keys and the on-disk key is the same in every
+    # process; anything else raises ValueError.
+    key = []
+    for name, value in sorted(options.items()):
+        if name in UNKEYED_OPTIONS:
+            continue
+        if isinstance(value, (tuple, list)):
+            if not all(isinstance(item, LITERAL_TYPES) for item in value):
+                raise ValueError('Option %s cannot be cached: %r.' % (name,
+                    value))
+            value = tuple(value)
+        elif not isinstance(value, LITERAL_TYPES):
+            raise ValueError('Option %s cannot be cached: %r.' % (name,
+                value))
+        key.append((name, value))
+    return tuple(key)
+
+
+class Cache(object):
+
+    # max_bytes bounds the in-memory store, rendered output is counted by its
+    # length and matrices by their packed size.  directory, if given, is
+    # where entries are also written as files named by the SHA-256 of their
+    # key.
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_matrix(self, error, data, **options):
+        # The QRMatrix for data, options are passed on to QR.encode.
+        key = ('matrix', error.upper(), get_key_data(data),
+            get_key_options(options))
+        packed = self.lookup(key, 'qr')
+        if packed is None:
+            packed = encode(error, data, **options).to_packed()
+            self.store(key, 'qr', packed)
+        return QRMatrix.from_packed(packed)
+
+    def get_bytes(self, error, data, format='svg', render_options=None,
+            **options):
+        # data rendered by QRMatrix.to_bytes in the given format, options are
+        # passed on to QR.encode and render_options to the renderer.  Only
+        # the rendered output is stored, not the matrix.
+        render_options = render_options or {}
+        key = ('render', error.upper(), get_key_data(data),
+            get_key_options(options), format,
+            get_key_options(render_options))
+        content = self.lookup(key, format)
+        if content is None:
+            matrix = encode(error, data, **options)
+            content = matrix.to_bytes(format, **render_options)
+            self.store(key, format, content)
+        return content
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                'disk_hits': self.disk_hits, 'evictions': self.evictions,
+                'entries': len(self.entries), 'bytes': self.size}
+
+    def clear(self):
+        # Empty the in-memory store, the directory is left alone.
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def lookup(self, key, extension):
+        with self.lock:
+            content = self.entries.get(key)
+            if content is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return content
+        if self.directory is not None:
+            try:
+                with open(self.get_path(key, extension), 'rb') as f:
+                    content = f.read()
+            except (IOError, OSError):
+                content = None
+            if content is not None:
+                with self.lock:
+                    self.disk_hits += 1
+                self.remember(key, content)
+                return content
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def store(self, key, extension, content):
+        self.remember(key, content)
+        if self.directory is not None:
+            # Write to a temporary file and rename it into place so readers
+            # never see part of an entry.
+            path = self.get_path(key, extension)
+            folder = os.path.dirname(path)
+            os.makedirs(folder, exist_ok=True)
+            handle, temporary = tempfile.mkstemp(dir=folder)
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    f.write(content)
+                os.replace(temporary, path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+
+    def remember(self, key, content):
+        with self.lock:
+            if len(content) > self.max_bytes:
+                return
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = content
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def get_path(self, key, extension):
+        digest = hashlib.sha256(repr((CACHE_VERSION,) + key).encode(
+            'utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.' +
+            extension)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Answers capacity questions without encoding anything: the smallest version
+# and error correction level a payload fits, and the longest payload of one
+# mode a version and level can hold.  The data capacity in bits of every
+# version at every level and the maximum number of characters of every mode
+# are worked out once, both only grow with the version so lookups are
+# bisections.  Payloads which do not fit raise DataTooLongError, carrying the
+# bits needed and available, rather than stopping anything.
+#
+#   from Capacity import plan, max_length
+#
+#   plan('https://x.io/ABC123')             # Plan(version=2, error='Q', ...)
+#   plan(token, 'M', maximum=10).spare      # bits left over
+#   max_length(10, 'M', 'alphanumeric')     # 311
+
+from QR import QR, DataTooLongError, VERSION_RANGES
+from Segment import segment
+import bisect
+
+LEVELS = ('L', 'M', 'Q', 'H')
+MODE_NAMES = {'numeric': 'N', 'alphanumeric': 'A', 'byte': 'B',
+    'kanji': 'K'}
+
+
+def _get_max_length(version, error_char, mode_char):
+    # The most characters of one mode which fit, within what the character
+    # count indicator can hold.
+    count_bits = QR.get_count_bits(version, mode_char)
+    available = QR.get_capacities(error_char)[version] - 4 - count_bits
+    if mode_char == 'N':
+        length = available // 10 * 3 + (2 if available % 10 >= 7 else 1 if
+            available % 10 >= 4 else 0)
+    elif mode_char == 'A':
+        length = available // 11 * 2 + (1 if available % 11 >= 6 else 0)
+    elif mode_char == 'K':
+        length = available // 13
+    else:
+        length = available // 8
+    return min(length, (1 << count_bits) - 1)
+
+
+# MAX_LENGTHS[error_char][mode_char][version], nothing at version 0.
+MAX_LENGTHS = dict((error_char, dict((mode_char, [0] + [_get_max_length(
+    version, error_char, mode_char) for version in range(1, 41)]) for
+    mode_char in MODE_NAMES.values())) for error_char in LEVELS)
+
+
+class Plan(object):
+
+    # The smallest symbol for a payload: its version and error correction
+    # level, the bits the payload needs and the bits the symbol holds, and
+    # the segments it is split into.
+
+    def __init__(self, version, error_char, required, capacity, segments):
+        self.version = version
+        self.error_char = error_char
+        self.required = required
+        self.capacity = capacity
+        self.segments = segments
+
+    @property
+    def spare(self):
+        # Data bits left over, room for this much more payload.
+        return self.capacity - self.required
+
+    @property
+    def size(self):
+        # Modules along each side.
+        return self.version * 4 + 17
+
+    def __repr__(self):
+        return 'Plan(version=%d, error=%r, required=%d, capacity=%d)' % (
+            self.version, self.error_char, self.required, self.capacity)
+
+
+def plan(data, error=None, minimum=1, maximum=40):
+    # The Plan for the smallest version from minimum to maximum which holds
+    # data at error correction level error.  With no level, the smallest
+    # version at any level, at the highest level that version allows.
+    # Raises DataTooLongError if nothing up to maximum fits.
+    check_version(minimum)
+    check_version(maximum)
+    levels = LEVELS if error is None else (get_level(error),)
+    # The required bits only change between version ranges, so data is
+    # segmented no more than three times whatever the number of levels.
+    requirements = []
+    for first, last in VERSION_RANGES:
+        first = max(first, minimum)
+        last = min(last, maximum)
+        if first > last:
+            continue
+        count_bits = dict((mode_char, QR.get_count_bits(first, mode_char))
+            for mode_char in QR.TABLE_3)
+        segments = segment(data, count_bits)
+        requirements.append((first, last, QR.get_segments_bit_length(
+            segments, count_bits), segments))
+    best = None
+    for error_char in reversed(levels):
+        capacities = QR.get_capacities(error_char)
+        for first, last, required, segments in requirements:
+            version = bisect.bisect_left(capacities, required, first,
+                last + 1)
+            if version <= last:
+                if best is None or version < best.version:
+                    best = Plan(version, error_char, required,
+                        capacities[version], segments)
+                break
+    if best is None:
+        error_char = levels[0]
+        required = requirements[-1][2] if requirements else None
+        raise DataTooLongError('Input is too long for a version ' +
+            str(maximum) + ' code at error correction level ' + error_char +
+            '.', required, QR.get_capacities(error_char)[maximum])
+    return best
+
+
+def fits(data, error='M', version=40):
+    # True when data fits a symbol no larger than version at error.
+    try:
+        plan(data, error, maximum=version)
+    except DataTooLongError:
+        return False
+    return True
+
+
+def max_length(version, error, mode):
+    # The longest payload of a single mode, 'numeric', 'alphanumeric',
+    # 'byte' or 'kanji' (or 'N', 'A', 'B' or 'K'), which fits version at
+    # error.  Byte lengths are in bytes, after encoding.
+    check_version(version)
+    return MAX_LENGTHS[get_level(error)][get_mode(mode)][version]
+
+
+def min_version(length, error, mode, maximum=40):
+    # The smallest version holding length characters of a single mode at
+    # error, raising DataTooLongError if none up to maximum does.
+    check_version(maximum)
+    error_char = get_level(error)
+    mode_char = get_mode(mode)
+    lengths = MAX_LENGTHS[error_char][mode_char]
+    version = bisect.bisect_left(lengths, length, 1, maximum + 1)
+    if version > maximum:
+        raise DataTooLongError(str(length) + ' characters in ' + mode +
+            ' mode do not fit a version ' + str(maximum) + ' code at error '
+            'correction level ' + error_char + ', the most is ' +
+            str(lengths[maximum]) + '.', QR.get_bit_length(mode_char,
+            length), QR.get_capacities(error_char)[maximum])
+    return version
+
+
+def get_level(error):
+    error_char = error.upper()
+    if error_char not in LEVELS:
+        raise ValueError('Error correction levels are L, M, Q and H, got ' +
+            repr(error))
+    return error_char
+
+
+def get_mode(mode):
+    mode_char = MODE_NAMES.get(mode, mode)
+    if mode_char not in MODE_NAMES.values():
+        raise ValueError('Modes are ' + ', '.join(sorted(MODE_NAMES)) +
+            ', got ' + repr(mode))
+    return mode_char
+
+
+def check_version(version):
+    if not 1 <= version <= 40:
+        raise ValueError('QR code versions run from 1 to 40, got ' +
+            str(version))
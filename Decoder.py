@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Reads a symbol back at the module level, the reverse of QR: the format
+# information gives the error correction level and mask, the mask is removed,
+# the codewords are read in placement order and split back into their blocks,
+# every block is checked against its error correction codewords and the
+# segments are decoded to text.  It works on the modules directly and makes
+# no attempt to correct errors, it is meant for checking symbols this package
+# has just made at a fraction of the cost of rendering and scanning them.
+#
+#   from Decoder import decode, verify
+#
+#   decode(encode('M', 'https://x.io/ABC123'))     # 'https://x.io/ABC123'
+#   decode_structured(encode_structured('M', vcard, version=10))   # vcard
+
+from QR import QR, QRMatrix
+from Segment import get_encoding
+from Layout import get_layout, version_information, \
+    version_information_positions
+import ReedSolomon
+import operator
+
+ALPHANUMERIC = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:'
+MODES = dict((int(indicator, 2), mode_char) for mode_char, indicator in
+    QR.MODE_INDICATORS.items())
+_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_readers = {}
+
+
+class DecodeError(ValueError):
+    # Raised when a symbol cannot be read, for example because a block fails
+    # its error correction check.
+    pass
+
+
+class VerificationError(ValueError):
+    # Raised by verify when a symbol decodes to something other than the
+    # data it was made from.
+    pass
+
+
+def decode(matrix, encoding=None):
+    # The text held by matrix, a QRMatrix or a list of columns.  Byte
+    # segments are decoded with encoding, by default UTF-8 if they are valid
+    # UTF-8 and ISO 8859-1 otherwise, unless an ECI header gives their
+    # character set.
+    if not isinstance(matrix, QRMatrix):
+        matrix = QRMatrix(matrix, (len(matrix) - 17) // 4, None, None)
+    return decode_segments(read_symbol(matrix), encoding)
+
+
+def decode_bytes(matrix):
+    # The bytes held by matrix, the contents of byte segments as they are
+    # and other segments in the character set of their mode.
+    if not isinstance(matrix, QRMatrix):
+        matrix = QRMatrix(matrix, (len(matrix) - 17) // 4, None, None)
+    return segment_bytes(read_symbol(matrix))
+
+
+def segment_bytes(segments):
+    # The data bytes of a list of (mode character, value) segments as they
+    # are held in the symbol: ASCII for numeric and alphanumeric segments,
+    # Shift JIS for kanji and byte segments as they are.  Headers hold none.
+    data = bytearray()
+    for mode_char, value in segments:
+        if mode_char in ('N', 'A'):
+            data += value.encode('ascii')
+        elif mode_char in ('B', 'K'):
+            data += value
+    return bytes(data)
+
+
+def decode_segments(segments, encoding=None):
+    # The text of a list of (mode character, value) segments, an ECI header
+    # changes the character set of the byte segments after it.
+    parts = []
+    for mode_char, value in segments:
+        if mode_char == 'E':
+            encoding = QR.ECI_ENCODINGS.get(value)
+            if encoding is None:
+                raise DecodeError('Unsupported ECI designator ' + str(value)
+                    + ', use decode_bytes.')
+        parts.append(decode_segment(mode_char, value, encoding))
+    return ''.join(parts)
+
+
+def decode_structured(matrices, encoding=None):
+    # The text held by a structured append sequence, in any order.  Raises
+    # DecodeError if a symbol is missing, does not belong to the sequence or
+    # the parity byte, over the data bytes of every symbol, does not match.
+    parts = {}
+    header = None
+    for matrix in matrices:
+        if not isinstance(matrix, QRMatrix):
+            matrix = QRMatrix(matrix, (len(matrix) - 17) // 4, None, None)
+        segments = read_symbol(matrix)
+        if not segments or segments[0][0] != 'S':
+            raise DecodeError('Symbol has no structured append header.')
+        position, total, parity = segments[0][1]
+        if header is not None and header != (total, parity):
+            raise DecodeError('Symbols belong to different sequences.')
+        header = (total, parity)
+        parts[position] = segments[1:]
+    if header is None or sorted(parts) != list(range(header[0])):
+        raise DecodeError('Structured append sequence is incomplete.')
+    segments = [item for position in range(header[0]) for item in
+        parts[position]]
+    parity = 0
+    for byte in segment_bytes(segments):
+        parity ^= byte
+    if parity != header[1]:
+        raise DecodeError('Structured append parity does not match.')
+    return decode_segments(segments, encoding)
+
+
+def read_symbol(matrix):
+    # The segments of a QRMatrix after checking its format and version
+    # information and every block's error correction codewords.
+    version = matrix.version
+    error_char, mask = read_format(matrix)
+    check_version(matrix)
+    codewords = read_codewords(matrix, mask)
+    data = bytearray()
+    for data_block, error_block in split_blocks(codewords, version,
+            error_char):
+        if ReedSolomon.remainder(data_block, len(error_block)) != error_block:
+            raise DecodeError('A block of codewords fails its error '
+                'correction check.')
+        data += data_block
+    return read_segments(data, version)
+
+
+def verify(matrix, data):
+    # Raise VerificationError unless matrix decodes to data, text or a
+    # bytes-like object.  Byte segments of text are read in the character
+    # set the encoder chose for data.
+    try:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data)
+            decoded = decode_bytes(matrix)
+        else:
+            decoded = decode(matrix, get_encoding(data))
+    except DecodeError as error:
+        raise VerificationError('Symbol cannot be read back: ' + str(error))
+    if decoded != data:
+        raise VerificationError('Symbol reads back as ' + repr(decoded) +
+            ' instead of ' + repr(data))
+
+
+def read_format(matrix):
+    # (error correction level, mask) from the format information, the copy
+    # around the top left finder pattern first.  Up to three wrong bits are
+    # tolerated, the fifteen bit strings are at least seven bits apart.
+    data = matrix.data
+    size = matrix.size
+    for positions in get_layout(matrix.version).format_positions:
+        value = 0
+        for x, y in positions:
+            value = (value << 1) | data[x * size + y]
+        best = None
+        for error_char, strings in QR.FORMAT_INFORMATION.items():
+            for mask, string in enumerate(strings):
+                distance = bin(int(string, 2) ^ value).count('1')
+                if best is None or distance < best[0]:
+                    best = (distance, error_char, mask)
+        if best[0] <= 3:
+            return best[1], best[2]
+    raise DecodeError('Format information cannot be read.')
+
+
+def check_version(matrix):
+    # Versions 7 and above carry their version information twice, at least
+    # one copy must be within three bits of what the size says.
+    version = matrix.version
+    if version < 7:
+        return
+    expected = version_information(version)
+    data = matrix.data
+    size = matrix.size
+    for positions in version_information_positions(size):
+        value = 0
+        for i, (x, y) in enumerate(positions):
+            value |= data[x * size + y] << i
+        if bin(value ^ expected).count('1') <= 3:
+            return
+    raise DecodeError('Version information does not match the size.')
+
+
+def read_codewords(matrix, mask):
+    # Every codeword, data and error correction interleaved, with the mask
+    # removed.  Remainder bits are dropped.
+    version = matrix.version
+    reader = _readers.get(version)
+    if reader is None:
+        size = matrix.size
+        positions = get_layout(version).bit_positions
+        count = len(positions) // 8 * 8
+        reader = operator.itemgetter(*[x * size + y for x, y in
+            positions[:count]])
+        reader = _readers.setdefault(version, reader)
+    unmasked = matrix.copy().xor(get_layout(version).get_mask(mask)).data
+    bits = bytes(reader(unmasked)).translate(_DIGITS)
+    return int(bits, 2).to_bytes(len(bits) // 8, 'big')
+
+
+def split_blocks(codewords, version, error_char):
+    # Undo QR.interleave, returning (data codewords, error correction
+    # codewords) for each block.
+    ec, blocks_1, data_1, blocks_2, data_2 = QR.TABLE_9[version][error_char]
+    lengths = [data_1] * blocks_1 + [data_2] * blocks_2
+    count = len(lengths)
+    data_blocks = [bytearray() for length in lengths]
+    position = 0
+    for i in range(max(lengths)):
+        for block, length in zip(data_blocks, lengths):
+            if i < length:
+                block.append(codewords[position])
+                position += 1
+    error_blocks = [bytes(codewords[position + i:position + ec * count:count])
+        for i in range(count)]
+    return [(bytes(data), error) for data, error in zip(data_blocks,
+        error_blocks)]
+
+
+def read_segments(data, version):
+    # (mode character, value) for every segment in the data codewords, the
+    # value is a str for numeric and alphanumeric segments, a (position,
+    # total, parity) tuple for a structured append header, the designator
+    # for an ECI header and bytes otherwise.  Reading stops at the
+    # terminator or the end of the data.
+    total = len(data) * 8
+    stream = int.from_bytes(data, 'big')
+    position = 0
+    def read(length):
+        nonlocal position
+        if position + length > total:
+            raise DecodeError('Segment runs past the end of the data.')
+        position += length
+        return (stream >> (total - position)) & ((1 << length) - 1)
+    segments = []
+    while total - position >= 4:
+        indicator = read(4)
+        if indicator == 0:
+            break
+        mode_char = MODES.get(indicator)
+        if mode_char is None:
+            raise DecodeError('Unsupported mode indicator ' +
+                format(indicator, '04b') + '.')
+        if mode_char == 'S':
+            # Structured append header, (position, total, parity).
+            value = read(4), read(4) + 1, read(8)
+            segments.append((mode_char, value))
+            continue
+        if mode_char == 'E':
+            # ECI designator, in one, two or three bytes marked by its
+            # leading bits.
+            value = read(8)
+            if value & 0x80:
+                if not value & 0x40:
+                    value = ((value & 0x3F) << 8) | read(8)
+                elif not value & 0x20:
+                    value = ((value & 0x1F) << 16) | read(16)
+                else:
+                    raise DecodeError('Malformed ECI designator.')
+            segments.append((mode_char, value))
+            continue
+        count = read(QR.TABLE_3[mode_char][0 if version < 10 else
+            1 if version < 27 else 2])
+        if mode_char == 'N':
+            digits = []
+            for i in range(0, count - 2, 3):
+                digits.append('%03d' % read(10))
+            if count % 3 == 2:
+                digits.append('%02d' % read(7))
+            elif count % 3 == 1:
+                digits.append('%d' % read(4))
+            value = ''.join(digits)
+        elif mode_char == 'A':
+            characters = []
+            for i in range(count // 2):
+                pair = read(11)
+                if pair >= 45 * 45:
+                    raise DecodeError('Alphanumeric value out of range.')
+                characters.append(ALPHANUMERIC[pair // 45] +
+                    ALPHANUMERIC[pair % 45])
+            if count % 2:
+                single = read(6)
+                if single >= 45:
+                    raise DecodeError('Alphanumeric value out of range.')
+                characters.append(ALPHANUMERIC[single])
+            value = ''.join(characters)
+        elif mode_char == 'B':
+            value = read(count * 8).to_bytes(count, 'big')
+        else:
+            value = bytearray()
+            for i in range(count):
+                code = read(13)
+                code = ((code // 0xC0) << 8) | (code % 0xC0)
+                code += 0x8140 if code < 0x1F00 else 0xC140
+                value += code.to_bytes(2, 'big')
+            value = bytes(value)
+        segments.append((mode_char, value))
+    return segments
+
+
+def decode_segment(mode_char, value, encoding=None):
+    if mode_char == 'B':
+        if encoding is not None:
+            return value.decode(encoding)
+        try:
+            return value.decode('utf-8')
+        except UnicodeDecodeError:
+            return value.decode('iso-8859-1')
+    elif mode_char == 'K':
+        return value.decode('shift_jis')
+    elif mode_char in ('S', 'E'):
+        return ''
+    return value
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Optional instrumentation of the encoder.  An observer passed to QR or
+# encode, or installed for every code with QR.OBSERVER, is told when each
+# stage of the pipeline starts and ends and how long it took, and is given
+# counters such as the chosen version and mask, the eight penalty scores, the
+# length of the codeword stream and the size of rendered output.  With no
+# observer each stage costs one function call and an empty with block.
+#
+#   from Instrument import Aggregator
+#   from QR import QR
+#
+#   QR.OBSERVER = metrics = Aggregator()
+#   ...
+#   metrics.snapshot()['stages']['mask']['p99']
+
+from collections import Counter, deque
+import threading
+import time
+
+# Stages reported by QR, in pipeline order.  'encode' covers the whole of
+# QR.__init__ and 'render' any rendering of the finished QRMatrix.
+STAGES = ('encode', 'segment', 'data_codewords', 'error_codewords',
+    'placement', 'mask', 'format', 'render')
+PERCENTILES = (50, 90, 99)
+
+
+def stage(observer, name):
+    # A context manager reporting the code run inside it to observer as the
+    # stage name, its end is reported even if the code raises.  With no
+    # observer a shared object which does nothing is returned.
+    if observer is None:
+        return _NO_STAGE
+    return _Stage(observer, name)
+
+
+class _Stage(object):
+
+    __slots__ = ('observer', 'name', 'started')
+
+    def __init__(self, observer, name):
+        self.observer = observer
+        self.name = name
+
+    def __enter__(self):
+        self.observer.start(self.name)
+        self.started = time.perf_counter()
+
+    def __exit__(self, kind, value, traceback):
+        self.observer.end(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoStage(object):
+
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, kind, value, traceback):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class Observer(object):
+
+    # The observer interface, every method does nothing so a subclass only
+    # needs to override what it uses.  Methods may be called from several
+    # threads at once.
+
+    def start(self, stage):
+        # stage, one of STAGES, is about to begin.
+        pass
+
+    def end(self, stage, seconds):
+        # stage has finished after seconds.
+        pass
+
+    def count(self, name, value):
+        # A counter for the code being made: 'version', 'mask', 'error',
+        # 'segments', 'stream_length' and 'output_bytes' are integers or a
+        # single character, 'scores' is the list of eight penalty scores,
+        # None for any candidate dropped by the pruned mask strategy, or None
+        # for a fixed mask.
+        pass
+
+
+class Recorder(Observer):
+
+    # Records what it is told so it can be replayed to another observer
+    # later, for example one in another process.  events is a list of
+    # (method name, arguments) pairs and can be pickled.
+
+    def __init__(self):
+        self.events = []
+
+    def start(self, stage):
+        self.events.append(('start', (stage,)))
+
+    def end(self, stage, seconds):
+        self.events.append(('end', (stage, seconds)))
+
+    def count(self, name, value):
+        self.events.append(('count', (name, value)))
+
+
+def replay(events, observer):
+    # Tell observer everything a Recorder recorded, in order.
+    for method, arguments in events:
+        getattr(observer, method)(*arguments)
+
+
+class Aggregator(Observer):
+
+    # Keeps the most recent window durations of each stage and values of
+    # each numeric counter and reports their percentiles, along with how
+    # often each version, mask and error correction level was used.  The
+    # lowest of the eight penalty scores is kept as 'best_score'.
+
+    HISTOGRAMS = ('version', 'mask', 'error')
+
+    def __init__(self, window=10000):
+        self.window = window
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.durations = {}
+            self.totals = Counter()
+            self.calls = Counter()
+            self.values = {}
+            self.histograms = dict((name, Counter()) for name in
+                self.HISTOGRAMS)
+
+    def end(self, stage, seconds):
+        with self.lock:
+            samples = self.durations.get(stage)
+            if samples is None:
+                samples = self.durations[stage] = deque(maxlen=self.window)
+            samples.append(seconds)
+            self.totals[stage] += seconds
+            self.calls[stage] += 1
+
+    def count(self, name, value):
+        if name == 'scores':
+            if value is None:
+                return
+            name, value = 'best_score', min(score for score in value if
+                score is not None)
+        with self.lock:
+            if name in self.histograms:
+                self.histograms[name][value] += 1
+                return
+            samples = self.values.get(name)
+            if samples is None:
+                samples = self.values[name] = deque(maxlen=self.window)
+            samples.append(value)
+
+    def snapshot(self):
+        # A dict ready for a metrics system: for every stage the number of
+        # calls, total seconds and percentiles and maximum of the recent
+        # durations, percentiles of every numeric counter and the version,
+        # mask and error correction level histograms.
+        with self.lock:
+            stages = {}
+            for stage, samples in self.durations.items():
+                summary = summarise(samples)
+                summary['count'] = self.calls[stage]
+                summary['total'] = self.totals[stage]
+                stages[stage] = summary
+            counters = dict((name, summarise(samples)) for name, samples in
+                self.values.items())
+            histograms = dict((name, dict(counts)) for name, counts in
+                self.histograms.items())
+        return {'stages': stages, 'counters': counters,
+            'histograms': histograms}
+
+
+def summarise(samples):
+    # Nearest rank percentiles and the maximum of a collection of numbers.
+    ordered = sorted(samples)
+    summary = {}
+    for percentile in PERCENTILES:
+        rank = max(0, -(-percentile * len(ordered) // 100) - 1)
+        summary['p%d' % percentile] = ordered[rank]
+    summary['max'] = ordered[-1]
+    return summary
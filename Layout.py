@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Module placement for every version of QR code.  Rather than storing the
+# position of every data module we work out which modules are taken by the
+# function patterns and then walk the symbol in the zig-zag order described in
+# section 7.7.3 of the ISO specification.  The result for each version is
+# generated the first time it is asked for and kept for the life of the
+# process, along with a template of the function patterns which every symbol
+# of that version starts from and, once each is first used, the eight mask
+# patterns.
+
+# Row/column co-ordinates of the centre of the alignment patterns, based upon
+# table E.1 of the ISO specification.  Patterns are placed at every
+# combination of these values apart from the three which would overlap the
+# finder patterns.
+ALIGNMENT_POSITIONS = [[], [], # V1 has no alignment patterns
+    [6, 18], [6, 22], [6, 26], [6, 30], [6, 34], # V2 - V6
+    [6, 22, 38], [6, 24, 42], [6, 26, 46], [6, 28, 50], [6, 30, 54],
+    [6, 32, 58], [6, 34, 62], # V7 - V13
+    [6, 26, 46, 66], [6, 26, 48, 70], [6, 26, 50, 74], [6, 30, 54, 78],
+    [6, 30, 56, 82], [6, 30, 58, 86], [6, 34, 62, 90], # V14 - V20
+    [6, 28, 50, 72, 94], [6, 26, 50, 74, 98], [6, 30, 54, 78, 102],
+    [6, 28, 54, 80, 106], [6, 32, 58, 84, 110], [6, 30, 58, 86, 114],
+    [6, 34, 62, 90, 118], # V21 - V27
+    [6, 26, 50, 74, 98, 122], [6, 30, 54, 78, 102, 126],
+    [6, 26, 52, 78, 104, 130], [6, 30, 56, 82, 108, 134],
+    [6, 34, 60, 86, 112, 138], [6, 30, 58, 86, 114, 142],
+    [6, 34, 62, 90, 118, 146], # V28 - V34
+    [6, 30, 54, 78, 102, 126, 150], [6, 24, 50, 76, 102, 128, 154],
+    [6, 28, 54, 80, 106, 132, 158], [6, 32, 58, 84, 110, 136, 162],
+    [6, 26, 54, 82, 110, 138, 166], [6, 30, 58, 86, 114, 142, 170]] # V35 - V40
+
+# The mask pattern conditions of table 10 of the ISO specification, i is the
+# row and j the column.
+MASK_PATTERNS = (
+    lambda i, j: (i + j) % 2 == 0,
+    lambda i, j: i % 2 == 0,
+    lambda i, j: j % 3 == 0,
+    lambda i, j: (i + j) % 3 == 0,
+    lambda i, j: ((i // 2) + (j // 3)) % 2 == 0,
+    lambda i, j: (i * j) % 2 + (i * j) % 3 == 0,
+    lambda i, j: ((i * j) % 2 + (i * j) % 3) % 2 == 0,
+    lambda i, j: ((i + j) % 2 + (i * j) % 3) % 2 == 0)
+
+_layouts = {}
+
+
+def get_layout(version):
+    # Returns the (cached) Layout for the given version.
+    layout = _layouts.get(version)
+    if layout is None:
+        if not 1 <= version <= 40:
+            raise ValueError('QR code versions run from 1 to 40, got ' +
+                str(version))
+        layout = _layouts.setdefault(version, Layout(version))
+    return layout
+
+
+def alignment_centres(version):
+    # All of the alignment pattern centres used by a version as [x, y] pairs.
+    positions = ALIGNMENT_POSITIONS[version]
+    if not positions:
+        return []
+    first = positions[0]
+    last = positions[-1]
+    return [[x, y] for x in positions for y in positions
+        if not ((x == first and y == first) or (x == first and y == last) or
+            (x == last and y == first))]
+
+
+def version_information(version):
+    # The 18 bit version information for versions 7 and above, six bits of
+    # version number followed by a (18, 6) BCH code, see annex D of the ISO
+    # specification.
+    remainder = version << 12
+    for shift in range(5, -1, -1):
+        if remainder & (1 << (shift + 12)):
+            remainder ^= 0x1F25 << shift
+    return (version << 12) | remainder
+
+
+def version_information_positions(size):
+    # Co-ordinates for bits 0 (least significant) to 17 of the version
+    # information, bottom left block first then the top right block.
+    bottom_left = [[i // 3, size - 11 + (i % 3)] for i in range(18)]
+    top_right = [[size - 11 + (i % 3), i // 3] for i in range(18)]
+    return bottom_left, top_right
+
+
+class Layout(object):
+
+    def __init__(self, version):
+        self.version = version
+        self.size = size = (version * 4) + 17
+        # reserved[x][y] is True for every module which does not carry data,
+        # that is the finder patterns and their separators, the timing
+        # patterns, alignment patterns, the dark module and the areas kept for
+        # the format and version information.
+        reserved = [[False for y in range(size)] for x in range(size)]
+        for x in range(9):
+            for y in range(9):
+                reserved[x][y] = True
+        for x in range(size - 8, size):
+            for y in range(9):
+                reserved[x][y] = True
+                reserved[y][x] = True
+        for i in range(size):
+            reserved[i][6] = True
+            reserved[6][i] = True
+        for centre in alignment_centres(version):
+            for x in range(centre[0] - 2, centre[0] + 3):
+                for y in range(centre[1] - 2, centre[1] + 3):
+                    reserved[x][y] = True
+        if version >= 7:
+            for block in version_information_positions(size):
+                for x, y in block:
+                    reserved[x][y] = True
+        self.reserved = reserved
+        self.bit_positions = self.generate_bit_positions()
+        self.function_patterns = self.generate_function_patterns()
+        # Top left format information positions, most significant bit first,
+        # then the copy split between the bottom left and top right.
+        self.format_positions = (
+            [(x, 8) for x in range(6)] + [(7, 8), (8, 8), (8, 7)] +
+            [(8, y) for y in range(5, -1, -1)],
+            [(8, y) for y in range(size - 1, size - 8, -1)] +
+            [(x, 8) for x in range(size - 8, size)])
+        self.masks = [None] * 8
+
+    def generate_function_patterns(self):
+        # The finder, timing and alignment patterns and the dark module, as a
+        # tuple of one bytes object per column with 1 for a dark module.
+        # Each symbol starts from a copy of this.
+        size = self.size
+        columns = [bytearray(size) for x in range(size)]
+        for left, top in ((0, 0), (size - 7, 0), (0, size - 7)):
+            for dx in range(7):
+                for dy in range(7):
+                    # Dark outer ring and 3x3 centre, light ring between.
+                    if max(abs(dx - 3), abs(dy - 3)) != 2:
+                        columns[left + dx][top + dy] = 1
+        for i in range(8, size - 8, 2):
+            columns[i][6] = 1
+            columns[6][i] = 1
+        for x, y in alignment_centres(self.version):
+            for dx in range(-2, 3):
+                for dy in range(-2, 3):
+                    if max(abs(dx), abs(dy)) != 1:
+                        columns[x + dx][y + dy] = 1
+        columns[8][size - 8] = 1
+        return tuple(bytes(column) for column in columns)
+
+    def get_mask(self, n):
+        # Mask pattern n as a tuple of one bytes object per column, with 1
+        # where a module is to be inverted.  Reserved modules are never
+        # masked.
+        mask = self.masks[n]
+        if mask is None:
+            condition = MASK_PATTERNS[n]
+            reserved = self.reserved
+            mask = tuple(bytes([0 if reserved[x][y] else int(condition(y, x))
+                for y in range(self.size)]) for x in range(self.size))
+            self.masks[n] = mask
+        return mask
+
+    def generate_bit_positions(self):
+        # Walk two module wide columns from the right hand edge, alternately
+        # upwards and downwards, skipping the vertical timing pattern and any
+        # reserved module.  Returns [x, y] pairs in the order the bits of the
+        # final message are placed.
+        size = self.size
+        reserved = self.reserved
+        positions = []
+        upwards = True
+        right = size - 1
+        while right > 0:
+            if right == 6:
+                right -= 1
+            rows = range(size - 1, -1, -1) if upwards else range(size)
+            for y in rows:
+                for x in (right, right - 1):
+                    if not reserved[x][y]:
+                        positions.append((x, y))
+            upwards = not upwards
+            right -= 2
+        return positions
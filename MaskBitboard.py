@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Pure Python implementation of the masking stage for when NumPy is not
+# available.  Every column and row of a candidate is held as an integer with
+# bit y (or x) set for a dark module, masks are applied with one XOR per line
+# and the four penalty rules of section 7.8.3 of the ISO specification are
+# worked out with shifts, ANDs and popcounts, a fixed number of integer
+# operations per line.  Scores are identical to QR.test_one to QR.test_four.
+#
+# The 'pruned' strategy scores the cheap rules first and drops a candidate
+# as soon as its partial score shows it cannot win, the chosen mask is the
+# same.  The 'sampled' strategy scores every SAMPLE_STEP-th row and column
+# only, scaled up, for a mask which is usually but not always the best.
+
+from Layout import get_layout
+
+SAMPLE_STEP = 3
+_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_MODULES = bytes.maketrans(b'01', b'\x00\x01')
+_masks = {}
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(value):
+        return bin(value).count('1')
+
+
+def to_bits(modules):
+    # A line of 0/1 modules as an integer, module i becomes bit i.
+    return int(bytes(reversed(modules)).translate(_DIGITS), 2)
+
+
+def get_masks(version):
+    # For each of the eight mask patterns, the columns and the rows of the
+    # pattern as integers, reserved modules are left unmasked.
+    masks = _masks.get(version)
+    if masks is None:
+        layout = get_layout(version)
+        size = layout.size
+        masks = []
+        for n in range(8):
+            pattern = layout.get_mask(n)
+            columns = [to_bits(column) for column in pattern]
+            rows = [to_bits([pattern[x][y] for x in range(size)])
+                for y in range(size)]
+            masks.append((columns, rows))
+        masks = _masks.setdefault(version, masks)
+    return masks
+
+
+def select_mask(code, version, strategy='full'):
+    # Same contract as QR.select_mask, returns the lowest scoring mask, the
+    # masked symbol for it as a list of lists and the list of all eight
+    # scores.  Candidates dropped by the pruned strategy score None.
+    size = len(code)
+    step = SAMPLE_STEP if strategy == 'sampled' else 1
+    columns = [to_bits(column) for column in code]
+    rows = [to_bits([code[x][y] for x in range(size)]) for y in range(0,
+        size, step)]
+    masks = get_masks(version)
+    scores = []
+    lowest_index = None
+    for mask_columns, mask_rows in masks:
+        # Candidates are scored in order and ties go to the lower mask, so
+        # a later one must score strictly less than the best so far.
+        limit = None
+        if strategy == 'pruned' and lowest_index is not None:
+            limit = scores[lowest_index]
+        value = score([c ^ m for c, m in zip(columns, mask_columns)],
+            [r ^ m for r, m in zip(rows, mask_rows[::step])], size, step,
+            limit)
+        scores.append(value)
+        if value is not None and (lowest_index is None or
+                value < scores[lowest_index]):
+            lowest_index = len(scores) - 1
+    mask_columns = masks[lowest_index][0]
+    line = '0%db' % size
+    candidate = [list(format(c ^ m, line).encode('ascii')[::-1].translate(
+        _MODULES)) for c, m in zip(columns, mask_columns)]
+    return lowest_index, candidate, scores
+
+
+def score(columns, rows, size, step=1, limit=None):
+    # Total penalty for a candidate given as column and row bitboards.  With
+    # a step only every step-th column is scored, rows holds every step-th
+    # row, and their penalties are multiplied by step.  Given a limit, None
+    # is returned as soon as the penalty reaches it.
+    full = (1 << size) - 1
+    # Proportion of dark modules, always from every column.
+    dark = 0
+    for line in columns:
+        dark += popcount(line)
+    total = size * size
+    base = 10 * (abs(dark * 100 - total * 50) // (total * 5))
+    # 2x2 blocks from pairs of neighbouring columns.
+    blocks = 0
+    for x in range(0, size - 1, step):
+        left = columns[x]
+        right = columns[x + 1]
+        both_dark = left & right
+        both_light = ~(left | right) & full
+        blocks += popcount(both_dark & (both_dark >> 1))
+        blocks += popcount(both_light & (both_light >> 1))
+    penalty = blocks * 3
+    if limit is not None and base + penalty * step >= limit:
+        return None
+    for lines in (columns[::step], rows):
+        for line in lines:
+            penalty += line_penalty(line, full)
+            if limit is not None and base + penalty * step >= limit:
+                return None
+    return base + penalty * step
+
+
+def line_penalty(line, full):
+    # Rule one and rule three for a single row or column.
+    penalty = 0
+    for same in (line, ~line & full):
+        # Bit i of windows is set when modules i to i+4 share this colour, a
+        # run of length n >= 5 sets n - 4 consecutive bits and scores n - 2.
+        windows = same & (same >> 1) & (same >> 2) & (same >> 3) & (same >> 4)
+        if windows:
+            penalty += popcount(windows) + 2 * popcount(windows &
+                ~(windows << 1))
+    # Shift four light quiet zone modules in below the line, anything above
+    # it is light already.  Bit s of found is set where the dark-light-dark-
+    # dark-dark-light-dark pattern starts at bit s.
+    padded = line << 4
+    found = (padded & ~(padded >> 1) & (padded >> 2) & (padded >> 3) &
+        (padded >> 4) & ~(padded >> 5) & (padded >> 6))
+    found &= full << 4
+    if found:
+        light_before = ~(padded << 1 | padded << 2 | padded << 3 |
+            padded << 4)
+        light_after = ~(padded >> 7 | padded >> 8 | padded >> 9 |
+            padded >> 10)
+        penalty += 40 * popcount(found & (light_before | light_after))
+    return penalty
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# NumPy implementation of the masking stage.  All eight mask patterns for a
+# version are kept as one (8, N, N) stack, applied with a single XOR, and the
+# four penalty rules of section 7.8.3 of the ISO specification are worked out
+# for all eight candidates together.  Scores are identical to QR.test_one to
+# QR.test_four.  Importing this module raises ImportError when NumPy is not
+# installed, in which case QR falls back to the pure Python path.
+#
+# Scoring all eight together leaves nothing to prune, so the 'pruned'
+# strategy is the same as 'full' here.  The 'sampled' strategy scores every
+# SAMPLE_STEP-th row and column only, as MaskBitboard does.
+
+import numpy
+
+from Layout import get_layout
+from MaskBitboard import SAMPLE_STEP
+
+_masks = {}
+
+
+def get_masks(version):
+    # The (8, N, N) stack of mask patterns for a version, indexed [n][x][y]
+    # like the symbol itself, with every reserved module left unmasked.
+    masks = _masks.get(version)
+    if masks is None:
+        layout = get_layout(version)
+        # i is the row and j the column, as in table 10 of the ISO
+        # specification.
+        j, i = numpy.indices((layout.size, layout.size))
+        product = i * j
+        masks = numpy.array([
+            (i + j) % 2 == 0,
+            i % 2 == 0,
+            j % 3 == 0,
+            (i + j) % 3 == 0,
+            ((i // 2) + (j // 3)) % 2 == 0,
+            (product % 2) + (product % 3) == 0,
+            ((product % 2) + (product % 3)) % 2 == 0,
+            (((i + j) % 2) + (product % 3)) % 2 == 0])
+        masks &= ~numpy.array(layout.reserved, dtype=bool)
+        masks = _masks.setdefault(version, masks.astype(numpy.uint8))
+    return masks
+
+
+def select_mask(code, version, strategy='full'):
+    # Same contract as QR.select_mask, returns the lowest scoring mask, the
+    # masked symbol for it as a list of lists and the list of all eight
+    # scores.
+    candidates = numpy.asarray(code, dtype=numpy.uint8)[None] ^ get_masks(
+        version)
+    scores = score(candidates, SAMPLE_STEP if strategy == 'sampled' else 1)
+    lowest_index = scores.index(min(scores))
+    return lowest_index, candidates[lowest_index].tolist(), scores
+
+
+def score(candidates, step=1):
+    # Total penalty for each of a (k, N, N) stack of candidates.  With a
+    # step only every step-th column and row is scored for rules one to
+    # three and their penalties are multiplied by step.
+    columns = candidates[:, ::step]
+    rows = candidates.transpose(0, 2, 1)[:, ::step]
+    total = (rule_one(columns) + rule_one(rows) + rule_two(candidates, step) +
+        rule_three(columns) + rule_three(rows)) * step + rule_four(candidates)
+    return [int(value) for value in total]
+
+
+def rule_one(candidates):
+    # Runs of five or more modules of the same colour along the last axis.
+    # Every line is bounded by an edge at both ends, after flattening the
+    # distance between consecutive edges is a run length.  The extra edge
+    # between lines makes a run of length one which never scores.
+    count, lines, length = candidates.shape
+    edges = numpy.ones((count, lines, length + 1), dtype=bool)
+    edges[:, :, 1:length] = candidates[:, :, 1:] != candidates[:, :, :-1]
+    positions = numpy.flatnonzero(edges)
+    runs = numpy.diff(positions)
+    owner = positions[:-1] // (lines * (length + 1))
+    points = numpy.where(runs >= 5, runs - 2, 0)
+    return numpy.bincount(owner, weights=points, minlength=count).astype(
+        numpy.int64)
+
+
+def rule_two(candidates, step=1):
+    # 2x2 blocks of the same colour, from every step-th pair of neighbouring
+    # columns.
+    left = candidates[:, 0:-1:step]
+    right = candidates[:, 1::step]
+    top_left = left[:, :, :-1]
+    same = ((top_left == right[:, :, :-1]) &
+        (top_left == left[:, :, 1:]) &
+        (top_left == right[:, :, 1:]))
+    return same.sum(axis=(1, 2), dtype=numpy.int64) * 3
+
+
+def rule_three(candidates):
+    # 1:1:3:1:1 patterns along the last axis with four light modules on at
+    # least one side, the quiet zone around the symbol counts as light.
+    count, lines, length = candidates.shape
+    if length < 7:
+        return numpy.zeros(count, dtype=numpy.int64)
+    padded = numpy.zeros((count, lines, length + 8), dtype=numpy.int32)
+    padded[:, :, 4:length + 4] = candidates
+    starts = length - 6
+    found = numpy.ones((count, lines, starts), dtype=bool)
+    for k, bit in enumerate((1, 0, 1, 1, 1, 0, 1)):
+        found &= padded[:, :, 4 + k:4 + k + starts] == bit
+    # Dark modules in the four before and four after each start, from a
+    # running total along the line.
+    running = numpy.zeros((count, lines, length + 9), dtype=numpy.int32)
+    numpy.cumsum(padded, axis=2, out=running[:, :, 1:])
+    before = running[:, :, 4:4 + starts] - running[:, :, 0:starts]
+    after = running[:, :, 15:15 + starts] - running[:, :, 11:11 + starts]
+    found &= (before == 0) | (after == 0)
+    return found.sum(axis=(1, 2), dtype=numpy.int64) * 40
+
+
+def rule_four(candidates):
+    # Proportion of dark modules.
+    count, width, height = candidates.shape
+    total = width * height
+    dark = candidates.sum(axis=(1, 2), dtype=numpy.int64)
+    return 10 * (numpy.abs(dark * 100 - total * 50) // (total * 5))
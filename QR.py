@@ -2,17 +2,38 @@
 # -*- coding: utf-8 -*-
 
 from SVG import SVG
-import sys
-import math
+from Raster import Raster
+from BitBuffer import BitBuffer
+from Segment import Segment, segment
+from Instrument import stage, Recorder, replay
+from Layout import get_layout, version_information, \
+    version_information_positions, MASK_PATTERNS
+import ReedSolomon
+import MaskBitboard
+try:
+    import MaskNumPy
+except ImportError:
+    MaskNumPy = None
+try:
+    import ReedSolomonNumPy
+except ImportError:
+    ReedSolomonNumPy = None
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import bisect
+import codecs
+import itertools
+import os
 
-# 1. for the inital script, all data is to be encoded as alpha numeric
-# 2. get the length of the input string
+# 1. split the input into the numeric, alphanumeric, byte and kanji segments
+#       which encode it in the fewest bits, see Segment.py.
+# 2. get the length of each segment
 # 3. get the error correction level
 # 4. determine the smallest version we can use, using table 7 in the ISO 
 #       standard.
 # 5. add the mode indicator from table 2 within the ISO standard.
 # 6. add the character count indicator from table 3 of ISO
-# 7. encode data using the alpha numeric encoding.
+# 7. encode the data of each segment in its mode.
 # 8. add terminator zeros. 
 #       check the required length of the data stream 
 #       do this by checking out the required number of data codewords for the 
@@ -24,42 +45,439 @@ import math
 #           than four just add four zeros '0000' else, add the number of zeros 
 #           required to get it up to the correct length.
 
+def encode(error, data, backend=None, version=None, mask=None, 
+        observer=None, structured_append=None, strategy=None, eci=None,
+        encoding=None):
+    # Encode data, text or a bytes-like object, at the given error 
+    # correction level and return the finished QRMatrix.  Nothing is 
+    # written to disk, rendering is a separate step.
+    return QR(error, data, backend, version, mask, observer, 
+        structured_append, strategy, eci, encoding).matrix
+
+
+def encode_many(iterable, error='M', workers=None, chunksize=64, 
+        verify=False, **options):
+    # Encode every item of iterable at the given error correction level, 
+    # yielding a BatchResult for each in input order.  Items are sent to a 
+    # pool of worker processes (one per CPU by default) chunksize at a time
+    # and only a few chunks per worker are in flight, so the input is read 
+    # and the results are produced lazily.  An item which fails, for example
+    # because it is too long, is reported on its result and the batch 
+    # carries on.  With verify each symbol is decoded again and any which 
+    # does not read back as its input fails with Decoder.VerificationError.  
+    # Any other keyword arguments are passed on to encode.  With more than
+    # one worker, what each worker tells its observer is recorded and 
+    # replayed to the observer passed, or failing that QR.OBSERVER, in this
+    # process as each result is yielded, and the returned matrices report
+    # rendering to it.
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunk(iterable, chunksize)
+    if workers == 1:
+        for start, items in chunks:
+            results, events = _encode_chunk(start, items, error, options, 
+                verify)
+            for result in results:
+                yield result
+        return
+    options = dict(options)
+    observer = options.pop('observer', None)
+    if observer is None:
+        observer = QR.OBSERVER
+    record = observer is not None
+    pool = ProcessPoolExecutor(workers)
+    pending = deque()
+    try:
+        for start, items in itertools.islice(chunks, workers * 2):
+            pending.append(pool.submit(_encode_chunk, start, items, error, 
+                options, verify, record))
+        while pending:
+            results, events = pending.popleft().result()
+            for start, items in itertools.islice(chunks, 1):
+                pending.append(pool.submit(_encode_chunk, start, items, 
+                    error, options, verify, record))
+            for i, result in enumerate(results):
+                if record:
+                    replay(events[i], observer)
+                    if result.matrix is not None:
+                        result.matrix.observer = observer
+                yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown()
+
+
+def _chunk(iterable, chunksize):
+    # Split an iterable into (index of first item, list of items) pairs.
+    iterator = iter(iterable)
+    start = 0
+    while True:
+        items = list(itertools.islice(iterator, chunksize))
+        if not items:
+            return
+        yield start, items
+        start += len(items)
+
+
+def _encode_chunk(start, items, error, options, verify, record=False):
+    # Runs in a worker process.  Returns the results and, with record, the
+    # events of a Recorder observing each item, otherwise None.
+    if verify:
+        # Imported here as the decoder itself is built on this module.
+        from Decoder import verify as verify_matrix
+    results = []
+    events = [] if record else None
+    for index, data in enumerate(items, start):
+        if record:
+            recorder = Recorder()
+            options = dict(options, observer=recorder)
+            events.append(recorder.events)
+        try:
+            matrix = encode(error, data, **options)
+            if verify:
+                verify_matrix(matrix, data)
+            results.append(BatchResult(index, data, matrix))
+        except Exception as exception:
+            results.append(BatchResult(index, data, None, exception))
+    return results, events
+
+
+# 0/1 modules to and from the characters of a binary number.
+_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_MODULES = bytes.maketrans(b'01', b'\x00\x01')
+# Versions sharing the same width of character count indicators.
+VERSION_RANGES = ((1, 9), (10, 26), (27, 40))
+_capacities = {}
+
+
+class DataTooLongError(ValueError):
+    # Raised when the input does not fit in a version 40 code at the 
+    # requested error correction level.  required and capacity, where 
+    # known, are the bits the input needs and the bits the largest allowed
+    # symbol holds.
+    def __init__(self, message, required=None, capacity=None):
+        ValueError.__init__(self, message)
+        self.required = required
+        self.capacity = capacity
+
+    def __reduce__(self):
+        # Keep required and capacity when sent back from a worker process.
+        return DataTooLongError, (str(self), self.required, self.capacity)
+
+
+class BatchResult(object):
+
+    # One item of an encode_many batch.  matrix is the QRMatrix, or None when
+    # encoding failed in which case error holds the exception raised.
+    def __init__(self, index, data, matrix, error=None):
+        self.index = index
+        self.data = data
+        self.matrix = matrix
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class QRMatrix(object):
+
+    # A finished symbol, format information included and quiet zone 
+    # excluded.  The modules are held in a single bytearray, one byte of 0
+    # (light) or 1 (dark) each, column after column, so matrix[x][y] is the
+    # module in column x and row y.  Columns and rows are available as 
+    # memoryviews of it without copying and buffer exports all of it, for
+    # example numpy.frombuffer(matrix.buffer, numpy.uint8).reshape(size, 
+    # size) is indexed [x][y] the same way.  modules may be a list of columns
+    # or a bytes-like object in this layout.  observer, if given, is told 
+    # about rendering; it is not kept when the matrix is pickled, for example
+    # to send it back from a worker process.
+
+    __slots__ = ('data', 'size', 'version', 'error_char', 'mask', 'observer')
+
+    def __init__(self, modules, version, error_char, mask, observer=None):
+        size = (version * 4) + 17
+        if isinstance(modules, (bytes, bytearray, memoryview)):
+            data = bytearray(modules)
+        else:
+            data = bytearray().join(map(bytes, modules))
+        if len(data) != size * size:
+            raise ValueError('A version ' + str(version) + ' symbol has ' + 
+                str(size * size) + ' modules, got ' + str(len(data)))
+        self.data = data
+        self.size = size
+        self.version = version
+        self.error_char = error_char
+        self.mask = mask
+        self.observer = observer
+
+    def __getstate__(self):
+        return (bytes(self.data), self.version, self.error_char, self.mask)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __repr__(self):
+        return 'QRMatrix(version=%d, error_char=%r, mask=%r)' % (self.version,
+            self.error_char, self.mask)
+
+    def __eq__(self, other):
+        if not isinstance(other, QRMatrix):
+            return NotImplemented
+        return (self.data == other.data and self.version == other.version and
+            self.error_char == other.error_char and self.mask == other.mask)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, x):
+        return self.column(x)
+
+    def column(self, x):
+        # Column x, top to bottom, as a writable view.
+        if not 0 <= x < self.size:
+            raise IndexError('column index out of range')
+        return memoryview(self.data)[x * self.size:(x + 1) * self.size]
+
+    def row(self, y):
+        # Row y, left to right, as a writable view.
+        if not 0 <= y < self.size:
+            raise IndexError('row index out of range')
+        return memoryview(self.data)[y::self.size]
+
+    def rows(self):
+        # Every row as a bytes object, top to bottom.
+        data = self.data
+        return [bytes(data[y::self.size]) for y in range(self.size)]
+
+    @property
+    def buffer(self):
+        # The modules as a writable one dimensional view.
+        return memoryview(self.data)
+
+    def __buffer__(self, flags):
+        # Buffer protocol export on Python 3.12 and later.
+        return memoryview(self.data)
+
+    @property
+    def modules(self):
+        # The modules as a new list of lists, modules[x][y].
+        size = self.size
+        data = self.data
+        return [list(data[x:x + size]) for x in range(0, size * size, size)]
+
+    def copy(self):
+        return QRMatrix(self.data, self.version, self.error_char, self.mask,
+            self.observer)
+
+    def xor(self, other):
+        # Invert every module set in other, a QRMatrix, a bytes-like object 
+        # in the same layout or a list of columns such as a mask from 
+        # QR.get_mask, in place.  Returns the matrix.
+        if isinstance(other, QRMatrix):
+            other = other.data
+        elif not isinstance(other, (bytes, bytearray, memoryview)):
+            other = bytearray().join(map(bytes, other))
+        if len(other) != len(self.data):
+            raise ValueError('Cannot combine symbols of different sizes')
+        self.data[:] = (int.from_bytes(self.data, 'big') ^ int.from_bytes(
+            other, 'big')).to_bytes(len(self.data), 'big')
+        return self
+
+    def to_packed(self):
+        # A compact serialisation: version, error correction level and mask
+        # then the modules eight to a byte, column by column.
+        count = len(self.data)
+        padding = -count % 8
+        bits = int(self.data.translate(_DIGITS), 2) << padding
+        return bytes([self.version, ord(self.error_char), self.mask]) + \
+            bits.to_bytes((count + padding) // 8, 'big')
+
+    @classmethod
+    def from_packed(cls, data):
+        # The reverse of to_packed.
+        version = data[0]
+        count = ((version * 4) + 17) ** 2
+        padding = -count % 8
+        bits = int.from_bytes(data[3:], 'big') >> padding
+        modules = format(bits, '0%db' % count).encode('ascii').translate(
+            _MODULES)
+        return cls(modules, version, chr(data[1]), data[2])
+
+    def write_svg(self, stream, **options):
+        # Write the symbol as SVG to a file-like object, options are passed
+        # to SVG: module_size, quiet_zone, dark and light.
+        with stage(self.observer, 'render'):
+            SVG(**options).write(self, stream)
+
+    def to_svg(self, **options):
+        # The SVG document as UTF-8 encoded bytes.
+        return self.to_bytes('svg', **options)
+
+    def save_svg(self, filename, **options):
+        # Write the symbol to <filename>.svg.
+        with open(filename + '.svg', 'wb') as f:
+            self.write_svg(f, **options)
+
+    def write_png(self, stream, **options):
+        # Write the symbol as a 1-bit PNG to a binary file-like object, 
+        # options are passed to Raster: module_size and quiet_zone.
+        with stage(self.observer, 'render'):
+            Raster(**options).write_png(self, stream)
+
+    def to_png(self, **options):
+        return self.to_bytes('png', **options)
+
+    def save_png(self, filename, **options):
+        # Write the symbol to <filename>.png.
+        with open(filename + '.png', 'wb') as f:
+            self.write_png(f, **options)
+
+    def to_bytes(self, format='svg', **options):
+        # The symbol rendered as 'svg', 'png', 'pbm' or 'pgm'.
+        with stage(self.observer, 'render'):
+            if format == 'svg':
+                content = SVG(**options).to_bytes(self)
+            else:
+                content = Raster(**options).to_bytes(self, format)
+        if self.observer is not None:
+            self.observer.count('output_bytes', len(content))
+        return content
+
+
 class QR(object):
 
-    # Lists the capacity of the code to store [N]umeric or [A]lphanumeric 
-    # characters.  As well as the required number of [D]ata codewords and 
-    # [E]rror codewords.  Based upon table 7 (and some 9) of the ISO 
+    # The error correction block structure for every version and error
+    # correction level, based upon table 9 of the ISO specification.  Each 
+    # entry is (error codewords per block, blocks in group 1, data codewords
+    # per group 1 block, blocks in group 2, data codewords per group 2 block).
+    # Group 2 blocks, where there are any, hold one more data codeword than
+    # those in group 1.
+    TABLE_9 = [{},
+        {'L':(7, 1, 19, 0, 0), 'M':(10, 1, 16, 0, 0),
+        'Q':(13, 1, 13, 0, 0), 'H':(17, 1, 9, 0, 0)}, # V1
+        {'L':(10, 1, 34, 0, 0), 'M':(16, 1, 28, 0, 0),
+        'Q':(22, 1, 22, 0, 0), 'H':(28, 1, 16, 0, 0)}, # V2
+        {'L':(15, 1, 55, 0, 0), 'M':(26, 1, 44, 0, 0),
+        'Q':(18, 2, 17, 0, 0), 'H':(22, 2, 13, 0, 0)}, # V3
+        {'L':(20, 1, 80, 0, 0), 'M':(18, 2, 32, 0, 0),
+        'Q':(26, 2, 24, 0, 0), 'H':(16, 4, 9, 0, 0)}, # V4
+        {'L':(26, 1, 108, 0, 0), 'M':(24, 2, 43, 0, 0),
+        'Q':(18, 2, 15, 2, 16), 'H':(22, 2, 11, 2, 12)}, # V5
+        {'L':(18, 2, 68, 0, 0), 'M':(16, 4, 27, 0, 0),
+        'Q':(24, 4, 19, 0, 0), 'H':(28, 4, 15, 0, 0)}, # V6
+        {'L':(20, 2, 78, 0, 0), 'M':(18, 4, 31, 0, 0),
+        'Q':(18, 2, 14, 4, 15), 'H':(26, 4, 13, 1, 14)}, # V7
+        {'L':(24, 2, 97, 0, 0), 'M':(22, 2, 38, 2, 39),
+        'Q':(22, 4, 18, 2, 19), 'H':(26, 4, 14, 2, 15)}, # V8
+        {'L':(30, 2, 116, 0, 0), 'M':(22, 3, 36, 2, 37),
+        'Q':(20, 4, 16, 4, 17), 'H':(24, 4, 12, 4, 13)}, # V9
+        {'L':(18, 2, 68, 2, 69), 'M':(26, 4, 43, 1, 44),
+        'Q':(24, 6, 19, 2, 20), 'H':(28, 6, 15, 2, 16)}, # V10
+        {'L':(20, 4, 81, 0, 0), 'M':(30, 1, 50, 4, 51),
+        'Q':(28, 4, 22, 4, 23), 'H':(24, 3, 12, 8, 13)}, # V11
+        {'L':(24, 2, 92, 2, 93), 'M':(22, 6, 36, 2, 37),
+        'Q':(26, 4, 20, 6, 21), 'H':(28, 7, 14, 4, 15)}, # V12
+        {'L':(26, 4, 107, 0, 0), 'M':(22, 8, 37, 1, 38),
+        'Q':(24, 8, 20, 4, 21), 'H':(22, 12, 11, 4, 12)}, # V13
+        {'L':(30, 3, 115, 1, 116), 'M':(24, 4, 40, 5, 41),
+        'Q':(20, 11, 16, 5, 17), 'H':(24, 11, 12, 5, 13)}, # V14
+        {'L':(22, 5, 87, 1, 88), 'M':(24, 5, 41, 5, 42),
+        'Q':(30, 5, 24, 7, 25), 'H':(24, 11, 12, 7, 13)}, # V15
+        {'L':(24, 5, 98, 1, 99), 'M':(28, 7, 45, 3, 46),
+        'Q':(24, 15, 19, 2, 20), 'H':(30, 3, 15, 13, 16)}, # V16
+        {'L':(28, 1, 107, 5, 108), 'M':(28, 10, 46, 1, 47),
+        'Q':(28, 1, 22, 15, 23), 'H':(28, 2, 14, 17, 15)}, # V17
+        {'L':(30, 5, 120, 1, 121), 'M':(26, 9, 43, 4, 44),
+        'Q':(28, 17, 22, 1, 23), 'H':(28, 2, 14, 19, 15)}, # V18
+        {'L':(28, 3, 113, 4, 114), 'M':(26, 3, 44, 11, 45),
+        'Q':(26, 17, 21, 4, 22), 'H':(26, 9, 13, 16, 14)}, # V19
+        {'L':(28, 3, 107, 5, 108), 'M':(26, 3, 41, 13, 42),
+        'Q':(30, 15, 24, 5, 25), 'H':(28, 15, 15, 10, 16)}, # V20
+        {'L':(28, 4, 116, 4, 117), 'M':(26, 17, 42, 0, 0),
+        'Q':(28, 17, 22, 6, 23), 'H':(30, 19, 16, 6, 17)}, # V21
+        {'L':(28, 2, 111, 7, 112), 'M':(28, 17, 46, 0, 0),
+        'Q':(30, 7, 24, 16, 25), 'H':(24, 34, 13, 0, 0)}, # V22
+        {'L':(30, 4, 121, 5, 122), 'M':(28, 4, 47, 14, 48),
+        'Q':(30, 11, 24, 14, 25), 'H':(30, 16, 15, 14, 16)}, # V23
+        {'L':(30, 6, 117, 4, 118), 'M':(28, 6, 45, 14, 46),
+        'Q':(30, 11, 24, 16, 25), 'H':(30, 30, 16, 2, 17)}, # V24
+        {'L':(26, 8, 106, 4, 107), 'M':(28, 8, 47, 13, 48),
+        'Q':(30, 7, 24, 22, 25), 'H':(30, 22, 15, 13, 16)}, # V25
+        {'L':(28, 10, 114, 2, 115), 'M':(28, 19, 46, 4, 47),
+        'Q':(28, 28, 22, 6, 23), 'H':(30, 33, 16, 4, 17)}, # V26
+        {'L':(30, 8, 122, 4, 123), 'M':(28, 22, 45, 3, 46),
+        'Q':(30, 8, 23, 26, 24), 'H':(30, 12, 15, 28, 16)}, # V27
+        {'L':(30, 3, 117, 10, 118), 'M':(28, 3, 45, 23, 46),
+        'Q':(30, 4, 24, 31, 25), 'H':(30, 11, 15, 31, 16)}, # V28
+        {'L':(30, 7, 116, 7, 117), 'M':(28, 21, 45, 7, 46),
+        'Q':(30, 1, 23, 37, 24), 'H':(30, 19, 15, 26, 16)}, # V29
+        {'L':(30, 5, 115, 10, 116), 'M':(28, 19, 47, 10, 48),
+        'Q':(30, 15, 24, 25, 25), 'H':(30, 23, 15, 25, 16)}, # V30
+        {'L':(30, 13, 115, 3, 116), 'M':(28, 2, 46, 29, 47),
+        'Q':(30, 42, 24, 1, 25), 'H':(30, 23, 15, 28, 16)}, # V31
+        {'L':(30, 17, 115, 0, 0), 'M':(28, 10, 46, 23, 47),
+        'Q':(30, 10, 24, 35, 25), 'H':(30, 19, 15, 35, 16)}, # V32
+        {'L':(30, 17, 115, 1, 116), 'M':(28, 14, 46, 21, 47),
+        'Q':(30, 29, 24, 19, 25), 'H':(30, 11, 15, 46, 16)}, # V33
+        {'L':(30, 13, 115, 6, 116), 'M':(28, 14, 46, 23, 47),
+        'Q':(30, 44, 24, 7, 25), 'H':(30, 59, 16, 1, 17)}, # V34
+        {'L':(30, 12, 121, 7, 122), 'M':(28, 12, 47, 26, 48),
+        'Q':(30, 39, 24, 14, 25), 'H':(30, 22, 15, 41, 16)}, # V35
+        {'L':(30, 6, 121, 14, 122), 'M':(28, 6, 47, 34, 48),
+        'Q':(30, 46, 24, 10, 25), 'H':(30, 2, 15, 64, 16)}, # V36
+        {'L':(30, 17, 122, 4, 123), 'M':(28, 29, 46, 14, 47),
+        'Q':(30, 49, 24, 10, 25), 'H':(30, 24, 15, 46, 16)}, # V37
+        {'L':(30, 4, 122, 18, 123), 'M':(28, 13, 46, 32, 47),
+        'Q':(30, 48, 24, 14, 25), 'H':(30, 42, 15, 32, 16)}, # V38
+        {'L':(30, 20, 117, 4, 118), 'M':(28, 40, 47, 7, 48),
+        'Q':(30, 43, 24, 22, 25), 'H':(30, 10, 15, 67, 16)}, # V39
+        {'L':(30, 19, 118, 6, 119), 'M':(28, 18, 47, 31, 48),
+        'Q':(30, 34, 24, 34, 25), 'H':(30, 20, 15, 61, 16)}] # V40
+    # Number of bits in the character count indicator for each mode, for 
+    # versions 1 to 9, 10 to 26 and 27 to 40.  Based upon table 3 of the ISO
     # specification.
-    TABLE_7_9 = [{
-        'L':{'N':0, 'A':0, 'D':0, 'E':0},
-        'M':{'N':0, 'A':0, 'D':0, 'E':0}, 
-        'Q':{'N':0, 'A':0, 'D':0, 'E':0}, 
-        'H':{'N':0, 'A':0, 'D':0, 'E':0}},{ # V1...
-        'L':{'N':41, 'A':25, 'D':19, 'E':7}, 
-        'M':{'N':34, 'A':20, 'D':16, 'E':10}, 
-        'Q':{'N':27, 'A':16, 'D':13, 'E':13}, 
-        'H':{'N':17, 'A':10, 'D':9, 'E':17}},{ # V2...
-        'L':{'N':77, 'A':47, 'D':34, 'E':10}, 
-        'M':{'N':63, 'A':38, 'D':28, 'E':16}, 
-        'Q':{'N':48, 'A':29, 'D':22, 'E':22}, 
-        'H':{'N':34, 'A':20, 'D':16, 'E':28}},{ # V3...
-        'L':{'N':127, 'A':77, 'D':55, 'E':15}, 
-        'M':{'N':101, 'A':61, 'D':44, 'E':26}, 
-        'Q':{'N':77, 'A':47, 'D':34, 'E':36}, 
-        'H':{'N':58, 'A':35, 'D':26, 'E':44}}]
-    TABLE_9 = [{},{
-        'L':{'BLOCKS':1,'DATA':19,'ERROR':7},
-        'M':{'BLOCKS':1,'DATA':16,'ERROR':10},
-        'Q':{'BLOCKS':1,'DATA':13,'ERROR':13},
-        'H':{'BLOCKS':1,'DATA':9,'ERROR':17}},{ # v2...
-        'L':{'BLOCKS':1,'DATA':34,'ERROR':10},
-        'M':{'BLOCKS':1,'DATA':28,'ERROR':16},
-        'Q':{'BLOCKS':1,'DATA':22,'ERROR':22},
-        'H':{'BLOCKS':1,'DATA':16,'ERROR':28}},{ # v3
-        'L':{'BLOCKS':1,'DATA':55,'ERROR':15},
-        'M':{'BLOCKS':1,'DATA':44,'ERROR':26},
-        'Q':{'BLOCKS':2,'DATA':17,'ERROR':18},
-        'H':{'BLOCKS':2,'DATA':13,'ERROR':22}}]
+    TABLE_3 = {'N':(10, 12, 14), 'A':(9, 11, 13), 'B':(8, 16, 16), 
+        'K':(8, 10, 12)}
+    # 'S' is the structured append header and 'E' an extended channel 
+    # interpretation (ECI) header, neither has a character count indicator.
+    MODE_INDICATORS = {'N':'0001', 'A':'0010', 'B':'0100', 'K':'1000', 
+        'S':'0011', 'E':'0111'}
+    HEADER_MODES = ('S', 'E')
+    # Character sets of the ECI designators text may be encoded with, byte 
+    # segments of bytes-like input may be given any designator.
+    ECI_ENCODINGS = {3:'iso-8859-1', 20:'shift_jis', 26:'utf-8'}
+    ECI_UTF8 = 26
+    # Alphanumeric character values, table 5 of the ISO specification.
+    TABLE_5 = {
+        '0':0, '1':1, '2':2, '3':3, '4':4, '5':5, '6':6, '7':7, 
+        '8':8, '9':9, 'A':10, 'B':11, 'C':12, 'D':13, 'E':14, 'F':15, 'G':16, 
+        'H':17, 'I':18, 'J':19, 'K':20, 'L':21, 'M':22, 'N':23, 'O':24, 'P':25,
+        'Q':26, 'R':27, 'S':28, 'T':29, 'U':30, 'V':31, 'W':32, 'X':33, 'Y':34,
+        'Z':35, ' ':36, '$':37, '%':38, '*':39, '+':40, '-':41, '.':42, '/':43,
+        ':':44}
+    # Pad codewords alternately added to fill the data capacity.
+    PAD_BYTES = bytes([0xEC, 0x11])
+    # How the eight mask candidates are applied and scored.  'numpy' scores
+    # all of them at once and is used whenever NumPy is installed, otherwise
+    # 'bitboard' scores rows and columns held as integers.  'python' runs
+    # test_one to test_four module by module.
+    MASK_BACKEND = 'bitboard' if MaskNumPy is None else 'numpy'
+    # How much scoring is done.  'full' scores all eight candidates in full,
+    # 'pruned' drops a candidate as soon as it cannot win and always picks 
+    # the same mask, 'sampled' scores a third of the rows and columns and 
+    # usually picks the same mask.  A fixed mask skips scoring altogether.
+    MASK_STRATEGIES = ('full', 'pruned', 'sampled')
+    MASK_STRATEGY = 'full'
+    # Observer told about every code made without one of its own, see 
+    # Instrument.py.  None turns instrumentation off.
+    OBSERVER = None
     FORMAT_INFORMATION = {
     'L':['111011111000100','111001011110011','111110110101010',
         '111100010011101','110011000101111','110001100011000',
@@ -74,313 +492,395 @@ class QR(object):
         '001100111010000','000011101100010','000001001010101',
         '000110100001100','000100000111011']}
 
-    # Where in the qr code is data inserted, this depends on the version.
-    bit_positions = [[], [], [], []]
-    bit_positions[0] = []
-    bit_positions[1] = [[20,20],[19,20],[20,19],[19,19],[20,18],[19,18],
-    [20,17],[19,17],[20,16],[19,16],[20,15],[19,15],[20,14],[19,14],[20,13],
-    [19,13],[20,12],[19,12],[20,11],[19,11],[20,10],[19,10],[20,9],[19,9],
-    [18,9],[17,9],[18,10],[17,10],[18,11],[17,11],[18,12],[17,12],[18,13],
-    [17,13],[18,14],[17,14],[18,15],[17,15],[18,16],[17,16],[18,17],[17,17],
-    [18,18],[17,18],[18,19],[17,19],[18,20],[17,20],[16,20],[15,20],[16,19],
-    [15,19],[16,18],[15,18],[16,17],[15,17],[16,16],[15,16],[16,15],[15,15],
-    [16,14],[15,14],[16,13],[15,13],[16,12],[15,12],[16,11],[15,11],[16,10],
-    [15,10],[16,9],[15,9],[14,9],[13,9],[14,10],[13,10],[14,11],[13,11],
-    [14,12],[13,12],[14,13],[13,13],[14,14],[13,14],[14,15],[13,15],[14,16],
-    [13,16],[14,17],[13,17],[14,18],[13,18],[14,19],[13,19],[14,20],[13,20],
-    [12,20],[11,20],[12,19],[11,19],[12,18],[11,18],[12,17],[11,17],[12,16],
-    [11,16],[12,15],[11,15],[12,14],[11,14],[12,13],[11,13],[12,12],[11,12],
-    [12,11],[11,11],[12,10],[11,10],[12,9],[11,9],[12,8],[11,8],[12,7],[11,7],
-    [12,5],[11,5],[12,4],[11,4],[12,3],[11,3],[12,2],[11,2],[12,1],[11,1],
-    [12,0],[11,0],[10,0],[9,0],[10,1],[9,1],[10,2],[9,2],[10,3],[9,3],[10,4],
-    [9,4],[10,5],[9,5],[10,7],[9,7],[10,8],[9,8],[10,9],[9,9],[10,10],[9,10],
-    [10,11],[9,11],[10,12],[9,12],[10,13],[9,13],[10,14],[9,14],[10,15],[9,15],
-    [10,16],[9,16],[10,17],[9,17],[10,18],[9,18],[10,19],[9,19],[10,20],[9,20],
-    [8,12],[7,12],[8,11],[7,11],[8,10],[7,10],[8,9],[7,9],[5,9],[4,9],[5,10],
-    [4,10],[5,11],[4,11],[5,12],[4,12],[3,12],[2,12],[3,11],[2,11],[3,10],
-    [2,10],[3,9],[2,9],[1,9],[0,9],[1,10],[0,10],[1,11],[0,11],[1,12],[0,12]]
-    bit_positions[2] = [[24,24],[23,24],[24,23],[23,23],[24,22],[23,22],
-    [24,21],[23,21],[24,20],[23,20],[24,19],[23,19],[24,18],[23,18],[24,17],
-    [23,17],[24,16],[23,16],[24,15],[23,15],[24,14],[23,14],[24,13],[23,13],
-    [24,12],[23,12],[24,11],[23,11],[24,10],[23,10],[24,9],[23,9],[22,9],
-    [21,9],[22,10],[21,10],[22,11],[21,11],[22,12],[21,12],[22,13],[21,13],
-    [22,14],[21,14],[22,15],[21,15],[22,16],[21,16],[22,17],[21,17],[22,18],
-    [21,18],[22,19],[21,19],[22,20],[21,20],[22,21],[21,21],[22,22],[21,22],
-    [22,23],[21,23],[22,24],[21,24],[20,24],[19,24],[20,23],[19,23],[20,22],
-    [19,22],[20,21],[19,21],[20,15],[19,15],[20,14],[19,14],[20,13],[19,13],
-    [20,12],[19,12],[20,11],[19,11],[20,10],[19,10],[20,9],[19,9],[18,9],
-    [17,9],[18,10],[17,10],[18,11],[17,11],[18,12],[17,12],[18,13],[17,13],
-    [18,14],[17,14],[18,15],[17,15],[18,21],[17,21],[18,22],[17,22],[18,23],
-    [17,23],[18,24],[17,24],[16,24],[15,24],[16,23],[15,23],[16,22],[15,22],
-    [16,21],[15,21],[15,20],[15,19],[15,18],[15,17],[15,16],[16,15],[15,15],
-    [16,14],[15,14],[16,13],[15,13],[16,12],[15,12],[16,11],[15,11],[16,10],
-    [15,10],[16,9],[15,9],[16,8],[15,8],[16,7],[15,7],[16,5],[15,5],[16,4],
-    [15,4],[16,3],[15,3],[16,2],[15,2],[16,1],[15,1],[16,0],[15,0],[14,0],
-    [13,0],[14,1],[13,1],[14,2],[13,2],[14,3],[13,3],[14,4],[13,4],[14,5],
-    [13,5],[14,7],[13,7],[14,8],[13,8],[14,9],[13,9],[14,10],[13,10],[14,11],
-    [13,11],[14,12],[13,12],[14,13],[13,13],[14,14],[13,14],[14,15],[13,15],
-    [14,16],[13,16],[14,17],[13,17],[14,18],[13,18],[14,19],[13,19],[14,20],
-    [13,20],[14,21],[13,21],[14,22],[13,22],[14,23],[13,23],[14,24],[13,24],
-    [12,24],[11,24],[12,23],[11,23],[12,22],[11,22],[12,21],[11,21],[12,20],
-    [11,20],[12,19],[11,19],[12,18],[11,18],[12,17],[11,17],[12,16],[11,16],
-    [12,15],[11,15],[12,14],[11,14],[12,13],[11,13],[12,12],[11,12],[12,11],
-    [11,11],[12,10],[11,10],[12,9],[11,9],[12,8],[11,8],[12,7],[11,7],[12,5],
-    [11,5],[12,4],[11,4],[12,3],[11,3],[12,2],[11,2],[12,1],[11,1],[12,0],
-    [11,0],[10,0],[9,0],[10,1],[9,1],[10,2],[9,2],[10,3],[9,3],[10,4],[9,4],
-    [10,5],[9,5],[10,7],[9,7],[10,8],[9,8],[10,9],[9,9],[10,10],[9,10],[10,11],
-    [9,11],[10,12],[9,12],[10,13],[9,13],[10,14],[9,14],[10,15],[9,15],[10,16],
-    [9,16],[10,17],[9,17],[10,18],[9,18],[10,19],[9,19],[10,20],[9,20],[10,21],
-    [9,21],[10,22],[9,22],[10,23],[9,23],[10,24],[9,24],[8,16],[7,16],[8,15],
-    [7,15],[8,14],[7,14],[8,13],[7,13],[8,12],[7,12],[8,11],[7,11],[8,10],
-    [7,10],[8,9],[7,9],[5,9],[4,9],[5,10],[4,10],[5,11],[4,11],[5,12],[4,12],
-    [5,13],[4,13],[5,14],[4,14],[5,15],[4,15],[5,16],[4,16],[3,16],[2,16],
-    [3,15],[2,15],[3,14],[2,14],[3,13],[2,13],[3,12],[2,12],[3,11],[2,11],
-    [3,10],[2,10],[3,9],[2,9],[1,9],[0,9],[1,10],[0,10],[1,11],[0,11],[1,12],
-    [0,12],[1,13],[0,13],[1,14],[0,14],[1,15],[0,15],[1,16],[0,16]]
-    bit_positions[3] = [[28,28],[27,28],[28,27],[27,27],[28,26],[27,26],[28,25],[27,25],[28,24],[27,24],[28,23],[27,23],[28,22],[27,22],[28,21],[27,21],[28,20],[27,20],[28,19],[27,19],[28,18],[27,18],[28,17],[27,17],[28,16],[27,16],[28,15],[27,15],[28,14],[27,14],[28,13],[27,13],[28,12],[27,12],[28,11],[27,11],[28,10],[27,10],[28,9],[27,9],[26,9],[25,9],[26,10],[25,10],[26,11],[25,11],[26,12],[25,12],[26,13],[25,13],[26,14],[25,14],[26,15],[25,15],[26,16],[25,16],[26,17],[25,17],[26,18],[25,18],[26,19],[25,19],[26,20],[25,20],[26,21],[25,21],[26,22],[25,22],[26,23],[25,23],[26,24],[25,24],[26,25],[25,25],[26,26],[25,26],[26,27],[25,27],[26,28],[25,28],[24,28],[23,28],[24,27],[23,27],[24,26],[23,26],[24,25],[23,25],[24,19],[23,19],[24,18],[23,18],[24,17],[23,17],[24,16],[23,16],[24,15],[23,15],[24,14],[23,14],[24,13],[23,13],[24,12],[23,12],[24,11],[23,11],[24,10],[23,10],[24,9],[23,9],[22,9],[21,9],[22,10],[21,10],[22,11],[21,11],[22,12],[21,12],[22,13],[21,13],[22,14],[21,14],[22,15],[21,15],[22,16],[21,16],[22,17],[21,17],[22,18],[21,18],[22,19],[21,19],[22,25],[21,25],[22,26],[21,26],[22,27],[21,27],[22,28],[21,28],[20,28],[19,28],[20,27],[19,27],[20,26],[19,26],[20,25],[19,25],[19,24],[19,23],[19,22],[19,21],[19,20],[20,19],[19,19],[20,18],[19,18],[20,17],[19,17],[20,16],[19,16],[20,15],[19,15],[20,14],[19,14],[20,13],[19,13],[20,12],[19,12],[20,11],[19,11],[20,10],[19,10],[20,9],[19,9],[20,8],[19,8],[20,7],[19,7],[20,5],[19,5],[20,4],[19,4],[20,3],[19,3],[20,2],[19,2],[20,1],[19,1],[20,0],[19,0],[18,0],[17,0],[18,1],[17,1],[18,2],[17,2],[18,3],[17,3],[18,4],[17,4],[18,5],[17,5],[18,7],[17,7],[18,8],[17,8],[18,9],[17,9],[18,10],[17,10],[18,11],[17,11],[18,12],[17,12],[18,13],[17,13],[18,14],[17,14],[18,15],[17,15],[18,16],[17,16],[18,17],[17,17],[18,18],[17,18],[18,19],[17,19],[18,20],[17,20],[18,21],[17,21],[18,22],[17,22],[18,23],[17,23],[18,24],[17,24],[18,25],[17,25],[18,26],[17,26],[18,27],[17,27],[18,28],[17,28],[16,28],[15,28],[16,27],[15,27],[16,26],[15,26],[16,25],[15,25],[16,24],[15,24],[16,23],[15,23],[16,22],[15,22],[16,21],[15,21],[16,20],[15,20],[16,19],[15,19],[16,18],[15,18],[16,17],[15,17],[16,16],[15,16],[16,15],[15,15],[16,14],[15,14],[16,13],[15,13],[16,12],[15,12],[16,11],[15,11],[16,10],[15,10],[16,9],[15,9],[16,8],[15,8],[16,7],[15,7],[16,5],[15,5],[16,4],[15,4],[16,3],[15,3],[16,2],[15,2],[16,1],[15,1],[16,0],[15,0],[14,0],[13,0],[14,1],[13,1],[14,2],[13,2],[14,3],[13,3],[14,4],[13,4],[14,5],[13,5],[14,7],[13,7],[14,8],[13,8],[14,9],[13,9],[14,10],[13,10],[14,11],[13,11],[14,12],[13,12],[14,13],[13,13],[14,14],[13,14],[14,15],[13,15],[14,16],[13,16],[14,17],[13,17],[14,18],[13,18],[14,19],[13,19],[14,20],[13,20],[14,21],[13,21],[14,22],[13,22],[14,23],[13,23],[14,24],[13,24],[14,25],[13,25],[14,26],[13,26],[14,27],[13,27],[14,28],[13,28],[12,28],[11,28],[12,27],[11,27],[12,26],[11,26],[12,25],[11,25],[12,24],[11,24],[12,23],[11,23],[12,22],[11,22],[12,21],[11,21],[12,20],[11,20],[12,19],[11,19],[12,18],[11,18],[12,17],[11,17],[12,16],[11,16],[12,15],[11,15],[12,14],[11,14],[12,13],[11,13],[12,12],[11,12],[12,11],[11,11],[12,10],[11,10],[12,9],[11,9],[12,8],[11,8],[12,7],[11,7],[12,5],[11,5],[12,4],[11,4],[12,3],[11,3],[12,2],[11,2],[12,1],[11,1],[12,0],[11,0],[10,0],[9,0],[10,1],[9,1],[10,2],[9,2],[10,3],[9,3],[10,4],[9,4],[10,5],[9,5],[10,7],[9,7],[10,8],[9,8],[10,9],[9,9],[10,10],[9,10],[10,11],[9,11],[10,12],[9,12],[10,13],[9,13],[10,14],[9,14],[10,15],[9,15],[10,16],[9,16],[10,17],[9,17],[10,18],[9,18],[10,19],[9,19],[10,20],[9,20],[10,21],[9,21],[10,22],[9,22],[10,23],[9,23],[10,24],[9,24],[10,25],[9,25],[10,26],[9,26],[10,27],[9,27],[10,28],[9,28],[8,20],[7,20],[8,19],[7,19],[8,18],[7,18],[8,17],[7,17],[8,16],[7,16],[8,15],[7,15],[8,14],[7,14],[8,13],[7,13],[8,12],[7,12],[8,11],[7,11],[8,10],[7,10],[8,9],[7,9],[5,9],[4,9],[5,10],[4,10],[5,11],[4,11],[5,12],[4,12],[5,13],[4,13],[5,14],[4,14],[5,15],[4,15],[5,16],[4,16],[5,17],[4,17],[5,18],[4,18],[5,19],[4,19],[5,20],[4,20],[3,20],[2,20],[3,19],[2,19],[3,18],[2,18],[3,17],[2,17],[3,16],[2,16],[3,15],[2,15],[3,14],[2,14],[3,13],[2,13],[3,12],[2,12],[3,11],[2,11],[3,10],[2,10],[3,9],[2,9],[1,9],[0,9],[1,10],[0,10],[1,11],[0,11],[1,12],[0,12],[1,13],[0,13],[1,14],[0,14],[1,15],[0,15],[1,16],[0,16],[1,17],[0,17],[1,18],[0,18],[1,19],[0,19],[1,20],[0,20]]
+    def __init__(self, error, input, backend=None, version=None, mask=None,
+            observer=None, structured_append=None, strategy=None, eci=None,
+            encoding=None):
+        # input is text or a bytes-like object, which is encoded as it is in a
+        # single byte segment.  version and mask may be given to use a larger
+        # version than the smallest which fits, or a fixed mask pattern instead
+        # of the lowest scoring one.  observer, or failing that OBSERVER, is
+        # told about each stage as it runs, see Instrument.py.
+        # structured_append is a (position, total, parity) tuple making this
+        # symbol one of a sequence, see Structured.py.  strategy is one of
+        # MASK_STRATEGIES.  eci adds an ECI header declaring the character set
+        # of byte segments, True for UTF-8 or an ECI designator.  encoding, if
+        # given, is the character set of byte segments of text instead of the
+        # one get_encoding picks.
+        observer = observer if observer is not None else self.OBSERVER
+        with stage(observer, 'encode'):
+            self.build(error, input, backend, version, mask, observer, 
+                structured_append, strategy, eci, encoding)
+        if observer is not None:
+            for name, value in (('version', self.version), ('mask', 
+                    self.mask), ('error', self.error_char), ('scores', 
+                    self.scores), ('segments', len(self.segments)), 
+                    ('stream_length', self.stream_length)):
+                observer.count(name, value)
 
-    
-    def __init__(self, error, input):
-        
-        self.mode_char = 'N' if input.isdigit() else 'A'
-        self.input = input if self.mode_char == 'N' else input.upper()   
+    def build(self, error, input, backend, version, mask, observer, 
+            structured_append=None, strategy=None, eci=None, encoding=None):
+        self.input = input
         self.error_char = error.upper()
-        self.version = 0
+        prefix = []
+        if structured_append is not None:
+            prefix.append(self.get_structured_append(*structured_append))
+        if eci is not None and eci is not False:
+            designator = self.ECI_UTF8 if eci is True else eci
+            prefix.append(self.get_eci(designator))
+            if isinstance(input, str):
+                encoding = self.get_eci_encoding(designator, encoding)
+                try:
+                    input.encode(encoding)
+                except UnicodeEncodeError as exception:
+                    raise ValueError('ECI designator ' + str(designator) + 
+                        ' is ' + encoding + ', which cannot encode ' + 
+                        repr(exception.object[exception.start:
+                        exception.end])) from None
         
-        # calculate version of QR code
-        for i in range(1, 4, 1):
-            if len(self.input) <= (self.TABLE_7_9[i][self.error_char]
-                    [self.mode_char]):
-                self.version = i 
-                break
-        if self.version > 3:
-            print('ERROR: INPUT IS TOO LONG FOR THIS SCRIPT TO PROCESS, ' \
-                'TRY REDUCING ERROR CORRECTION, OR SHORTEN INPUT.')
-            sys.exit()
+        # calculate version of QR code, the smallest which has room for the 
+        # input at this error correction level, and the numeric, alphanumeric,
+        # byte and kanji segments which encode it in the fewest bits.
+        with stage(observer, 'segment'):
+            self.version, self.segments = self.get_version(self.error_char, 
+                self.input, version or 1, prefix, encoding)
+        if self.version == 0:
+            raise DataTooLongError('Input is too long for a version 40 ' \
+                'code at error correction level ' + self.error_char + ', ' \
+                'try reducing error correction, or shorten input.')
+        if version is not None and self.version != version:
+            raise DataTooLongError('Input is too long for a version ' + 
+                str(version) + ' code at error correction level ' + 
+                self.error_char + '.')
             
-        # get data codewords
-        stream = self.get_stream(self.version, self.mode_char, self.error_char, self.input)
-        
-        # generate a blank QR code
-        code = self.generate_blank_array(self.version)
-        for i in range(len(stream)):
-            x = self.bit_positions[self.version][i][1]
-            y = self.bit_positions[self.version][i][0]
-            code[x][y] = int(stream[i])
+        # get the final sequence of data and error correction codewords
+        with stage(observer, 'data_codewords'):
+            data_codewords = self.generate_data_codewords(self.version, 
+                self.error_char, self.segments)
+        with stage(observer, 'error_codewords'):
+            codewords = self.add_error_codewords(self.version, 
+                self.error_char, data_codewords)
+        self.stream_length = len(codewords)
         
-        # perform masking
-        candidates = [[column[:] for column in code] for n in range(8)]
-        mask_patterns = [self.get_mask(self.version, p) for p in range(8)]
-        for x in range((self.version * 4) + 17):
-            for y in range((self.version * 4) + 17):
-                for n in range(8):
-                    candidates[n][x][y] = code[x][y] if mask_patterns[n][x][y] == 0 else 1 if code[x][y] == 0 else 0
+        # generate a blank QR code and place the data, any remainder bits
+        # left over at the end of the placement order are left light.
+        with stage(observer, 'placement'):
+            code = self.generate_blank_array(self.version)
+            self.place_codewords(code, self.version, codewords)
         
-        # score each of these masking options
-        scores = [0 for n in range(8)]
-        for n in range(8):
-            scores[n] += self.test_one(candidates[n])
-            scores[n] += self.test_two(candidates[n])
-            scores[n] += self.test_three(candidates[n])
-            scores[n] += self.test_four(candidates[n])
-        lowest_index = scores.index(min(scores))
+        # perform masking, score each of these masking options and keep the
+        # lowest scoring.
+        with stage(observer, 'mask'):
+            if mask is None:
+                self.mask, code, self.scores = self.select_mask(code, 
+                    self.version, backend or self.MASK_BACKEND, 
+                    strategy or self.MASK_STRATEGY)
+            elif 0 <= mask <= 7:
+                self.mask = mask
+                self.scores = None
+                code = self.apply_mask(code, self.get_mask(self.version, 
+                    mask))
+            else:
+                raise ValueError('Mask patterns run from 0 to 7, got ' + 
+                    str(mask))
+        lowest_index = self.mask
         
-        # create a QR code SVG image with the lowest scoring mask pattern
-        format = self.FORMAT_INFORMATION[self.error_char][lowest_index]
-        self.create_svg_code(candidates[lowest_index], 'code', format, self.version)
+        # add the format information for the lowest scoring mask pattern, the
+        # finished symbol is kept on the object and nothing is written to disk
+        # until one of the save methods is called.
+        with stage(observer, 'format'):
+            self.format = self.FORMAT_INFORMATION[self.error_char][
+                lowest_index]
+            self.add_format_information(code, self.format, self.version)
+            self.add_version_information(code, self.version)
+        self.matrix = QRMatrix(code, self.version, self.error_char, self.mask,
+            observer)
+
+    def save_svg(self, filename='code', **options):
+        # Write the finished symbol to <filename>.svg.
+        self.matrix.save_svg(filename, **options)
 
         
-    def get_stream(self, version, mode_char, error_char, input):
-        # get all of the data codewords
-        data_codewords = self.generate_data_codewords(version, mode_char, 
-            error_char, input)
-        # depending on the version/error correction level of the QR 
-        # code we may need to split the data and error codewords into 
-        # a number of blocks
-        stream = ''
-        if(version == 3 and (error_char == 'Q' or error_char == 'H')):
-            # we require more than one block
-            # as we're only coding upto version 3 we will only need a maximum 
-            # of two blocks. These two blocks of data are then interleaved.
-            data_blocks = [[]] * self.TABLE_9[version][error_char]['BLOCKS']
-            data_blocks[0] = data_codewords[:self.TABLE_9[version][error_char]['DATA']]
-            data_blocks[1] = data_codewords[self.TABLE_9[version][error_char]['DATA']:]
-            data_zip = [value for sub_list in [[data_blocks[0][i], data_blocks[1][i]] for i in range(len(data_blocks[0]))] for value in sub_list]
-            # The same applies to the error correction codewords, these are 
-            # interleaved and then the 'zipped' error correction codewords 
-            # are appended to the 'zipped' data codewords.
-            # When more than one block is used, the error correction codewords
-            # are calculated on each data codeword block, therefore the 
-            # generate error codewords method is called twice in this case. This 
-            # not necessary for the data codewords, this is just called once, 
-            # whatever number of blocks we're using.
-            error_blocks = [[]] * self.TABLE_9[version][error_char]['BLOCKS']
-            for i in range(2):
-                error_blocks[i] = self.generate_error_codewords(version, error_char, data_blocks[i])
-            error_zip = [value for sub_list in [[error_blocks[0][i], error_blocks[1][i]] for i in range(len(error_blocks[0]))] for value in sub_list]
-            stream = ''.join([format(d, '08b') for d in data_zip]) + ''.join([format(d, '08b') for d in error_zip])
+    @staticmethod
+    def get_structured_append(position, total, parity):
+        # The header Segment placing a symbol at position, counting from 0, 
+        # in a sequence of total symbols whose data has the given parity.
+        if not 1 <= total <= 16:
+            raise ValueError('Structured append sequences have 1 to 16 '
+                'symbols, got ' + str(total))
+        if not 0 <= position < total:
+            raise ValueError('Symbol position must be from 0 to ' + 
+                str(total - 1) + ', got ' + str(position))
+        if not 0 <= parity <= 255:
+            raise ValueError('Parity must be a byte, got ' + str(parity))
+        return Segment('S', bytes([(position << 4) | (total - 1), parity]))
+
+    @staticmethod
+    def get_eci(designator):
+        # The ECI header Segment for a designator, held in one, two or three
+        # bytes depending on its size.
+        if not 0 <= designator < 1000000:
+            raise ValueError('ECI designators run from 0 to 999999, got ' + 
+                str(designator))
+        if designator < 1 << 7:
+            data = bytes([designator])
+        elif designator < 1 << 14:
+            data = ((0b10 << 14) | designator).to_bytes(2, 'big')
         else:
-            error_codewords = self.generate_error_codewords(version, error_char, 
-                data_codewords)
-            data_codewords = [format(d, '08b') for d in data_codewords]
-            error_codewords = [format(v, '08b') for v in error_codewords]
-            stream = ''.join(data_codewords) + ''.join(error_codewords)
-        # if a QR version greater than two is used we need to append 7 remainder bits
-        # this changes depending on the version used but for version 2 and 3 we add 
-        # seven remainder bits.
-        if self.version > 1:
-            stream += '0000000'
-        return stream
+            data = ((0b110 << 21) | designator).to_bytes(3, 'big')
+        return Segment('E', data)
+
+    @classmethod
+    def get_eci_encoding(cls, designator, encoding=None):
+        # The character set byte segments of text are encoded in under an 
+        # ECI designator, raising ValueError if text cannot be encoded with
+        # it or encoding, if given, names another.
+        named = cls.ECI_ENCODINGS.get(designator)
+        if named is None:
+            raise ValueError('Text can only be encoded with ECI designators ' 
+                + ', '.join(str(designator) for designator in sorted(
+                cls.ECI_ENCODINGS)) + ', got ' + str(designator))
+        if encoding is not None and codecs.lookup(encoding).name != \
+                codecs.lookup(named).name:
+            raise ValueError('ECI designator ' + str(designator) + ' is ' + 
+                named + ', not ' + encoding)
+        return named
+
+    @classmethod
+    def get_version(cls, error_char, input, minimum=1, prefix=(), 
+            encoding=None):
+        # The smallest version, no smaller than minimum, able to hold input 
+        # and the segments it is split into for that version, or (0, None) 
+        # if the input is too long for even a version 40 code.  The best 
+        # split only changes with the width of the character count 
+        # indicators so it is worked out once for each range of versions.
+        # prefix holds any segments, such as a structured append header, 
+        # which come before the input and encoding, if given, is the 
+        # character set of byte segments of text.
+        if not 1 <= minimum <= 40:
+            raise ValueError('QR code versions run from 1 to 40, got ' +
+                str(minimum))
+        capacities = cls.get_capacities(error_char)
+        for first, last in VERSION_RANGES:
+            if last < minimum:
+                continue
+            first = max(first, minimum)
+            count_bits = dict((mode_char, cls.get_count_bits(first, 
+                mode_char)) for mode_char in cls.TABLE_3)
+            segments = list(prefix) + segment(input, count_bits, encoding)
+            required = cls.get_segments_bit_length(segments, count_bits)
+            version = bisect.bisect_left(capacities, required, first, 
+                last + 1)
+            if version <= last:
+                return version, segments
+        return 0, None
+
+    @classmethod
+    def get_capacities(cls, error_char):
+        # The data capacity in bits of every version at error_char, indexed
+        # by version with nothing at 0.  It only grows with the version so 
+        # the smallest which fits is found by bisection.
+        capacities = _capacities.get(error_char)
+        if capacities is None:
+            capacities = [0] + [cls.get_data_codeword_count(version, 
+                error_char) * 8 for version in range(1, 41)]
+            capacities = _capacities.setdefault(error_char, capacities)
+        return capacities
+
+    @classmethod
+    def get_segments_bit_length(cls, segments, count_bits):
+        # Number of bits taken by the segments, mode and character count 
+        # indicators included.  A segment too long for its character count 
+        # indicator can never fit.
+        total = 0
+        for item in segments:
+            if item.mode_char in cls.HEADER_MODES:
+                total += 4 + len(item.data) * 8
+                continue
+            if len(item) >= (1 << count_bits[item.mode_char]):
+                return float('inf')
+            total += 4 + count_bits[item.mode_char] + cls.get_bit_length(
+                item.mode_char, len(item))
+        return total
+
+    @classmethod
+    def get_count_bits(cls, version, mode_char):
+        # Width of the character count indicator.
+        return cls.TABLE_3[mode_char][0 if version < 10 else 
+            1 if version < 27 else 2]
+
+    @staticmethod
+    def get_bit_length(mode_char, length):
+        # Number of bits taken by length characters of data, excluding the 
+        # mode and character count indicators.
+        if mode_char == 'N':
+            return (length // 3) * 10 + (0, 4, 7)[length % 3]
+        elif mode_char == 'A':
+            return (length // 2) * 11 + (length % 2) * 6
+        elif mode_char == 'K':
+            return length * 13
+        return length * 8
+
+    @classmethod
+    def get_data_codeword_count(cls, version, error_char):
+        ec, blocks_1, data_1, blocks_2, data_2 = cls.TABLE_9[version][
+            error_char]
+        return blocks_1 * data_1 + blocks_2 * data_2
+
+    @classmethod
+    def get_blocks(cls, version, error_char, data_codewords):
+        # Split the data codewords into the blocks given by table 9.
+        ec, blocks_1, data_1, blocks_2, data_2 = cls.TABLE_9[version][
+            error_char]
+        blocks = []
+        start = 0
+        for length in [data_1] * blocks_1 + [data_2] * blocks_2:
+            blocks.append(data_codewords[start:start + length])
+            start += length
+        return blocks
+
+    @staticmethod
+    def interleave(blocks):
+        # Take the first codeword of every block, then the second and so on,
+        # blocks which have run out are skipped.
+        result = bytearray()
+        longest = max(len(block) for block in blocks)
+        for i in range(longest):
+            result.extend([block[i] for block in blocks if i < len(block)])
+        return result
+
+    @classmethod
+    def get_stream(cls, version, error_char, segments):
+        # get all of the data codewords
+        data_codewords = cls.generate_data_codewords(version, error_char, 
+            segments)
+        return cls.add_error_codewords(version, error_char, data_codewords)
+
+    @classmethod
+    def add_error_codewords(cls, version, error_char, data_codewords):
+        # depending on the version/error correction level of the QR code we
+        # may need to split the data codewords into a number of blocks.  The 
+        # error correction codewords are calculated on each block, then the
+        # data blocks are interleaved and followed by the interleaved error 
+        # correction blocks.
+        data_blocks = cls.get_blocks(version, error_char, data_codewords)
+        error_blocks = [cls.generate_error_codewords(version, error_char, 
+            block) for block in data_blocks]
+        return cls.interleave(data_blocks) + cls.interleave(error_blocks)
+
+    @classmethod
+    def add_error_codewords_many(cls, version, error_char, data_codewords):
+        # add_error_codewords for many messages of the same version and 
+        # level at once, data_codewords being a 2-D uint8 array with the 
+        # data codewords of one message per row.  Returns an array with the
+        # final interleaved codewords of one message per row, no rows for 
+        # an empty batch.  Every block of every message of the same length 
+        # is worked out together by ReedSolomonNumPy, which needs NumPy.
+        if ReedSolomonNumPy is None:
+            raise ImportError('add_error_codewords_many needs NumPy.')
+        numpy = ReedSolomonNumPy.numpy
+        data = numpy.asarray(data_codewords, dtype=numpy.uint8)
+        ec, blocks_1, data_1, blocks_2, data_2 = cls.TABLE_9[version][
+            error_char]
+        length = blocks_1 * data_1 + blocks_2 * data_2
+        if data.ndim != 2 or data.shape[1] != length:
+            raise ValueError('Each row must hold the ' + str(length) + 
+                ' data codewords of a version ' + str(version) + '-' + 
+                error_char + ' code, got an array of shape ' + 
+                str(data.shape))
+        count = len(data)
+        if count == 0:
+            return numpy.zeros((0, length + ec * (blocks_1 + blocks_2)), 
+                dtype=numpy.uint8)
+        split = blocks_1 * data_1
+        errors = [ReedSolomonNumPy.remainders(data[:, :split].reshape(
+            count * blocks_1, data_1), ec).reshape(count, blocks_1, ec)]
+        if blocks_2:
+            errors.append(ReedSolomonNumPy.remainders(data[:, 
+                split:].reshape(count * blocks_2, data_2), ec).reshape(
+                count, blocks_2, ec))
+        errors = numpy.concatenate(errors, axis=1)
+        # The position in the message of each data codeword in interleaved 
+        # order, error correction codewords interleave by transposing.
+        starts = [i * data_1 for i in range(blocks_1)] + [split + i * data_2
+            for i in range(blocks_2)]
+        lengths = [data_1] * blocks_1 + [data_2] * blocks_2
+        order = [start + i for i in range(max(lengths)) for start, length in
+            zip(starts, lengths) if i < length]
+        return numpy.concatenate([data[:, order], errors.transpose(0, 2, 
+            1).reshape(count, -1)], axis=1)
+
+    @staticmethod
+    def place_codewords(array, version, codewords):
+        # Place the bits of the codewords, most significant first, in the 
+        # order given by the layout for this version.
+        bit_positions = get_layout(version).bit_positions
+        i = 0
+        for codeword in codewords:
+            for shift in (7, 6, 5, 4, 3, 2, 1, 0):
+                x, y = bit_positions[i]
+                array[x][y] = (codeword >> shift) & 1
+                i += 1
+        return array
         
         
-    def generate_data_codewords(self, version, mode_char, error_char, input):
-        # Add the mode indicator.
-        stream = '0001' if mode_char == 'N' else '0010'
-        # Add the character count indicator.
-        stream += format(len(input),'09b' if mode_char == 'A' else '010b')
-        # Begin encoding of data.
-        if mode_char == 'A':
-            stream += self.encode_alphanumeric(input)
-        else:
-            stream += self.encode_numeric(input)
+    @classmethod
+    def generate_data_codewords(cls, version, error_char, segments):
+        buffer = BitBuffer()
+        for item in segments:
+            mode_char = item.mode_char
+            # Add the mode indicator.
+            buffer.write(int(cls.MODE_INDICATORS[mode_char], 2), 4)
+            if mode_char in cls.HEADER_MODES:
+                buffer.write_bytes(item.data)
+                continue
+            # Add the character count indicator.
+            buffer.write(len(item), cls.get_count_bits(version, mode_char))
+            # Begin encoding of data.
+            if mode_char == 'A':
+                cls.encode_alphanumeric(item.data, buffer)
+            elif mode_char == 'B':
+                cls.encode_byte(item.data, buffer)
+            elif mode_char == 'K':
+                cls.encode_kanji(item.data, buffer)
+            else:
+                cls.encode_numeric(item.data, buffer)
+        return cls.terminate(buffer, cls.get_data_codeword_count(version, 
+            error_char))
+
+    @classmethod
+    def terminate(cls, buffer, data_codeword_count):
         # Add up to four terminator zeros.
-        reqd_bit_length = self.TABLE_7_9[version][error_char]['D'] * 8
-        stream += '0000' if reqd_bit_length - len(stream) >= 4 else ('0' *
-            (reqd_bit_length - len(stream)))
+        reqd_bit_length = data_codeword_count * 8
+        buffer.write(0, min(4, reqd_bit_length - len(buffer)))
         # Make data stream length a multiple of eight.
-        mod_8 = len(stream) % 8
-        extra_zeros = 8 - mod_8 if mod_8 != 0 else 0 
-        stream += '0' * extra_zeros
+        buffer.pad_to_byte()
         # Add pad bytes to fill capacity.
-        number_of_pad_bytes = int((reqd_bit_length - len(stream)) / 8) 
-        for i in range(number_of_pad_bytes):
-            stream += '11101100' if i % 2 == 0 else '00010001'
+        number_of_pad_bytes = data_codeword_count - len(buffer.data)
+        buffer.write_bytes(cls.PAD_BYTES * (number_of_pad_bytes // 2) + 
+            cls.PAD_BYTES[:number_of_pad_bytes % 2])
         # Return the data codewords as a series of 8 bit bytes
-        return [int(stream[i:i+8], 2) for i in range(0, len(stream), 8)]
+        return buffer.get_bytes()
         
         
-    def generate_error_codewords(self, version, error_char, message):
-        to_int = [1, 2, 4, 8, 16, 32, 64, 128, 29, 58, 116, 232, 205, 135, 19,
-        38, 76, 152, 45, 90, 180, 117, 234, 201, 143, 3, 6, 12, 24, 48, 96, 
-        192, 157, 39, 78, 156, 37, 74, 148, 53, 106, 212, 181, 119, 238, 193, 
-        159, 35, 70, 140, 5, 10, 20, 40, 80, 160, 93, 186, 105, 210, 185, 111,
-        222, 161, 95, 190, 97, 194, 153, 47, 94, 188, 101, 202, 137, 15, 30, 
-        60, 120, 240, 253, 231, 211, 187, 107, 214, 177, 127, 254, 225, 223, 
-        163, 91, 182, 113, 226, 217, 175, 67, 134, 17, 34, 68, 136, 13, 26, 52,
-        104, 208, 189, 103, 206, 129, 31, 62, 124, 248, 237, 199, 147, 59, 118,
-        236, 197, 151, 51, 102, 204, 133, 23, 46, 92, 184, 109, 218, 169, 79, 
-        158, 33, 66, 132, 21, 42, 84, 168, 77, 154, 41, 82, 164, 85, 170, 73, 
-        146, 57, 114, 228, 213, 183, 115, 230, 209, 191, 99, 198, 145, 63, 126,
-        252, 229, 215, 179, 123, 246, 241, 255, 227, 219, 171, 75, 150, 49, 98,
-        196, 149, 55, 110, 220, 165, 87, 174, 65, 130, 25, 50, 100, 200, 141, 
-        7, 14, 28, 56, 112, 224, 221, 167, 83, 166, 81, 162, 89, 178, 121, 242,
-        249, 239, 195, 155, 43, 86, 172, 69, 138, 9, 18, 36, 72, 144, 61, 122,
-        244, 245, 247, 243, 251, 235, 203, 139, 11, 22, 44, 88, 176, 125, 250,
-        233, 207, 131, 27, 54, 108, 216, 173, 71, 142, 1]
-        to_alpha = [None, 0, 1, 25, 2, 50, 26, 198, 3, 223, 51, 238, 27, 104, 
-        199, 75, 4, 100, 224, 14, 52, 141, 239, 129, 28, 193, 105, 248, 200, 8,
-        76, 113, 5, 138, 101, 47, 225, 36, 15, 33, 53, 147, 142, 218, 240, 18,
-        130, 69, 29, 181, 194, 125, 106, 39, 249, 185, 201, 154, 9, 120, 77,
-        228, 114, 166, 6, 191, 139, 98, 102, 221, 48, 253, 226, 152, 37, 179,
-        16, 145, 34, 136, 54, 208, 148, 206, 143, 150, 219, 189, 241, 210, 19,
-        92, 131, 56, 70, 64, 30, 66, 182, 163, 195, 72, 126, 110, 107, 58, 40,
-        84, 250, 133, 186, 61, 202, 94, 155, 159, 10, 21, 121, 43, 78, 212, 
-        229, 172, 115, 243, 167, 87, 7, 112, 192, 247, 140, 128, 99, 13, 103,
-        74, 222, 237, 49, 197, 254, 24, 227, 165, 153, 119, 38, 184, 180, 124,
-        17, 68, 146, 217, 35, 32, 137, 46, 55, 63, 209, 91, 149, 188, 207, 205,
-        144, 135, 151, 178, 220, 252, 190, 97, 242, 86, 211, 171, 20, 42, 93,
-        158, 132, 60, 57, 83, 71, 109, 65, 162, 31, 45, 67, 216, 183, 123, 164,
-        118, 196, 23, 73, 236, 127, 12, 111, 246, 108, 161, 59, 82, 41, 157, 
-        85, 170, 251, 96, 134, 177, 187, 204, 62, 90, 203, 89, 95, 176, 156, 
-        169, 160, 81, 11, 245, 22, 235, 122, 117, 44, 215, 79, 174, 213, 233, 
-        230, 231, 173, 232, 116, 214, 244, 234, 168, 80, 88, 175]
-        e_num = self.TABLE_9[version][error_char]['ERROR']
-        generator = []
-        if e_num == 7:
-            generator = [0, 87, 229, 146, 149, 238, 102, 21]
-        elif e_num == 10:
-            generator = [0, 251, 67, 46, 61, 118, 70, 64, 94, 32, 45]
-        elif e_num == 13:
-            generator = [0, 74, 152, 176, 100, 86, 100, 106, 104, 130, 
-            218, 206, 140, 78]
-        elif e_num == 15:
-            generator = [0, 8, 183, 61, 91, 202, 37, 51, 58, 58, 237, 140, 
-            124, 5, 99, 105]
-        elif e_num == 16:
-            generator = [0, 120, 104, 107, 109, 102, 161, 76, 3, 91, 191, 147, 
-            169, 182, 194, 225, 120]
-        elif e_num == 17:
-            generator = [0, 43, 139, 206, 78, 43, 239, 123, 206, 214, 147, 24, 
-            99, 150, 39, 243, 163, 136]
-        elif e_num == 18:
-            generator = [0, 215, 234, 158, 94, 184, 97, 118, 170, 79, 187, 152,
-            148, 252, 179, 5, 98, 96, 153]
-        elif e_num == 22:
-            generator = [0, 210, 171, 247, 242, 93, 230, 14, 109, 221, 53, 200,
-            74, 8, 172, 98, 80, 219, 134, 160, 105, 165, 231]
-        elif e_num == 26:
-            generator = [0, 173, 125, 158, 2, 103, 182, 118, 17, 145, 201, 111,
-            28, 165, 53, 161, 21, 245, 142, 13, 102, 48, 227, 153, 145, 218, 70]
-        elif e_num == 28:
-            generator = [0, 168, 223, 200, 104, 224, 234, 108, 180, 110, 190, 
-            195, 147, 205, 27, 232, 201, 21, 43, 245, 87, 42, 195, 212, 119, 
-            242, 37, 9,123]
-        elif e_num == 36:
-            generator = [0, 200, 183, 98, 16, 172, 31, 246, 234, 60, 152, 115, 24,
-            167, 152, 113, 248, 238, 107, 18, 63, 218, 37, 87, 210, 105, 177, 120,
-            74, 121, 196, 117, 251,113, 233, 30, 120]
-        elif e_num == 44:
-            generator = [0, 190, 7, 61, 121, 71, 246, 69, 55, 168, 188, 89, 243, 
-            191, 25, 72, 123, 9, 145, 14, 247, 1, 238, 44, 78, 143, 62, 224, 126, 
-            118, 114, 68, 163, 52, 194, 217, 147, 204, 169, 37, 130, 113, 102, 73, 181]
-        result_a = []
-        result_b = []
-        for i in range(1, len(message)+1, 1):
-            # Lead exponent of message in first run and result of XOR in
-            # subsequent runs. If the alpha exponent is None, set it to zero.
-            # this means we'll just be using the generator polynomial directly.
-            alpha = to_alpha[message[0]] if i == 1 else to_alpha[result_b[0]]
-            alpha = alpha if alpha is not None else 0
-            # Multiply lead term with generator.
-            for exp in generator:
-                plus = exp + alpha
-                mod = plus if plus < 256 else plus % 255
-                result_a.append(to_int[mod])   
-            # Part is either message on first run, or result of xor in 
-            # subsequent runs
-            part = [v for v in message] if i == 1 else [v for v in result_b]
-            # Equalise the length of arrays, then XOR.
-            maxcount = max(len(result_a), len(part))
-            result_a += [0] * ((maxcount - len(result_a)) if (maxcount - len(result_a)) > 0 else 0)
-            part += [0] * ((maxcount - len(part)) if (maxcount - len(part)) > 0 else 0)
-            xor = [result_a[i] ^ part[i] for i in range(len(result_a))]
-            # Discard the first zero term.
-            result_b = xor[1:]        
-            # Reset the result of multiplying lead term with generator.
-            result_a = []
-        # Return the array of error correction integers
-        return result_b
+    @classmethod
+    def generate_error_codewords(cls, version, error_char, message):
+        # Return the error correction codewords for one block of data 
+        # codewords as bytes.
+        return ReedSolomon.remainder(message, 
+            cls.TABLE_9[version][error_char][0])
 
         
-    def generate_blank_array(self, version):
-        # Generates a blank 2d array, complete with finder patterns
-        # alignment patterns, timer patterns and the black pixel.
-        length = (version * 4) + 17
-        array = [[0 for y in range(length)] for x in range(length)]
-        black_indices = self.generate_finder_with_start(0, 0)
-        black_indices += self.generate_finder_with_start(length - 7, 0)
-        black_indices += self.generate_finder_with_start(0, length - 7)
-        black_indices += self.generate_timers(length)
-        if version > 1:
-            black_indices += self.generate_alignment_with_start(length - 9,
-                length - 9)
-        black_indices += [[8, length - 8]]
-        for pixel in black_indices:
-            array[pixel[0]][pixel[1]] = 1
-        return array
+    @staticmethod
+    def generate_blank_array(version):
+        # Generates a blank 2d array, complete with finder patterns
+        # alignment patterns, timer patterns and the black pixel, copied from
+        # the template kept by the layout for this version.
+        return [list(column) for column in 
+            get_layout(version).function_patterns]
         
     
-    def flip_array_diagonally(self, array):
+    @staticmethod
+    def flip_array_diagonally(array):
         # Useful function for flipping the array if you wish to export the 
         # QR code to a CSV file for example.
         a = [[array[x][y] for y in range(len(array))] for x in 
@@ -391,141 +891,131 @@ class QR(object):
                 a[x][y], a[y][x] = a[y][x], a[x][y]
         return a
         
-    def generate_finder_with_start(self, x, y):
-        return [[x, y], [x+1, y], [x+2, y], [x+3, y], [x+4, y], [x+5, y], 
-        [x+6, y], [x, y+1], [x+6, y+1], [x, y+2], [x+2, y+2], [x+3, y+2], 
-        [x+4, y+2], [x+6, y+2], [x, y+3], [x+2, y+3], [x+3, y+3], [x+4, y+3], 
-        [x+6, y+3], [x, y+4], [x+2, y+4], [x+3, y+4], [x+4, y+4], [x+6, y+4], 
-        [x, y+5], [x+6, y+5], [x, y+6], [x+1, y+6], [x+2, y+6], [x+3, y+6], 
-        [x+4, y+6], [x+5, y+6], [x+6, y+6]]
-    
-    def generate_alignment_with_start(self, x, y):
-        return [[x, y], [x+1, y], [x+2, y], [x+3, y], [x+4, y], [x, y+1], 
-        [x+4, y+1], [x, y+2], [x+2, y+2], [x+4, y+2], [x, y+3], [x+4, y+3], 
-        [x, y+4], [x+1, y+4], [x+2, y+4], [x+3, y+4], [x+4, y+4]]
-    
-    def generate_timers(self, length):
-        indices = [[x, 6] for x in range(8, length - 8, 2)]
-        indices += [[6, y] for y in range(8, length - 8, 2)]
-        return indices
-        
-    def encode_alphanumeric(self, input):
-        TABLE_5 = {
-        '0':0, '1':1, '2':2, '3':3, '4':4, '5':5, '6':6, '7':7, 
-        '8':8, '9':9, 'A':10, 'B':11, 'C':12, 'D':13, 'E':14, 'F':15, 'G':16, 
-        'H':17, 'I':18, 'J':19, 'K':20, 'L':21, 'M':22, 'N':23, 'O':24, 'P':25,
-        'Q':26, 'R':27, 'S':28, 'T':29, 'U':30, 'V':31, 'W':32, 'X':33, 'Y':34,
-        'Z':35, ' ':36, '$':37, '%':38, '*':39, '+':40, '-':41, '.':42, '/':43,
-        ':':44}
+    @classmethod
+    def encode_alphanumeric(cls, input, buffer):
         # Split stream into pairs, get values, multiple first by 45 and add to 
-        # second, convert to 11 bit stream.  If final 'pair' only consists of 
-        # one value, convert this to a 6 bit stream.
-        stream = ''
-        for i in range(0, len(input), 2):
-            pair = input[i : i + 2].upper()
-            if len(pair) == 2:
-                p1 = TABLE_5[pair[0]] * 45
-                p2 = TABLE_5[pair[1]]
-                stream += format(p1 + p2, '011b')
-            else:
-                p1 = TABLE_5[pair[0]]
-                stream += format(p1, '06b')
-        return stream
+        # second, write as 11 bits.  If final 'pair' only consists of one 
+        # value, write this as 6 bits.
+        TABLE_5 = cls.TABLE_5
+        for i in range(0, len(input) - 1, 2):
+            buffer.write(TABLE_5[input[i]] * 45 + TABLE_5[input[i + 1]], 11)
+        if len(input) % 2:
+            buffer.write(TABLE_5[input[-1]], 6)
+        return buffer
     
     
-    def encode_numeric(self, input):
-        stream = ''
+    @staticmethod
+    def encode_numeric(input, buffer):
+        # Groups of three digits are written as 10 bits, a final group of 
+        # two or one digits as 7 or 4 bits.
         for i in range(0, len(input), 3):
             triple = input[i:i+3]
-            if len(triple) == 3:
-                stream += format(int(triple), '010b')
-            elif len(triple) == 2:
-                stream += format(int(triple), '07b')
-            else:
-                stream += format(int(triple), '04b')
-        return stream
+            buffer.write(int(triple), (0, 4, 7, 10)[len(triple)])
+        return buffer
                 
-    def encode_byte(self, input):
-        TABLE_6 = {' ':32,'!':33,'"':34,'#':35,'$':36,'%':37,'&':38,'(':40,')':41,'*':42,'+':43,',':44,'-':45,'.':46,'/':47,'0':48,'1':49,'2':50,'3':51,'4':52,'5':53,'6':54,'7':55,'8':56,'9':57,':':58,';':59,'<':60,'=':61,'>':62,'?':63,'@':64,'A':65,'B':66,'C':67,'D':68,'E':69,'F':70,'G':71,'H':72,'I':73,'J':74,'K':75,'L':76,'M':77,'N':78,'O':79,'P':80,'Q':81,'R':82,'S':83,'T':84,'U':85,'V':86,'W':87,'X':88,'Y':89,'Z':90,'[':91,'\\':92,']':93,'^':94,'_':95,'`':96,'a':97,'b':98,'c':99,'d':100,'e':101,'f':102,'g':103,'h':104,'i':105,'j':106,'k':107,'l':108,'m':109,'n':110,'o':111,'p':112,'q':113,'r':114,'s':115,'t':116,'u':117,'v':118,'w':119,'x':120,'y':121,'z':122,'{':123,'|':124,'}':125,'~':126,'£':163,'§':167,'±':177}
-        stream = ''
-        for i in range(len(input)):
-            stream += format(TABLE_6[input[i]], '08b')
-        return stream
+    @staticmethod
+    def encode_byte(input, buffer):
+        # Already encoded bytes are written eight bits each.
+        buffer.write_bytes(input)
+        return buffer
+
+    @staticmethod
+    def encode_kanji(input, buffer):
+        # Each double byte Shift JIS code has 0x8140 or 0xC140 taken away,
+        # then the high byte multiplied by 0xC0 is added to the low byte and 
+        # written as 13 bits.
+        for i in range(0, len(input), 2):
+            value = (input[i] << 8) | input[i + 1]
+            value -= 0x8140 if value <= 0x9FFC else 0xC140
+            buffer.write((value >> 8) * 0xC0 + (value & 0xFF), 13)
+        return buffer
         
     
-    def create_svg_code(self, array, filename, format_string, version):
-        svg = SVG()
-        cell_size = 20
-        svg_size = cell_size * (len(array) + 8)
-        svg.prep_for_drawing(svg_size, svg_size)
-        length = (4 * version) + 17
-        # Bottom right format information
-        br = [[x, 8] for x in range(length - 1, length - 9, -1)]
-        br += [[8, y] for y in range(length - 7, length, 1)]
-        for i in range(len(br)):
-            x = br[i][0]
-            y = br[i][1]
-            if(format_string[i] == '1'):
-                svg.add_coloured_rect(x*20, y*20, 'rgb(0, 0, 0);')
-        # Top left format information.
-        tl = [[8, y] for y in range(0,9)]
-        tl += [[x, 8] for x in range(7,-1,-1)]
-        c = 0
-        for i in range(len(tl)):
-            x = tl[i][0]
-            y = tl[i][1]
-            if not ((x == 6 and y == 8) or (x == 8 and y == 6)):
-                if(format_string[c] == '1'):
-                    svg.add_coloured_rect(x*20, y*20, 'rgb(0, 0, 0);')
-                c+=1
-        for x in range(len(array)):
-            for y in range(len(array[x])):
-                if(array[x][y]) == 1:
-                    svg.add_rect(x*20, y*20)
-        svg.save(filename + '.svg')
+    @staticmethod
+    def add_format_information(array, format_string, version):
+        # Places the 15 bit format string, most significant bit first, around
+        # the top left finder pattern and again split between the other two.
+        for positions in get_layout(version).format_positions:
+            for i in range(len(positions)):
+                x, y = positions[i]
+                array[x][y] = 1 if format_string[i] == '1' else 0
+        return array
+
+    @staticmethod
+    def add_version_information(array, version):
+        # Versions 7 and above carry two copies of the version information.
+        if version < 7:
+            return array
+        bits = version_information(version)
+        for positions in version_information_positions(len(array)):
+            for i in range(len(positions)):
+                x = positions[i][0]
+                y = positions[i][1]
+                array[x][y] = (bits >> i) & 1
+        return array
     
-    def get_mask(self, version, n):
-        # Generate the mask.
-        length = (version * 4) + 17
-        mask = [[self.get_mask_pixel(x, y, n) for y in range(length)] for x in range(length)]
-        # Remove masking where it does not apply, including finder patterns,
-        # timer strips, alignment patterns and format information and of course
-        # the dark pixel.
-        finder_start = (version * 4) + 9
-        unmask_array = [[x, y] for x in range(9) for y in range(9)]
-        unmask_array += [[x, y] for x in range(finder_start, length, 1) for y in range(9)]
-        unmask_array += [[x, y] for x in range(9) for y in range(finder_start, length, 1)]
-        unmask_array += [[6, y] for y in range(length)]
-        unmask_array += [[x, 6] for x in range(length)]
-        if version > 1:
-            align_start = length - 9
-            unmask_array += [[x, y] for x in range(align_start, align_start + 5, 1) for y in range(align_start, align_start + 5, 1)]
-        for coordinate in unmask_array:
-            mask[coordinate[0]][coordinate[1]] = 0
-        # Returns a 2D masking pattern array.
-        return mask
+    @classmethod
+    def select_mask(cls, code, version, backend, strategy='full'):
+        # Apply each of the eight mask patterns to the unmasked symbol and 
+        # score them.  Returns the lowest scoring mask, the masked symbol for 
+        # it and the list of all eight scores, None for any candidate the 
+        # pruned strategy dropped.
+        if strategy not in cls.MASK_STRATEGIES:
+            raise ValueError('Mask strategy must be one of ' + 
+                ', '.join(cls.MASK_STRATEGIES) + ', got ' + repr(strategy))
+        if backend == 'numpy':
+            return MaskNumPy.select_mask(code, version, strategy)
+        elif backend == 'bitboard':
+            return MaskBitboard.select_mask(code, version, strategy)
+        if strategy == 'sampled':
+            raise ValueError('The python backend scores every module, use '
+                'the bitboard or numpy backend to sample.')
+        candidates = [cls.apply_mask(code, cls.get_mask(version, n)) 
+            for n in range(8)]
+        scores = [0 for n in range(8)]
+        lowest_index = None
+        for n in range(8):
+            # The cheapest rules first, so a pruned candidate is dropped 
+            # before the costly ones.  Ties go to the lower mask.
+            for test in (cls.test_four, cls.test_two, cls.test_three, 
+                    cls.test_one):
+                scores[n] += test(candidates[n])
+                if strategy == 'pruned' and lowest_index is not None and \
+                        scores[n] >= scores[lowest_index]:
+                    scores[n] = None
+                    break
+            if scores[n] is not None and (lowest_index is None or 
+                    scores[n] < scores[lowest_index]):
+                lowest_index = n
+        return lowest_index, candidates[lowest_index], scores
+
+    @staticmethod
+    def apply_mask(code, mask):
+        # XOR the mask over a copy of the symbol.
+        return [[module ^ bit for module, bit in zip(column, mask_column)] 
+            for column, mask_column in zip(code, mask)]
+
+    @staticmethod
+    def get_mask(version, n):
+        # The mask, leaving out every module which does not carry data, 
+        # including finder patterns, timer strips, alignment patterns, format
+        # and version information and of course the dark pixel.  Each one is
+        # built once per version by the layout and shared, so it must not be 
+        # modified.
+        return get_layout(version).get_mask(n)
         
-    def get_mask_pixel(self, x, y, n):
-        if n == 0:
-            return 1 if (x+y)%2 == 0 else 0
-        elif n == 1:
-            return 1 if x%2 == 0 else 0
-        elif n == 2:
-            return 1 if y%3 == 0 else 0
-        elif n == 3:
-            return 1 if (x+y)%3 == 0 else 0
-        elif n == 4:
-            return 1 if (math.floor(x/2.0) + math.floor(y/3.0))%2 == 0 else 0
-        elif n == 5:
-            return 1 if (x*y)%2+(x*y)%3 == 0 else 0
-        elif n == 6:
-            return 1 if ((x*y)%2+(x*y)%3)%2 == 0 else 0
-        elif n == 7:
-            return 1 if ((x+y)%2+(x*y)%3)%2 == 0 else 0
-        else:
-            return 0
+    @staticmethod
+    def get_mask_pixel(i, j, n):
+        # i is the row and j the column, as in table 10 of the ISO 
+        # specification.
+        if 0 <= n < 8:
+            return 1 if MASK_PATTERNS[n](i, j) else 0
+        return 0
         
-    def test_one(self, a):
+    @staticmethod
+    def test_one(a):
+        # 3 points for each run of five modules of the same colour in a row or
+        # column, plus 1 point for every module beyond the fifth.
         current = None
         previous = None
         count = 0
@@ -533,13 +1023,15 @@ class QR(object):
         for x in range(len(a)): # columns
             for y in range(len(a)):
                 current = a[x][y]
-                if current is not previous and previous is not None:
+                if current != previous and previous is not None:
                     if count >= 5:
                         score += (3 + (count - 5))
                     count = 1
                 else:
                     count += 1
                 previous = current
+            if count >= 5:
+                score += (3 + (count - 5))
             count = 0
             previous = None
         count = 0
@@ -548,84 +1040,60 @@ class QR(object):
         for y in range(len(a)): # rows
             for x in range(len(a)):
                 current = a[x][y]
-                if current is not previous and previous is not None:
+                if current != previous and previous is not None:
                     if count >= 5:
                         score += (3 + (count - 5))
                     count = 1
                 else:
                     count += 1
                 previous = current
+            if count >= 5:
+                score += (3 + (count - 5))
             count = 0
             previous = None        
         return score
         
-    def test_two(self, a):
+    @staticmethod
+    def test_two(a):
+        # 3 points for every 2x2 block of modules of the same colour, blocks
+        # may overlap so an m x n area scores 3 * (m - 1) * (n - 1).
         penalty = 0
-        for x in range(len(a)):
-            for y in range(len(a[0])):
-                penalty += self.block_search(a, [x, y], [1, 1])
+        for x in range(len(a) - 1):
+            for y in range(len(a) - 1):
+                if a[x][y] == a[x+1][y] == a[x][y+1] == a[x+1][y+1]:
+                    penalty += 3
         return penalty
-        
-    def block_search(self, a, start, dim):
-        # prevent out of bounds, find what the max value may be.
-        x_ok = True if (start[0] + dim[0] + 1) < len(a) else False
-        y_ok = True if (start[1] + dim[1] + 1) < len(a[0]) else False
-        check_for = 1 if a[start[0]][start[1]] == 0 else 1
-        if x_ok and y_ok:
-            testall = [a[x][y] for x in range(start[0], start[0] + dim[0] + 1, 1) for y in range(start[1], start[1] + dim[1] + 1)]
-            if check_for not in testall:
-                return self.block_search(a, start, [dim[0] + 1, dim[1] + 1])
-        if x_ok:
-            testx = [a[x][y] for x in range(start[0], start[0] + dim[0] + 1, 1) for y in range(start[1], start[1] + dim[1], 1)]
-            if check_for not in testx:
-                return self.block_search(a, start, [dim[0] + 1, dim[1]])
-        if y_ok:
-            testy = [a[x][y] for x in range(start[0], start[0] + dim[0], 1) for y in range(start[1], start[1] + dim[1] + 1, 1)]
-            if check_for not in testy:
-                return self.block_search(a, start, [dim[0], dim[1] + 1])
-        return 3 * (dim[0] - 1) * (dim[1] -1)
        
-    def test_three(self, a):
-        condition_one = '00001011101'
-        condition_two = '10111010000'
-        for x in range(len(a)): # columns
-            for y in range(len(a)-12):
-                check_word = ''.join([str(a[x][j]) for j in range(y, y + 12, 1)])
-                if check_word == condition_one or check_word == condition_two:
-                    return 40
-        for x in range(len(a)-12): # rows
-            for y in range(len(a)):
-                check_word = ''.join([str(a[i][y]) for i in range(x, x + 12, 1)])
-                if check_word == condition_one or check_word == condition_two:
-                    return 40
-        return 0
+    @staticmethod
+    def test_three(a):
+        # 40 points for every dark-light-dark-dark-dark-light-dark pattern in
+        # a row or column with four light modules on at least one side of it.
+        # Modules outside the symbol belong to the quiet zone and are light.
+        pattern = [1, 0, 1, 1, 1, 0, 1]
+        light = [0, 0, 0, 0]
+        lines = [list(column) for column in a]
+        lines += [[a[x][y] for x in range(len(a))] for y in range(len(a))]
+        score = 0
+        for line in lines:
+            padded = light + line + light
+            for i in range(4, len(line) - 2):
+                if padded[i:i+7] == pattern and (padded[i-4:i] == light or 
+                        padded[i+7:i+11] == light):
+                    score += 40
+        return score
         
-    def test_four(self, a):
+    @staticmethod
+    def test_four(a):
+        # 10 points for every 5% the proportion of dark modules is away from
+        # 50%.
         black_pixels = 0
         for x in a:
             for y in x:
                 if y == 1:
                     black_pixels += 1
-        percent_black = (black_pixels / float(len(a) * len(a))) * 100
-        lower_multiple = percent_black - (percent_black % 5)
-        upper_multiple = percent_black - (percent_black % 5) + 5
-        return min(abs(lower_multiple - 50) / 5.0, abs(upper_multiple - 50) / 5.0) * 10
-    
-QR('H', 'http://www.paul-reed.co.uk')
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+        total = len(a) * len(a)
+        return 10 * (abs(black_pixels * 100 - total * 50) // (total * 5))
 
 
+if __name__ == '__main__':
+    QR('H', 'http://www.paul-reed.co.uk').save_svg('code')
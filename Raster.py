@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Raster output without any third party libraries: 1-bit greyscale PNG,
+# compressed with zlib, and the binary PBM (P4) and PGM (P5) formats.  Each
+# row of modules is turned into a scaled scanline once and written
+# module_size times, and scanlines go straight to the target stream so a
+# full image is never held in memory.
+
+from SVG import get_rows, get_shape
+import io
+import struct
+import zlib
+
+FORMATS = ('png', 'pbm', 'pgm')
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# Write an IDAT chunk once this much compressed data has built up.
+PNG_CHUNK_SIZE = 1 << 16
+# 0/1 modules to the characters of a binary number, dark modules as '1'.
+_DARK_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_LIGHT_DIGITS = bytes.maketrans(b'\x00\x01', b'10')
+# 0/1 modules to PGM grey levels.
+_GREY = bytes.maketrans(b'\x00\x01', b'\xff\x00')
+
+
+class Raster(object):
+
+    # module_size is the size of a module in pixels and quiet_zone the width
+    # of the light border in modules.
+
+    def __init__(self, module_size=4, quiet_zone=4):
+        self.module_size = module_size
+        self.quiet_zone = quiet_zone
+
+    def get_size(self, modules):
+        # Width and height of the image in pixels.
+        columns, rows = get_shape(modules, self.quiet_zone)
+        return ((columns + 2 * self.quiet_zone) * self.module_size,
+            (rows + 2 * self.quiet_zone) * self.module_size)
+
+    def rows(self, modules):
+        # Yields each row of modules, a QRMatrix, a list of columns or a
+        # group of symbols, quiet zone included, as a bytes object of 0
+        # (light) and 1 (dark) with every module repeated module_size times.
+        scale = self.module_size
+        border = bytes(self.quiet_zone * scale)
+        blank = bytes(self.get_size(modules)[0])
+        for y in range(self.quiet_zone):
+            yield blank
+        for row in get_rows(modules, self.quiet_zone):
+            if scale > 1:
+                row = b''.join([b'\x01' * scale if module else b'\x00' *
+                    scale for module in row])
+            yield border + row + border
+        for y in range(self.quiet_zone):
+            yield blank
+
+    def packed_rows(self, modules, dark_bit):
+        # Yields each row packed eight pixels to a byte, most significant bit
+        # first and padded to a whole byte, with dark pixels set to dark_bit.
+        digits = _DARK_DIGITS if dark_bit else _LIGHT_DIGITS
+        width = self.get_size(modules)[0]
+        padding = (-width) % 8
+        length = (width + padding) // 8
+        for row in self.rows(modules):
+            value = int(row.translate(digits), 2) << padding
+            if not dark_bit:
+                value |= (1 << padding) - 1
+            yield value.to_bytes(length, 'big')
+
+    def write_png(self, modules, stream):
+        # 1-bit greyscale PNG, a set bit is white.
+        width, height = self.get_size(modules)
+        stream.write(PNG_SIGNATURE)
+        self.write_chunk(stream, b'IHDR', struct.pack('>IIBBBBB', width,
+            height, 1, 0, 0, 0, 0))
+        compressor = zlib.compressobj(9)
+        pending = []
+        pending_size = 0
+        for line in self.packed_rows(modules, 0):
+            # Filter type 0, each row written module_size times.
+            data = compressor.compress((b'\x00' + line) * self.module_size)
+            if data:
+                pending.append(data)
+                pending_size += len(data)
+                if pending_size >= PNG_CHUNK_SIZE:
+                    self.write_chunk(stream, b'IDAT', b''.join(pending))
+                    pending = []
+                    pending_size = 0
+        pending.append(compressor.flush())
+        self.write_chunk(stream, b'IDAT', b''.join(pending))
+        self.write_chunk(stream, b'IEND', b'')
+
+    def write_chunk(self, stream, kind, data):
+        stream.write(struct.pack('>I', len(data)))
+        stream.write(kind)
+        stream.write(data)
+        stream.write(struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    def write_pbm(self, modules, stream):
+        # Binary portable bitmap, a set bit is black.
+        stream.write(('P4\n%d %d\n' % self.get_size(modules)).encode(
+            'ascii'))
+        for line in self.packed_rows(modules, 1):
+            stream.write(line * self.module_size)
+
+    def write_pgm(self, modules, stream):
+        # Binary portable greymap, one byte per pixel.
+        stream.write(('P5\n%d %d\n255\n' % self.get_size(modules)).encode(
+            'ascii'))
+        for row in self.rows(modules):
+            stream.write(row.translate(_GREY) * self.module_size)
+
+    def write(self, modules, stream, format='png'):
+        # Write in one of FORMATS.
+        if format not in FORMATS:
+            raise ValueError('Unknown raster format ' + repr(format))
+        getattr(self, 'write_' + format)(modules, stream)
+
+    def to_bytes(self, modules, format='png'):
+        stream = io.BytesIO()
+        self.write(modules, stream, format)
+        return stream.getvalue()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Reed-Solomon error correction over GF(256) as used by QR codes, see section
+# 7.5.2 and annex A of the ISO specification.  The log/antilog tables are built
+# once when the module is imported, generator polynomials and their
+# multiplication tables are built the first time a degree is asked for.
+
+# The field is generated by the primitive polynomial x^8+x^4+x^3+x^2+1.
+PRIMITIVE = 0x11D
+
+# EXP[i] is alpha^i as an integer, it is twice the length it needs to be so the
+# sum of two logarithms can be looked up without reducing it modulo 255.
+# LOG[n] is the exponent of alpha giving n, LOG[0] is undefined and left as 0.
+EXP = bytearray(512)
+LOG = [0] * 256
+_value = 1
+for _i in range(255):
+    EXP[_i] = _value
+    EXP[_i + 255] = _value
+    LOG[_value] = _i
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= PRIMITIVE
+EXP[510] = EXP[0]
+del _i, _value
+
+_generators = {}
+_tables = {}
+
+
+def multiply(a, b):
+    # Product of two field elements.
+    if a == 0 or b == 0:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+
+def generator_polynomial(degree):
+    # The generator polynomial (x - alpha^0)(x - alpha^1)...(x - alpha^(n-1))
+    # as integer coefficients, highest power first.  The leading coefficient
+    # is always 1.
+    generator = _generators.get(degree)
+    if generator is None:
+        generator = bytearray([1])
+        for i in range(degree):
+            product = bytearray(len(generator) + 1)
+            for j in range(len(generator)):
+                product[j] ^= generator[j]
+                product[j + 1] ^= multiply(generator[j], EXP[i])
+            generator = product
+        generator = _generators.setdefault(degree, bytes(generator))
+    return generator
+
+
+def generator_table(degree):
+    # For each possible lead term, the generator polynomial (without its
+    # leading 1) multiplied by that term, packed big-endian into an integer of
+    # degree bytes.  This lets the division below work on the whole remainder
+    # with one shift and one XOR per message codeword.
+    table = _tables.get(degree)
+    if table is None:
+        generator = generator_polynomial(degree)[1:]
+        logs = [LOG[g] for g in generator]
+        table = [0]
+        for lead in range(1, 256):
+            lead_log = LOG[lead]
+            table.append(int.from_bytes(bytes(EXP[lead_log + g]
+                for g in logs), 'big'))
+        table = _tables.setdefault(degree, table)
+    return table
+
+
+def remainder(message, degree):
+    # The error correction codewords for a block of message codewords, this is
+    # the remainder of message(x) * x^degree divided by the generator
+    # polynomial.  The message may be any iterable of integers, such as a
+    # bytes, bytearray or list, the result is a bytes object of length degree.
+    table = generator_table(degree)
+    shift = 8 * (degree - 1)
+    mask = (1 << (8 * degree)) - 1
+    register = 0
+    for codeword in message:
+        lead = (register >> shift) ^ codeword
+        register = ((register << 8) & mask) ^ table[lead]
+    return register.to_bytes(degree, 'big')
@@ -1,23 +1,110 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-class SVG:
-    
-    xml = ''   
-
-    def add_rect(self, x, y):
-        self.xml += '<rect x="'+str(80 + x)+'" y="'+str(80 + y)+'" width="20" height="20" style="fill:rgb(0,0,0);stroke:none"/>'
-    
-    def add_coloured_rect(self, x, y, colour):
-        self.xml += '<rect x="'+str(80 + x)+'" y="'+str(80 + y)+'" width="20" height="20" style="fill:' + colour + ';stroke:none"/>'
-        
-    def prep_for_drawing(self, width, height):
-        self.xml += '<svg xmlns="http://www.w3.org/2000/svg" width="'+str(width)+'" height="'+str(height)+'" style ="fill:none;">'
-        self.xml += '<style>.svg_txt{font-size:20px;}.glyph{stroke:#000000;stroke-width:1;stroke:1;}</style>'
-        
-    def save(self, filename):
-        self.xml += '</svg>'
-        f = open(filename,'w')
-        f.write(self.xml)
-        f.close()
-        
\ No newline at end of file
+import io
+
+
+def get_rows(modules, gap=4):
+    # Each row of a QRMatrix or a list of columns as bytes of 0 and 1.  For
+    # a group of symbols, such as a StructuredAppend, the symbols are laid
+    # side by side gap light modules apart with their tops lined up.
+    symbols = getattr(modules, 'matrices', None)
+    if symbols is not None:
+        width, height = get_shape(modules, gap)
+        joined = [bytearray() for y in range(height)]
+        for i, symbol in enumerate(symbols):
+            size = len(symbol)
+            rows = get_rows(symbol)
+            for y in range(height):
+                if i:
+                    joined[y] += bytes(gap)
+                joined[y] += rows[y] if y < size else bytes(size)
+        return [bytes(row) for row in joined]
+    if hasattr(modules, 'rows'):
+        return modules.rows()
+    size = len(modules)
+    return [bytes([modules[x][y] for x in range(size)]) for y in range(size)]
+
+
+def get_shape(modules, gap=4):
+    # (width, height) in modules of what get_rows returns.
+    symbols = getattr(modules, 'matrices', None)
+    if symbols is not None:
+        return (sum(len(symbol) for symbol in symbols) + gap *
+            (len(symbols) - 1), max(len(symbol) for symbol in symbols))
+    return len(modules), len(modules)
+
+
+class SVG(object):
+
+    # Draws a symbol as a single <path>.  The drawing is laid out in module
+    # units, scaled up to module_size pixels by the viewBox, and every
+    # horizontal run of dark modules is one relative move and one horizontal
+    # line stroked one module wide, so a row costs a few bytes per run rather
+    # than an element per module.  quiet_zone is the width of the light border
+    # in modules, light may be None for a transparent background.
+
+    def __init__(self, module_size=20, quiet_zone=4, dark='#000', light=None):
+        self.module_size = module_size
+        self.quiet_zone = quiet_zone
+        self.dark = dark
+        self.light = light
+
+    def write(self, modules, stream):
+        # Write the drawing of modules, a QRMatrix, a list of columns or a
+        # group of symbols, to a file-like object a row at a time.  Text
+        # streams are written str, anything else bytes.
+        text = isinstance(stream, io.TextIOBase)
+        def emit(value):
+            stream.write(value if text else value.encode('utf-8'))
+        columns, rows = get_shape(modules, self.quiet_zone)
+        width = columns + 2 * self.quiet_zone
+        height = rows + 2 * self.quiet_zone
+        emit('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" width="%s" height="%s" '
+            'viewBox="0 0 %d %d">' % (width * self.module_size, height *
+            self.module_size, width, height))
+        if self.light is not None:
+            emit('<rect width="%d" height="%d" fill="%s"/>' % (width, height,
+                self.light))
+        emit('<path stroke="%s" shape-rendering="crispEdges" d="' %
+            self.dark)
+        # Each row is drawn along the middle of its modules, after the first
+        # absolute move the pen is tracked so every other move is relative.
+        pen_x = 0
+        pen_y = 0
+        first = True
+        for y, row in enumerate(get_rows(modules, self.quiet_zone)):
+            parts = []
+            start = row.find(1)
+            while start != -1:
+                end = row.find(0, start)
+                if end == -1:
+                    end = columns
+                run_x = start + self.quiet_zone
+                run_y = y + self.quiet_zone
+                if first:
+                    parts.append('M%d %d.5h%d' % (run_x, run_y, end - start))
+                    first = False
+                else:
+                    parts.append('m%d %dh%d' % (run_x - pen_x, run_y - pen_y,
+                        end - start))
+                pen_x = end + self.quiet_zone
+                pen_y = run_y
+                start = row.find(1, end)
+            if parts:
+                emit(''.join(parts))
+        emit('"/></svg>\n')
+
+    def to_bytes(self, modules):
+        # The whole drawing as UTF-8 encoded bytes.
+        stream = io.BytesIO()
+        self.write(modules, stream)
+        return stream.getvalue()
+
+    def save(self, modules, filename):
+        f = open(filename, 'wb')
+        try:
+            self.write(modules, f)
+        finally:
+            f.close()
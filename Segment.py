@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Splits text into the numeric, alphanumeric, byte and kanji segments which
+# encode it in the fewest bits.  Each mode costs a mode indicator and a
+# character count indicator to start and then so many bits per character, so
+# the best split depends on the lengths of the runs of characters each mode
+# can hold and on the width of the character count indicators, which change
+# between versions 9 and 10 and between 26 and 27.  The search is a dynamic
+# programme over the input: for every character and every mode it keeps the
+# cheapest encoding of the text so far which ends in that mode, so the result
+# is exact in time linear in the length of the text.
+
+NUMERIC = frozenset('0123456789')
+ALPHANUMERIC = frozenset('0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:')
+MODES = ('N', 'A', 'B', 'K')
+# Costs are counted in sixths of a bit so the 10 bits per three digits and
+# 11 bits per two alphanumeric characters are whole numbers.
+_NUMERIC_COST = 20
+_ALPHANUMERIC_COST = 33
+_KANJI_COST = 78
+
+
+class Segment(object):
+
+    # A run of input encoded in one mode.  data is a str for numeric and
+    # alphanumeric segments, for byte segments it is the encoded bytes and
+    # for kanji segments the Shift JIS bytes, two per character.
+    def __init__(self, mode_char, data):
+        self.mode_char = mode_char
+        self.data = data
+
+    def __len__(self):
+        # The value of the character count indicator.
+        if self.mode_char == 'K':
+            return len(self.data) // 2
+        return len(self.data)
+
+    def __repr__(self):
+        return 'Segment(%r, %r)' % (self.mode_char, self.data)
+
+
+def get_encoding(text):
+    # Byte segments are ISO 8859-1, the default character set of the ISO
+    # specification, whenever the text allows and UTF-8 otherwise.
+    try:
+        text.encode('iso-8859-1')
+        return 'iso-8859-1'
+    except UnicodeEncodeError:
+        return 'utf-8'
+
+
+def is_kanji(character):
+    # True for a character held by a double byte Shift JIS code in one of
+    # the ranges kanji mode can encode.
+    try:
+        code = character.encode('shift_jis')
+    except UnicodeEncodeError:
+        return False
+    if len(code) != 2:
+        return False
+    value = (code[0] << 8) | code[1]
+    return 0x8140 <= value <= 0x9FFC or 0xE040 <= value <= 0xEBBF
+
+
+def segment(text, count_bits, encoding=None):
+    # The cheapest list of Segments for text, count_bits maps each mode to
+    # the width of its character count indicator for the version in mind.
+    # A bytes-like object is a single byte segment of its bytes as they are.
+    if isinstance(text, (bytes, bytearray, memoryview)):
+        return [Segment('B', bytes(text))] if len(text) else []
+    if not text:
+        return []
+    if NUMERIC.issuperset(text):
+        return [Segment('N', text)]
+    encoding = encoding or get_encoding(text)
+    head = [(4 + count_bits[mode]) * 6 for mode in MODES]
+    costs = head
+    # choices[i][m] is the mode character i is encoded in given the encoding
+    # after it ends in mode m.
+    choices = []
+    for character in text:
+        staying = [None, None, None, None]
+        if character in NUMERIC:
+            staying[0] = costs[0] + _NUMERIC_COST
+        if character in ALPHANUMERIC:
+            staying[1] = costs[1] + _ALPHANUMERIC_COST
+        staying[2] = costs[2] + len(character.encode(encoding)) * 48
+        if character > '\x7f' and is_kanji(character):
+            staying[3] = costs[3] + _KANJI_COST
+        current = list(staying)
+        choice = [mode if staying[mode] is not None else None for mode in
+            range(4)]
+        # Alternatively end the segment after this character, rounding it
+        # up to a whole number of bits, and start one in another mode.
+        for to_mode in range(4):
+            for from_mode in range(4):
+                if staying[from_mode] is None or from_mode == to_mode:
+                    continue
+                cost = -(-staying[from_mode] // 6) * 6 + head[to_mode]
+                if current[to_mode] is None or cost < current[to_mode]:
+                    current[to_mode] = cost
+                    choice[to_mode] = from_mode
+        choices.append(choice)
+        costs = current
+    mode = min(range(4), key=lambda m: costs[m])
+    modes = []
+    for choice in reversed(choices):
+        mode = choice[mode]
+        modes.append(mode)
+    modes.reverse()
+    segments = []
+    start = 0
+    for i in range(1, len(text) + 1):
+        if i == len(text) or modes[i] != modes[start]:
+            mode_char = MODES[modes[start]]
+            data = text[start:i]
+            if mode_char == 'B':
+                data = data.encode(encoding)
+            elif mode_char == 'K':
+                data = data.encode('shift_jis')
+            segments.append(Segment(mode_char, data))
+            start = i
+    return segments
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# A small HTTP server generating QR codes on demand, using nothing but the
+# standard library.  The event loop only parses requests and writes
+# responses, encoding and rendering run in a bounded pool of worker
+# processes and the result is returned from memory, nothing is written to
+# disk.  Every response carries a strong ETag worked out from the payload and
+# options alone, so a client or CDN revalidating with If-None-Match is
+# answered 304 Not Modified without encoding anything.
+#
+#   python Server.py --port 8080
+#   curl 'http://127.0.0.1:8080/qr?data=https://x.io/ABC123&level=M&format=png'
+
+from QR import encode, DataTooLongError
+from Cache import CACHE_VERSION
+from concurrent.futures import ProcessPoolExecutor, wait
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import sys
+
+CONTENT_TYPES = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'pbm': 'image/x-portable-bitmap',
+    'pgm': 'image/x-portable-graymap',
+}
+# Query parameters passed on to the renderer for each format, and how to read
+# them.
+RENDER_OPTIONS = {
+    'svg': {'module_size': int, 'quiet_zone': int, 'dark': str, 'light': str},
+    'png': {'module_size': int, 'quiet_zone': int},
+    'pbm': {'module_size': int, 'quiet_zone': int},
+    'pgm': {'module_size': int, 'quiet_zone': int},
+}
+# Output depends on nothing but the query, so it may be cached for as long
+# as a client likes.
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MAX_HEADER_LINES = 100
+# The widest raster image served, in pixels, quiet zone included.  A
+# version 40 code at module_size 100 would be 18500 pixels square.
+MAX_PIXELS = 4096
+# Colours are written into the SVG as they are, so only hex colours and
+# colour names are accepted.
+COLOUR = re.compile(r'(#[0-9A-Fa-f]{3,8}|[A-Za-z]{1,20})$')
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request',
+    404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error',
+    503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class ImageTooLargeError(ValueError):
+    # Raised by render for raster output wider than MAX_PIXELS.
+    pass
+
+
+def render(error, data, format, options):
+    # Runs in a worker process.
+    matrix = encode(error, data)
+    if format != 'svg':
+        pixels = (len(matrix) + 2 * options.get('quiet_zone', 4)) * \
+            options.get('module_size', 4)
+        if pixels > MAX_PIXELS:
+            raise ImageTooLargeError('The image would be %d pixels wide, '
+                'the most is %d, use a smaller module_size.' % (pixels,
+                MAX_PIXELS))
+    return matrix.to_bytes(format, **options)
+
+
+def parse_query(query):
+    # The error correction level, payload, format and render options of a
+    # query string.  Raises HTTPError for anything missing or malformed.
+    fields = parse_qs(query, keep_blank_values=True)
+    def get(name, default=None):
+        values = fields.get(name)
+        return values[-1] if values else default
+    data = get('data')
+    if data is None:
+        raise HTTPError(400, 'The data parameter is required.')
+    error = get('level', 'M').upper()
+    if error not in ('L', 'M', 'Q', 'H'):
+        raise HTTPError(400, 'level must be one of L, M, Q or H.')
+    format = get('format', 'svg').lower()
+    if format not in CONTENT_TYPES:
+        raise HTTPError(400, 'format must be one of ' +
+            ', '.join(sorted(CONTENT_TYPES)) + '.')
+    options = {}
+    for name, kind in RENDER_OPTIONS[format].items():
+        value = get(name)
+        if value is None:
+            continue
+        if kind is str:
+            if not COLOUR.match(value):
+                raise HTTPError(400, name + ' must be a hex colour or a '
+                    'colour name.')
+            options[name] = value
+            continue
+        try:
+            options[name] = kind(value)
+        except ValueError:
+            raise HTTPError(400, name + ' must be a whole number.')
+        if not 0 <= options[name] <= 100:
+            raise HTTPError(400, name + ' must be from 0 to 100.')
+    if options.get('module_size') == 0:
+        raise HTTPError(400, 'module_size must be at least 1.')
+    return error, data, format, options
+
+
+def get_etag(error, data, format, options):
+    # A strong validator for the response to this request, bytes for bytes
+    # it only changes with the request or the encoder.
+    key = repr((CACHE_VERSION, error, data, format,
+        tuple(sorted(options.items()))))
+    return '"' + hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def matches(if_none_match, etag):
+    # True when an If-None-Match header lists etag, or is *.
+    if if_none_match is None:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+class Server(object):
+
+    # workers is the size of the process pool and max_pending the number of
+    # codes which may be waiting for or being generated at once, requests
+    # beyond that are answered 503 rather than queued without limit.  path is
+    # where codes are served from.
+
+    def __init__(self, workers=None, max_pending=None, path='/qr'):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 16
+        self.path = path
+        self.pending = 0
+        self.executor = None
+
+    def start(self):
+        # Workers are started from a clean process, not forked from this
+        # one, so they never inherit client or listening sockets, and all
+        # of them are started now rather than on the first requests.
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in
+            methods else 'spawn')
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=context)
+        wait([self.executor.submit(int) for i in range(self.workers)])
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def handle(self, reader, writer):
+        # One connection, requests are answered in turn while the client
+        # keeps it alive.
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers = request
+                keep_alive = self.keep_alive(version, headers)
+                status, response_headers, body = await self.respond(method,
+                    target, headers)
+                response_headers.append(('Connection',
+                    'keep-alive' if keep_alive else 'close'))
+                self.write_response(writer, status, response_headers,
+                    b'' if method == 'HEAD' else body, len(body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except HTTPError as error:
+            body = (str(error) + '\n').encode('utf-8')
+            self.write_response(writer, error.status, [('Content-Type',
+                'text/plain; charset=utf-8'), ('Connection', 'close')], body,
+                len(body))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+            writer.close()
+
+    async def read_request(self, reader):
+        # (method, target, version, headers) or None at the end of the
+        # connection.  Header names are lower cased.
+        try:
+            line = await reader.readline()
+        except ValueError:
+            raise HTTPError(400, 'Request line too long.')
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+            raise HTTPError(400, 'Malformed request line.')
+        method, target, version = parts
+        headers = {}
+        for i in range(MAX_HEADER_LINES):
+            try:
+                line = await reader.readline()
+            except ValueError:
+                raise HTTPError(400, 'Header line too long.')
+            line = line.decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, separator, value = line.partition(':')
+            if not separator:
+                raise HTTPError(400, 'Malformed header.')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise HTTPError(400, 'Too many headers.')
+        # Any request body is read and ignored.
+        length = headers.get('content-length', '0')
+        if not length.isdigit():
+            raise HTTPError(400, 'Malformed Content-Length.')
+        if int(length):
+            await reader.readexactly(int(length))
+        return method, target, version, headers
+
+    def keep_alive(self, version, headers):
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    async def respond(self, method, target, headers):
+        # (status, headers, body) for one request.
+        try:
+            if method not in ('GET', 'HEAD'):
+                return self.error(405, 'Only GET and HEAD are supported.',
+                    [('Allow', 'GET, HEAD')])
+            url = urlsplit(target)
+            if url.path != self.path:
+                return self.error(404, 'Codes are served from ' + self.path
+                    + '.')
+            error, data, format, options = parse_query(url.query)
+            etag = get_etag(error, data, format, options)
+            cache_headers = [('ETag', etag), ('Cache-Control', CACHE_CONTROL)]
+            if matches(headers.get('if-none-match'), etag):
+                return 304, cache_headers, b''
+            if self.pending >= self.max_pending:
+                return self.error(503, 'Too many codes in progress, try '
+                    'again shortly.', [('Retry-After', '1')])
+            self.pending += 1
+            try:
+                body = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, render, error, data, format, options)
+            finally:
+                self.pending -= 1
+        except HTTPError as exception:
+            return self.error(exception.status, str(exception))
+        except (DataTooLongError, ImageTooLargeError) as exception:
+            return self.error(413, str(exception))
+        except Exception as exception:
+            # Anything else, including a broken worker pool, is answered
+            # rather than dropping the connection.
+            sys.stderr.write('%s: %r\n' % (target, exception))
+            return self.error(500, 'The code could not be generated.')
+        return 200, [('Content-Type', CONTENT_TYPES[format])] + \
+            cache_headers, body
+
+    def error(self, status, message, headers=()):
+        return status, [('Content-Type', 'text/plain; charset=utf-8'),
+            ('Cache-Control', 'no-store')] + list(headers), \
+            (message + '\n').encode('utf-8')
+
+    def write_response(self, writer, status, headers, body, length):
+        # length is the Content-Length, which for HEAD is that of the body
+        # a GET would have returned.
+        lines = ['HTTP/1.1 %d %s' % (status, REASONS[status])]
+        if status != 304:
+            lines.append('Content-Length: %d' % length)
+        lines.extend('%s: %s' % header for header in headers)
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if body:
+            writer.write(body)
+
+
+async def serve(host='127.0.0.1', port=8080, workers=None, max_pending=None,
+        path='/qr', ready=None):
+    # Run a Server until cancelled.  ready, if given, is called with the
+    # listening asyncio server once it is accepting connections.
+    server = Server(workers, max_pending, path)
+    server.start()
+    try:
+        listener = await asyncio.start_server(server.handle, host, port)
+        async with listener:
+            if ready is not None:
+                ready(listener)
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def parse_arguments(argv):
+    parser = argparse.ArgumentParser(description='Serve QR codes over HTTP, '
+        'GET /qr?data=...&level=M&format=svg')
+    parser.add_argument('--host', default='127.0.0.1', help='address to '
+        'listen on (default: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8080, help='port '
+        'to listen on (default: 8080)')
+    parser.add_argument('-w', '--workers', type=int, help='worker processes '
+        '(default: one per CPU)')
+    parser.add_argument('--max-pending', type=int, help='codes in progress '
+        'at once before answering 503 (default: 16 per worker)')
+    parser.add_argument('--path', default='/qr', help='path codes are '
+        'served from (default: /qr)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    def ready(listener):
+        for socket in listener.sockets:
+            sys.stderr.write('Serving on http://%s:%d%s\n' % (
+                socket.getsockname()[:2] + (arguments.path,)))
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.workers,
+            arguments.max_pending, arguments.path, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Sheets of many codes per page for label printing, as one SVG file per page
+# or a single vector PDF.  Codes are read from any iterable a page at a time
+# and each page is written out as soon as it is full, so only one page of
+# codes is ever held in memory however long the print run; a PDF keeps no
+# more than the position of each object written so far.  The three finder
+# patterns of every code are drawn from one shared definition, a <defs>
+# path in SVG and a form XObject in PDF, and the remaining dark modules as
+# one run per horizontal stretch as SVG.py does.
+#
+#   from Sheet import Sheet
+#
+#   sheet = Sheet(columns=4, rows=6)
+#   sheet.save_pdf(((encode('M', url), url) for url in urls), 'labels')
+
+from SVG import get_rows
+from xml.sax.saxutils import escape
+import itertools
+import re
+import zlib
+
+# Page sizes in points.
+A4 = (595.28, 841.89)
+LETTER = (612, 792)
+HEX_COLOUR = re.compile(r'#([0-9A-Fa-f]{3}|[0-9A-Fa-f]{6})$')
+# The finder pattern, seven modules square with a light ring inside it and
+# a dark three by three centre, as a path filled with the even-odd rule.
+FINDER_PATH = 'M0 0h7v7h-7zM1 1h5v5h-5zM2 2h3v3h-3z'
+
+
+def get_runs(matrix):
+    # (x, y, length) of every horizontal run of dark modules except those
+    # of the three finder patterns.
+    rows = get_rows(matrix)
+    size = len(rows)
+    for y, row in enumerate(rows):
+        if y < 7 or y >= size - 7:
+            row = bytearray(row)
+            row[0:7] = bytes(7)
+            if y < 7:
+                row[size - 7:] = bytes(7)
+        start = row.find(1)
+        while start != -1:
+            end = row.find(0, start)
+            if end == -1:
+                end = size
+            yield start, y, end - start
+            start = row.find(1, end)
+
+
+def number(value):
+    # A coordinate with no more digits than it needs.
+    return ('%.3f' % value).rstrip('0').rstrip('.')
+
+
+class Sheet(object):
+
+    # Lays codes out columns across and rows down on pages of page_size
+    # points with margin points around the edge.  Each code is scaled to
+    # fill its cell, quiet zone included, leaving room underneath for a
+    # caption caption_size points high when there is one.  Items are
+    # QRMatrix objects or (QRMatrix, caption) pairs.
+
+    def __init__(self, columns=4, rows=6, page_size=A4, margin=36,
+            quiet_zone=4, caption_size=8, dark='#000', light=None):
+        if columns < 1 or rows < 1:
+            raise ValueError('A sheet needs at least one row and column.')
+        self.columns = columns
+        self.rows = rows
+        self.page_size = page_size
+        self.margin = margin
+        self.quiet_zone = quiet_zone
+        self.caption_size = caption_size
+        self.dark = dark
+        self.light = light
+
+    def pages(self, items):
+        # Lists of (matrix, caption) pairs, one page at a time.
+        per_page = self.columns * self.rows
+        iterator = iter(items)
+        while True:
+            page = list(itertools.islice(iterator, per_page))
+            if not page:
+                return
+            yield [item if isinstance(item, tuple) else (item, None) for item
+                in page]
+
+    def layout(self, page):
+        # (matrix, caption, x, y, scale) for each code on a page, x and y
+        # being the top left corner of its quiet zone in points from the top
+        # left of the page and scale the points per module.
+        width, height = self.page_size
+        cell_width = (width - 2 * self.margin) / self.columns
+        cell_height = (height - 2 * self.margin) / self.rows
+        caption_height = self.caption_size * 1.5
+        for i, (matrix, caption) in enumerate(page):
+            row, column = divmod(i, self.columns)
+            side = min(cell_width, cell_height - (caption_height if caption
+                else 0))
+            x = self.margin + column * cell_width + (cell_width - side) / 2
+            y = self.margin + row * cell_height
+            yield matrix, caption, x, y, side / (len(matrix) + 2 *
+                self.quiet_zone)
+
+    def svg_pages(self, items):
+        # Yields each page as a complete SVG document in UTF-8 encoded bytes.
+        width, height = self.page_size
+        quiet_zone = self.quiet_zone
+        for page in self.pages(items):
+            parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<svg xmlns="http://www.w3.org/2000/svg" '
+                'xmlns:xlink="http://www.w3.org/1999/xlink" width="%spt" '
+                'height="%spt" viewBox="0 0 %s %s"><defs><path id="finder" '
+                'stroke="none" fill-rule="evenodd" d="%s"/></defs>' % (
+                number(width), number(height), number(width), number(height),
+                FINDER_PATH)]
+            if self.light is not None:
+                parts.append('<rect width="100%%" height="100%%" fill="%s"/>'
+                    % self.light)
+            parts.append('<g fill="%s" stroke="%s" '
+                'shape-rendering="crispEdges">' % (self.dark, self.dark))
+            for matrix, caption, x, y, scale in self.layout(page):
+                size = len(matrix)
+                parts.append('<g transform="translate(%s %s) scale(%s)">' % (
+                    number(x), number(y), number(scale)))
+                for finder_x, finder_y in ((0, 0), (size - 7, 0), (0,
+                        size - 7)):
+                    parts.append('<use xlink:href="#finder" x="%d" y="%d"/>'
+                        % (finder_x + quiet_zone, finder_y + quiet_zone))
+                parts.append('<path d="')
+                parts.extend('M%d %d.5h%d' % (run_x + quiet_zone, run_y +
+                    quiet_zone, length) for run_x, run_y, length in
+                    get_runs(matrix))
+                parts.append('"/></g>')
+                if caption:
+                    parts.append('<text x="%s" y="%s" font-size="%s" '
+                        'stroke="none" font-family="Helvetica, Arial, '
+                        'sans-serif">%s</text>' % (number(x + quiet_zone *
+                        scale), number(y + (size + 2 * quiet_zone) * scale +
+                        self.caption_size), number(self.caption_size),
+                        escape(caption)))
+            parts.append('</g></svg>\n')
+            yield ''.join(parts).encode('utf-8')
+
+    def save_svg(self, items, filename='sheet'):
+        # Write each page to <filename>-<page>.svg, numbered from 1, and
+        # return the number of pages.
+        count = 0
+        for count, content in enumerate(self.svg_pages(items), 1):
+            with open('%s-%d.svg' % (filename, count), 'wb') as f:
+                f.write(content)
+        return count
+
+    def write_pdf(self, items, stream):
+        # Write a PDF of every page to a binary file-like object and return
+        # the number of pages.  The page tree is written last, once the
+        # number of pages is known.
+        dark = get_rgb(self.dark)
+        light = get_rgb(self.light) if self.light is not None else None
+        writer = PDFWriter(stream)
+        writer.write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        writer.write_object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont '
+            b'/Helvetica /Encoding /WinAnsiEncoding >>')
+        writer.write_stream(4, b'/Type /XObject /Subtype /Form /BBox '
+            b'[0 0 7 7]', b'0 0 7 7 re 1 1 5 5 re 2 2 3 3 re f*')
+        width, height = self.page_size
+        quiet_zone = self.quiet_zone
+        kids = []
+        for page in self.pages(items):
+            parts = []
+            if light is not None:
+                parts.append('%s rg 0 0 %s %s re f' % (light, number(width),
+                    number(height)))
+            parts.append('%s rg' % dark)
+            for matrix, caption, x, y, scale in self.layout(page):
+                size = len(matrix)
+                # Module units with y running down the page, as in SVG.
+                parts.append('q %s 0 0 %s %s %s cm' % (number(scale),
+                    number(-scale), number(x + quiet_zone * scale),
+                    number(height - y - quiet_zone * scale)))
+                for finder_x, finder_y in ((0, 0), (size - 7, 0), (0,
+                        size - 7)):
+                    parts.append('q 1 0 0 1 %d %d cm /F Do Q' % (finder_x,
+                        finder_y))
+                parts.extend('%d %d %d 1 re' % run for run in
+                    get_runs(matrix))
+                parts.append('f Q')
+                if caption:
+                    text = caption.encode('cp1252', 'replace')
+                    text = text.replace(b'\\', b'\\\\').replace(b'(',
+                        b'\\(').replace(b')', b'\\)').decode('latin-1')
+                    parts.append('BT /F1 %s Tf %s %s Td (%s) Tj ET' % (
+                        number(self.caption_size), number(x + quiet_zone *
+                        scale), number(height - y - (size + 2 * quiet_zone) *
+                        scale - self.caption_size), text))
+            content = writer.reserve()
+            writer.write_stream(content, b'/Filter /FlateDecode',
+                zlib.compress('\n'.join(parts).encode('latin-1')))
+            number_of_page = writer.reserve()
+            writer.write_object(number_of_page, ('<< /Type /Page /Parent 2 0 '
+                'R /MediaBox [0 0 %s %s] /Resources << /Font << /F1 3 0 R >> '
+                '/XObject << /F 4 0 R >> >> /Contents %d 0 R >>' % (
+                number(width), number(height), content)).encode('ascii'))
+            kids.append(number_of_page)
+        writer.write_object(2, ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            ' '.join('%d 0 R' % kid for kid in kids), len(kids))).encode(
+            'ascii'))
+        writer.close()
+        return len(kids)
+
+    def save_pdf(self, items, filename='sheet'):
+        # Write every page to <filename>.pdf and return the number of pages.
+        with open(filename + '.pdf', 'wb') as f:
+            return self.write_pdf(items, f)
+
+
+def get_rgb(colour):
+    # A hex colour as PDF red, green and blue components.
+    match = HEX_COLOUR.match(colour)
+    if match is None:
+        raise ValueError('PDF colours must be hex colours such as #000 or '
+            '#1a2b3c, got ' + repr(colour))
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = ''.join(digit * 2 for digit in digits)
+    return ' '.join(number(int(digits[i:i + 2], 16) / 255) for i in (0, 2,
+        4))
+
+
+class PDFWriter(object):
+
+    # Writes numbered objects to a stream as they are made, remembering
+    # only where each one starts for the cross reference table.  Objects 1
+    # to 4 are fixed by Sheet, reserve hands out the rest.
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.position = 0
+        self.offsets = {}
+        self.next_number = 5
+        self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def write_object(self, number, body):
+        self.offsets[number] = self.position
+        self.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def write_stream(self, number, dictionary, data):
+        self.write_object(number, b'<< ' + dictionary + b' /Length %d >>\n'
+            b'stream\n' % len(data) + data + b'\nendstream')
+
+    def close(self):
+        # The cross reference table and trailer.
+        count = max(self.offsets) + 1
+        start = self.position
+        lines = [b'xref\n0 %d\n0000000000 65535 f \n' % count]
+        for number in range(1, count):
+            lines.append(b'%010d 00000 n \n' % self.offsets[number])
+        self.write(b''.join(lines) + b'trailer\n<< /Size %d /Root 1 0 R >>\n'
+            b'startxref\n%d\n%%%%EOF\n' % (count, start))
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Structured append, section 8 of the ISO specification: a payload too large
+# for one comfortable symbol is split across up to sixteen symbols, each
+# starting with a header giving its position in the sequence, the number of
+# symbols and a parity byte for the whole payload, so a reader can put them
+# back together in any order.  The split points are chosen so every part
+# fills a symbol of the target version, and the parts are encoded at once
+# in a pool of worker processes.
+#
+#   from Structured import encode_structured
+#
+#   group = encode_structured('M', vcard, version=10)
+#   group.save_svg('vcard')     # the symbols side by side in one drawing
+
+from QR import QR, encode, DataTooLongError
+from SVG import SVG
+from Raster import Raster
+from Segment import segment, get_encoding
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+MAX_SYMBOLS = 16
+
+
+def encode_structured(error, data, version=None, max_symbols=MAX_SYMBOLS,
+        workers=None, **options):
+    # Split data into at most max_symbols symbols of the given version and
+    # error correction level and return them as a StructuredAppend.  With
+    # no version the smallest which needs no more than max_symbols symbols
+    # is used.  The parts are encoded by a pool of worker processes, one per
+    # CPU by default, any other keyword arguments are passed on to encode.
+    # Byte segments of text are in one character set, chosen for the whole
+    # of data or named by the eci option, so the parts join back together.
+    if not 1 <= max_symbols <= MAX_SYMBOLS:
+        raise ValueError('Structured append sequences have 1 to 16 symbols,'
+            ' got ' + str(max_symbols))
+    error_char = error.upper()
+    encoding = options.pop('encoding', None)
+    # Every symbol starts with a structured append header and, with eci, an
+    # ECI header.
+    headers = [QR.get_structured_append(0, 1, 0)]
+    eci = options.get('eci')
+    if eci is not None and eci is not False:
+        designator = QR.ECI_UTF8 if eci is True else eci
+        headers.append(QR.get_eci(designator))
+        if isinstance(data, str):
+            encoding = QR.get_eci_encoding(designator, encoding)
+    header_bits = QR.get_segments_bit_length(headers, {})
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data)
+        encoding = None
+    else:
+        encoding = encoding or get_encoding(data)
+    if version is not None:
+        parts = split(error_char, data, version, header_bits, encoding)
+        if parts is None or len(parts) > max_symbols:
+            raise DataTooLongError('Input does not fit in ' +
+                str(max_symbols) + ' version ' + str(version) + ' symbols '
+                'at error correction level ' + error_char + '.')
+    else:
+        for version in range(1, 41):
+            if not could_fit(error_char, data, version, max_symbols,
+                    header_bits, encoding):
+                continue
+            parts = split(error_char, data, version, header_bits,
+                encoding)
+            if parts is not None and len(parts) <= max_symbols:
+                break
+        else:
+            raise DataTooLongError('Input does not fit in ' +
+                str(max_symbols) + ' version 40 symbols at error correction '
+                'level ' + error_char + '.')
+    parity = get_parity(parts, version, encoding)
+    options['encoding'] = encoding
+    jobs = [(error_char, part, version, (position, len(parts), parity),
+        options) for position, part in enumerate(parts)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        matrices = [_encode_part(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+            matrices = list(pool.map(_encode_part, jobs))
+    return StructuredAppend(matrices, parity)
+
+
+def _encode_part(job):
+    # Runs in a worker process.
+    error_char, part, version, header, options = job
+    return encode(error_char, part, version=version,
+        structured_append=header, **options)
+
+
+def get_parity(parts, version, encoding=None):
+    # The parity byte, every data byte of the parts XORed together as they
+    # are held in symbols of version: ASCII for numeric and alphanumeric
+    # segments, Shift JIS for kanji and byte segments as they are.
+    count_bits = dict((mode_char, QR.get_count_bits(version, mode_char)) for
+        mode_char in QR.TABLE_3)
+    parity = 0
+    for part in parts:
+        for item in segment(part, count_bits, encoding):
+            data = item.data
+            if item.mode_char in ('N', 'A'):
+                data = data.encode('ascii')
+            for byte in data:
+                parity ^= byte
+    return parity
+
+
+def fits(error_char, text, version, header_bits, encoding=None):
+    # True when text and header_bits of headers fit in one symbol of
+    # version, byte segments of text being in encoding.
+    count_bits = dict((mode_char, QR.get_count_bits(version, mode_char)) for
+        mode_char in QR.TABLE_3)
+    return QR.get_segments_bit_length(segment(text, count_bits, encoding),
+        count_bits) + header_bits <= \
+        QR.get_data_codeword_count(version, error_char) * 8
+
+
+def could_fit(error_char, text, version, count, header_bits,
+        encoding=None):
+    # False when text cannot possibly be split across count symbols of
+    # version.  Splitting never makes the encoding shorter, so the whole of
+    # the text encoded at once is a lower bound.
+    count_bits = dict((mode_char, QR.get_count_bits(version, mode_char)) for
+        mode_char in QR.TABLE_3)
+    return QR.get_segments_bit_length(segment(text, count_bits, encoding),
+        count_bits) <= count * (QR.get_data_codeword_count(version,
+        error_char) * 8 - header_bits)
+
+
+def split(error_char, text, version, header_bits, encoding=None):
+    # Cut text into parts each filling a symbol of version as far as it
+    # can, or None if even one character does not fit.  Adding characters
+    # never makes an encoding shorter, so the longest part which fits is
+    # found by bisection.
+    parts = []
+    start = 0
+    while True:
+        low = 0
+        high = len(text) - start
+        while low < high:
+            middle = (low + high + 1) // 2
+            if fits(error_char, text[start:start + middle], version,
+                    header_bits, encoding):
+                low = middle
+            else:
+                high = middle - 1
+        if low == 0 and start < len(text):
+            return None
+        parts.append(text[start:start + low])
+        start += low
+        if start == len(text):
+            return parts
+
+
+class StructuredAppend(object):
+
+    # A sequence of symbols making up one payload.  matrices are the
+    # QRMatrix objects in order and parity the parity byte they share.  It
+    # renders like a QRMatrix, the symbols side by side a quiet zone apart.
+
+    def __init__(self, matrices, parity):
+        self.matrices = list(matrices)
+        self.parity = parity
+
+    def __len__(self):
+        return len(self.matrices)
+
+    def __iter__(self):
+        return iter(self.matrices)
+
+    def __getitem__(self, index):
+        return self.matrices[index]
+
+    def __repr__(self):
+        return 'StructuredAppend(%d symbols, version %d)' % (
+            len(self.matrices), self.matrices[0].version)
+
+    def write_svg(self, stream, **options):
+        # Write the symbols as one SVG drawing to a file-like object,
+        # options are passed to SVG: module_size, quiet_zone, dark and light.
+        SVG(**options).write(self, stream)
+
+    def to_svg(self, **options):
+        return self.to_bytes('svg', **options)
+
+    def save_svg(self, filename, **options):
+        # Write the symbols to <filename>.svg.
+        with open(filename + '.svg', 'wb') as f:
+            self.write_svg(f, **options)
+
+    def write_png(self, stream, **options):
+        # Write the symbols as one 1-bit PNG to a binary file-like object.
+        Raster(**options).write_png(self, stream)
+
+    def to_png(self, **options):
+        return self.to_bytes('png', **options)
+
+    def save_png(self, filename, **options):
+        # Write the symbols to <filename>.png.
+        with open(filename + '.png', 'wb') as f:
+            self.write_png(f, **options)
+
+    def to_bytes(self, format='svg', **options):
+        # The symbols rendered side by side as 'svg', 'png', 'pbm' or 'pgm'.
+        if format == 'svg':
+            return SVG(**options).to_bytes(self)
+        return Raster(**options).to_bytes(self, format)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Codes made from a fixed prefix and a short variable suffix of known length,
+# such as serial numbers on a URL.  The data codewords are laid out the same
+# way for every suffix, the prefix in its own segments and the suffix in one
+# segment of a fixed mode and length, so only the few codewords holding the
+# suffix change from code to code.  Reed-Solomon is linear over GF(256): the
+# error correction codewords of a block are those of the constant codewords
+# XORed with the contribution of each changed codeword, looked up in a table
+# built once.  The symbol with every constant codeword placed is also built
+# once, so each code only places the changed codewords before the mask is
+# chosen as usual.
+#
+#   from Template import Template
+#
+#   template = Template('M', 'HTTPS://T.CO/X/', 8)
+#   matrix = template.encode('00001234')
+
+from QR import QR, QRMatrix, DataTooLongError
+from BitBuffer import BitBuffer
+from Segment import Segment, segment, NUMERIC, ALPHANUMERIC
+from Layout import get_layout
+import ReedSolomon
+
+
+class Template(object):
+
+    # error is the error correction level, prefix the constant text and
+    # length the number of characters in every suffix, each one of
+    # characters.  The suffix is held in numeric, alphanumeric or byte mode,
+    # whichever is the cheapest for characters.  version and mask fix the
+    # version, by default the smallest which fits, and the mask pattern, by
+    # default the lowest scoring for each code, chosen with backend and
+    # strategy as in QR.  The symbols read the same as those made by encode
+    # but may be segmented differently.
+
+    def __init__(self, error, prefix, length, characters='0123456789',
+            version=None, mask=None, backend=None, strategy=None):
+        if length < 1:
+            raise ValueError('Suffixes must be at least one character long.')
+        if mask is not None and not 0 <= mask <= 7:
+            raise ValueError('Mask patterns run from 0 to 7, got ' +
+                str(mask))
+        self.error_char = error.upper()
+        self.prefix = prefix
+        self.length = length
+        self.characters = frozenset(characters)
+        self.mask = mask
+        self.backend = backend or QR.MASK_BACKEND
+        self.strategy = strategy or QR.MASK_STRATEGY
+        if self.strategy not in QR.MASK_STRATEGIES:
+            raise ValueError('Mask strategy must be one of ' +
+                ', '.join(QR.MASK_STRATEGIES) + ', got ' + repr(strategy))
+        if NUMERIC.issuperset(self.characters):
+            self.mode_char = 'N'
+            placeholder = '0' * length
+        elif ALPHANUMERIC.issuperset(self.characters):
+            self.mode_char = 'A'
+            placeholder = '0' * length
+        else:
+            try:
+                ''.join(self.characters).encode('iso-8859-1')
+            except UnicodeEncodeError:
+                raise ValueError('Suffix characters must be ISO 8859-1 so '
+                    'every suffix is the same number of bytes.')
+            self.mode_char = 'B'
+            placeholder = bytes(length)
+        self.version, segments = self.get_version(prefix, placeholder,
+            version or 1)
+        if version is not None and self.version != version:
+            raise DataTooLongError('Template is too long for a version ' +
+                str(version) + ' code at error correction level ' +
+                self.error_char + '.')
+        self.build(segments)
+
+    def get_version(self, prefix, placeholder, minimum):
+        # The smallest version, no smaller than minimum, with room for the
+        # prefix and the suffix segment, and the segments themselves.
+        if not 1 <= minimum <= 40:
+            raise ValueError('QR code versions run from 1 to 40, got ' +
+                str(minimum))
+        segments = None
+        for version in range(minimum, 41):
+            if segments is None or version in (10, 27):
+                count_bits = dict((mode_char, QR.get_count_bits(version,
+                    mode_char)) for mode_char in QR.TABLE_3)
+                segments = segment(prefix, count_bits) + [Segment(
+                    self.mode_char, placeholder)]
+                required = QR.get_segments_bit_length(segments, count_bits)
+                # The suffix starts after the prefix and its own mode and
+                # character count indicators.
+                self.offset = QR.get_segments_bit_length(segments[:-1],
+                    count_bits) + 4 + count_bits[self.mode_char]
+            if required <= QR.get_data_codeword_count(version,
+                    self.error_char) * 8:
+                return version, segments
+        raise DataTooLongError('Template is too long for a version 40 code '
+            'at error correction level ' + self.error_char + '.')
+
+    def build(self, segments):
+        # Work out everything which is the same for every code: the data
+        # codewords with a suffix of zero bits, the error correction
+        # codewords of each block, the tables of what each changing codeword
+        # contributes and the placed symbol.
+        version = self.version
+        error_char = self.error_char
+        self.width = QR.get_bit_length(self.mode_char, self.length)
+        self.first = self.offset // 8
+        last = (self.offset + self.width - 1) // 8
+        self.shift = (last + 1) * 8 - self.offset - self.width
+        data_codewords = QR.generate_data_codewords(version, error_char,
+            segments)
+        self.window = int.from_bytes(data_codewords[self.first:last + 1],
+            'big')
+        self.window_length = last + 1 - self.first
+
+        # Where each data and error correction codeword of each block ends
+        # up in the interleaved stream.
+        ec, blocks_1, data_1, blocks_2, data_2 = QR.TABLE_9[version][
+            error_char]
+        lengths = [data_1] * blocks_1 + [data_2] * blocks_2
+        count = len(lengths)
+        # The error correction codewords of the constant part are worked out
+        # with the changing codewords zeroed, each code then adds in the
+        # contribution of the whole of each changing codeword.
+        zeroed = bytearray(data_codewords)
+        zeroed[self.first:last + 1] = bytes(self.window_length)
+        blocks = QR.get_blocks(version, error_char, zeroed)
+        stream = {}
+        for i in range(max(lengths)):
+            for block, length in enumerate(lengths):
+                if i < length:
+                    stream[(block, i)] = len(stream)
+        data_length = len(stream)
+        bit_positions = get_layout(version).bit_positions
+        def positions(index):
+            return tuple(bit_positions[index * 8:index * 8 + 8])
+
+        # Every changing data codeword: its block, its eight module positions
+        # and the error correction contribution of each of its 256 values.
+        self.changing = []
+        self.error_positions = {}
+        self.base_errors = {}
+        for index in range(self.first, last + 1):
+            block = 0
+            start = 0
+            while start + lengths[block] <= index:
+                start += lengths[block]
+                block += 1
+            place = index - start
+            bits = []
+            for bit in range(8):
+                message = bytearray(lengths[block])
+                message[place] = 1 << bit
+                bits.append(int.from_bytes(ReedSolomon.remainder(message,
+                    ec), 'big'))
+            table = [0] * 256
+            for value in range(1, 256):
+                lowest = value & -value
+                table[value] = table[value ^ lowest] ^ bits[
+                    lowest.bit_length() - 1]
+            self.changing.append((block, positions(stream[(block, place)]),
+                table))
+            if block not in self.base_errors:
+                self.base_errors[block] = int.from_bytes(
+                    QR.generate_error_codewords(version, error_char,
+                    blocks[block]), 'big')
+                self.error_positions[block] = [positions(data_length +
+                    i * count + block) for i in range(ec)]
+        self.ec = ec
+        self.base = QR.generate_blank_array(version)
+        QR.place_codewords(self.base, version, QR.add_error_codewords(
+            version, error_char, data_codewords))
+
+    def encode(self, suffix):
+        # The QRMatrix for prefix + suffix.
+        if len(suffix) != self.length or not self.characters.issuperset(
+                suffix):
+            raise ValueError('Suffix must be ' + str(self.length) +
+                ' characters from the template, got ' + repr(suffix))
+        buffer = BitBuffer()
+        if self.mode_char == 'N':
+            QR.encode_numeric(suffix, buffer)
+        elif self.mode_char == 'A':
+            QR.encode_alphanumeric(suffix, buffer)
+        else:
+            QR.encode_byte(suffix.encode('iso-8859-1'), buffer)
+        bits = int.from_bytes(buffer.get_bytes(), 'big') >> (-self.width % 8)
+        codewords = (self.window | (bits << self.shift)).to_bytes(
+            self.window_length, 'big')
+        code = [column[:] for column in self.base]
+        errors = dict(self.base_errors)
+        for codeword, (block, positions, table) in zip(codewords,
+                self.changing):
+            errors[block] ^= table[codeword]
+            for shift, (x, y) in zip((7, 6, 5, 4, 3, 2, 1, 0), positions):
+                code[x][y] = (codeword >> shift) & 1
+        for block, value in errors.items():
+            for codeword, positions in zip(value.to_bytes(self.ec, 'big'),
+                    self.error_positions[block]):
+                for shift, (x, y) in zip((7, 6, 5, 4, 3, 2, 1, 0),
+                        positions):
+                    code[x][y] = (codeword >> shift) & 1
+        version = self.version
+        if self.mask is None:
+            mask, code, scores = QR.select_mask(code, version, self.backend,
+                self.strategy)
+        else:
+            mask = self.mask
+            code = QR.apply_mask(code, QR.get_mask(version, mask))
+        QR.add_format_information(code, QR.FORMAT_INFORMATION[
+            self.error_char][mask], version)
+        QR.add_version_information(code, version)
+        return QRMatrix(code, version, self.error_char, mask)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Benchmark.py's payloads, argument parsing and baseline checks.
+
+from QR import QR
+import Benchmark
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_payloads_fill_symbol(self):
+        for mode in Benchmark.MODE_CHARS:
+            for version, error_char in ((1, 'H'), (10, 'M'), (27, 'L')):
+                payload = Benchmark.make_payload(mode, version, error_char)
+                self.assertEqual(QR.get_version(error_char, payload,
+                    version)[0], version)
+                self.assertNotEqual(QR.get_version(error_char, payload +
+                    payload[-1], version)[0], version)
+
+    def test_parse_versions(self):
+        self.assertEqual(Benchmark.parse_versions('1-3,27'), [1, 2, 3, 27])
+        with self.assertRaises(argparse.ArgumentTypeError):
+            Benchmark.parse_versions('0-2')
+
+    def test_compare(self):
+        self.assertEqual(Benchmark.compare({'a': 1.3, 'b': 1.1, 'c': 9},
+            {'a': 1.0, 'b': 1.0}, 0.2), [('a', 1.0, 1.3)])
+
+    def test_baseline(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'results.json')
+        argv = ['--versions', '1', '--levels', 'M', '--modes', 'numeric',
+            '--stages', 'segment,svg', '--repeat', '1', '--target', '0.001',
+            '--throughput-count', '2', '-q']
+        self.assertEqual(Benchmark.main(argv + ['-o', output]), 0)
+        with open(output) as f:
+            results = json.load(f)['results']
+        self.assertEqual(sorted(results), ['end_to_end/url/M',
+            'segment/numeric/1M', 'svg/numeric/1M'])
+        baseline = os.path.join(directory, 'baseline.json')
+        for scale, status in ((1000, 0), (0.001, 1)):
+            with open(baseline, 'w') as f:
+                json.dump({'results': dict((key, seconds * scale) for key,
+                    seconds in results.items())}, f)
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.assertEqual(Benchmark.main(argv + ['-b', baseline]),
+                    status)
+
+
+if __name__ == '__main__':
+    unittest.main()
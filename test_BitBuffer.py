@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of BitBuffer.py against a string of '0' and '1' characters.
+
+from BitBuffer import BitBuffer
+import random
+import unittest
+
+
+class TestBitBuffer(unittest.TestCase):
+
+    def test_matches_string(self):
+        generator = random.Random(9)
+        for i in range(50):
+            buffer = BitBuffer()
+            bits = ''
+            for j in range(generator.randint(0, 40)):
+                if generator.random() < 0.2:
+                    data = bytes(generator.randrange(256) for k in range(
+                        generator.randint(0, 5)))
+                    buffer.write_bytes(data)
+                    bits += ''.join(format(byte, '08b') for byte in data)
+                else:
+                    length = generator.randint(1, 20)
+                    value = generator.getrandbits(length + 3)
+                    buffer.write(value, length)
+                    bits += format(value, '0%db' % (length + 3))[3:]
+                self.assertEqual(len(buffer), len(bits))
+            padded = bits + '0' * (-len(bits) % 8)
+            self.assertEqual(buffer.get_bytes(), bytes(int(padded[k:k + 8],
+                2) for k in range(0, len(padded), 8)))
+            buffer.pad_to_byte()
+            self.assertEqual(len(buffer), len(padded))
+
+    def test_empty(self):
+        buffer = BitBuffer()
+        buffer.write_bytes(b'')
+        buffer.pad_to_byte()
+        self.assertEqual((len(buffer), buffer.get_bytes()), (0, b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of CLI.py run in a temporary directory, one worker process so the
+# records are encoded in this one.
+
+from Decoder import decode
+from QR import QRMatrix
+import CLI
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zipfile
+
+
+class CLITestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, *names):
+        return os.path.join(self.directory, *names)
+
+    def write_input(self, name, text):
+        with open(self.path(name), 'w', encoding='utf-8') as f:
+            f.write(text)
+        return self.path(name)
+
+    def run_cli(self, *argv):
+        # The exit status and what was written to stderr.
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            status = CLI.main(list(argv) + ['-w', '1', '-q'])
+        return status, stderr.getvalue()
+
+    def read_pbm(self, name):
+        # The modules of a P4 PBM written with module_size 1 and no quiet
+        # zone.
+        with open(self.path(name), 'rb') as f:
+            header, size, data = f.read().split(b'\n', 2)
+        width = int(size.split()[0])
+        stride = (width + 7) // 8
+        columns = [[(data[y * stride + x // 8] >> (7 - x % 8)) & 1 for y in
+            range(width)] for x in range(width)]
+        return QRMatrix(columns, (width - 17) // 4, None, None)
+
+
+class TestCLI(CLITestCase):
+
+    def test_lines(self):
+        source = self.write_input('in.txt', 'HELLO\nhttps://x.io/1\n\nabc\n')
+        status, stderr = self.run_cli(source, '-f', 'pbm', '-s', '1',
+            '--quiet-zone', '0', '-o', self.path('out', '{index}.{ext}'))
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(os.listdir(self.path('out'))), ['0.pbm',
+            '1.pbm', '2.pbm'])
+        self.assertEqual(decode(self.read_pbm(os.path.join('out',
+            '1.pbm'))), 'https://x.io/1')
+
+    def test_bad_json_records(self):
+        # Records which cannot be read are reported and the rest written.
+        source = self.write_input('in.jsonl', '{"id": "a"}\n{"other": 1}\n'
+            'not json\n[1, 2]\n{"id": "b"}\n')
+        status, stderr = self.run_cli(source, '--field', 'id', '-o',
+            self.path('{index}-{id}.svg'))
+        self.assertEqual(status, 1)
+        self.assertTrue(os.path.exists(self.path('0-a.svg')))
+        self.assertTrue(os.path.exists(self.path('4-b.svg')))
+        for index in (1, 2, 3):
+            self.assertIn('record %d: ' % index, stderr)
+
+    def test_csv(self):
+        source = self.write_input('in.csv', 'sku,url\nA1,https://x.io/a\n'
+            'B2\nC3,https://x.io/c\n')
+        status, stderr = self.run_cli(source, '--column', 'url', '-o',
+            self.path('{sku}.svg'))
+        self.assertEqual(status, 1)
+        self.assertIn('record 1: ', stderr)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['A1.svg',
+            'C3.svg', 'in.csv'])
+
+    def test_failed_encode(self):
+        source = self.write_input('in.txt', 'ok\n' + '9' * 8000 + '\nok\n')
+        status, stderr = self.run_cli(source, '-o', self.path('{index}.svg'))
+        self.assertEqual(status, 1)
+        self.assertIn('record 1: ', stderr)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['0.svg',
+            '2.svg', 'in.txt'])
+
+    def test_unknown_template_field(self):
+        # Templates are checked before anything is encoded.
+        source = self.write_input('in.txt', 'a\nb\n')
+        csv_source = self.write_input('in.csv', 'sku,url\nA1,x\n')
+        for argv in ((source, '-o', self.path('{sku}.svg')), (source, '-o',
+                self.path('{}.svg')), (source, '-o', self.path('{index')),
+                (csv_source, '-o', self.path('{name}.svg')), (source,
+                '--sheet', self.path('s.pdf'), '--caption', '{sku}')):
+            with self.assertRaises(SystemExit) as raised:
+                self.run_cli(*argv)
+            self.assertEqual(raised.exception.code, 2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['in.csv',
+            'in.txt'])
+
+    def test_json_template_fields(self):
+        # JSON lines records may each have different fields, those without
+        # one the template uses fail on their own.
+        source = self.write_input('in.jsonl', '{"data": "a", "sku": "A"}\n'
+            '{"data": "b"}\n')
+        status, stderr = self.run_cli(source, '-o', self.path(
+            '{sku:>3}.svg'))
+        self.assertEqual(status, 1)
+        self.assertIn("record 1: no 'sku' field", stderr)
+        self.assertTrue(os.path.exists(self.path('  A.svg')))
+
+    def test_names_stay_in_directory(self):
+        source = self.write_input('in.txt', '../../evil\n/etc/evil\n..\n'
+            'a\\b\n')
+        status, stderr = self.run_cli(source, '-o', self.path('out',
+            '{data}.svg'))
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(os.listdir(self.path('out'))), ['__.svg',
+            '______evil.svg', '_etc_evil.svg', 'a_b.svg'])
+        self.assertEqual(sorted(os.listdir(self.directory)), ['in.txt',
+            'out'])
+
+    def test_archive(self):
+        source = self.write_input('in.txt', 'a\n../b\n')
+        status, stderr = self.run_cli(source, '-o', '{data}.{ext}', '-a',
+            self.path('codes.zip'))
+        self.assertEqual(status, 0)
+        with zipfile.ZipFile(self.path('codes.zip')) as archive:
+            self.assertEqual(sorted(archive.namelist()), ['___b.svg',
+                'a.svg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
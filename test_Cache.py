@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Cache.py, in memory and on disk.
+
+from Cache import Cache
+from Instrument import Aggregator
+from QR import encode
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestCache(unittest.TestCase):
+
+    def test_bytes_like_keys(self):
+        cache = Cache()
+        for value in (bytearray(b'abc'), memoryview(b'abc'), b'abc'):
+            cache.get_matrix('M', value)
+        self.assertEqual(cache.stats()['misses'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_matrix(self):
+        cache = Cache()
+        first = cache.get_matrix('q', 'HELLO', mask=3)
+        second = cache.get_matrix('Q', 'HELLO', mask=3)
+        self.assertEqual(first.to_packed(), second.to_packed())
+        self.assertEqual(first.to_packed(), encode('Q', 'HELLO',
+            mask=3).to_packed())
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_bytes(self):
+        cache = Cache()
+        content = cache.get_bytes('M', 'HELLO', 'pbm', {'module_size': 2})
+        self.assertEqual(content, encode('M', 'HELLO').to_bytes('pbm',
+            module_size=2))
+        stats = cache.stats()
+        self.assertEqual((stats['misses'], stats['entries']), (1, 1))
+        self.assertEqual(cache.get_bytes('M', 'HELLO', 'pbm',
+            {'module_size': 2}), content)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_unkeyed_options(self):
+        cache = Cache()
+        cache.get_matrix('M', 'HELLO')
+        cache.get_matrix('M', 'HELLO', observer=Aggregator(), backend=None)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_unhashable_options(self):
+        cache = Cache()
+        with self.assertRaises(ValueError):
+            cache.get_matrix('M', 'HELLO', version=object())
+        with self.assertRaises(ValueError):
+            cache.get_bytes('M', 'HELLO', 'svg', {'dark': object()})
+        cache.get_matrix('M', 'HELLO', structured_append=[1, 2, 0])
+        cache.get_matrix('M', 'HELLO', structured_append=(1, 2, 0))
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_eviction(self):
+        cache = Cache(max_bytes=1000)
+        for i in range(10):
+            cache.get_bytes('M', str(i), 'svg')
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 1000)
+        self.assertGreater(stats['evictions'], 0)
+
+    def test_directory(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        content = Cache(directory=directory).get_bytes('M', 'HELLO',
+            observer=Aggregator())
+        cache = Cache(directory=directory)
+        self.assertEqual(cache.get_bytes('M', 'HELLO'), content)
+        self.assertEqual(cache.stats()['disk_hits'], 1)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
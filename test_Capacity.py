@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks that the capacity planner agrees with the encoder.
+
+from QR import QR, DataTooLongError
+import Capacity
+import random
+import unittest
+
+LEVELS = ('L', 'M', 'Q', 'H')
+
+
+def random_text(generator, length):
+    alphabet = '0123456789ABCXYZ $%:abcxyzéü€漢字と'
+    return ''.join(generator.choice(alphabet) for i in range(length))
+
+
+class TestCapacity(unittest.TestCase):
+
+    def test_plan_matches_encoder(self):
+        generator = random.Random(5)
+        for i in range(50):
+            data = random_text(generator, generator.randint(1, 1500))
+            for error in LEVELS:
+                version, segments = QR.get_version(error, data)
+                if version == 0:
+                    self.assertFalse(Capacity.fits(data, error))
+                    continue
+                plan = Capacity.plan(data, error)
+                self.assertEqual(plan.version, version)
+                self.assertEqual(plan.required, QR.get_segments_bit_length(
+                    segments, dict((mode_char, QR.get_count_bits(version,
+                    mode_char)) for mode_char in QR.TABLE_3)))
+
+    def test_any_level(self):
+        plan = Capacity.plan('HELLO WORLD')
+        self.assertEqual((plan.version, plan.error_char), (1, 'Q'))
+        self.assertEqual(plan.size, 21)
+        self.assertGreaterEqual(plan.spare, 0)
+
+    def test_max_length(self):
+        for version in (1, 10, 27, 40):
+            for error in LEVELS:
+                for mode, character in (('numeric', '7'), ('alphanumeric',
+                        'Z'), ('byte', 'z')):
+                    length = Capacity.max_length(version, error, mode)
+                    self.assertLessEqual(QR.get_version(error, character *
+                        length, version)[0], version)
+                    self.assertNotEqual(QR.get_version(error, character *
+                        (length + 1), version)[0], version)
+                    self.assertLessEqual(Capacity.min_version(length, error,
+                        mode), version)
+        self.assertEqual(Capacity.max_length(10, 'M', 'alphanumeric'), 311)
+        self.assertEqual(Capacity.min_version(300, 'H', 'byte'), 18)
+
+    def test_errors(self):
+        with self.assertRaises(DataTooLongError) as context:
+            Capacity.plan('9' * 8000, 'L')
+        self.assertGreater(context.exception.required,
+            context.exception.capacity)
+        with self.assertRaises(DataTooLongError):
+            Capacity.min_version(100, 'M', 'kanji', maximum=3)
+        for call in (lambda: Capacity.plan('x', 'X'), lambda:
+                Capacity.max_length(41, 'M', 'byte'), lambda:
+                Capacity.max_length(1, 'M', 'octal')):
+            with self.assertRaises(ValueError):
+                call()
+
+
+if __name__ == '__main__':
+    unittest.main()
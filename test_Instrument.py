@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Instrument.py and of instrumenting encode and encode_many.
+
+from Instrument import Aggregator, Recorder, replay, STAGES
+from QR import QR, encode, encode_many
+import pickle
+import unittest
+
+
+class TestAggregator(unittest.TestCase):
+
+    def test_encode(self):
+        metrics = Aggregator()
+        encode('M', 'HELLO WORLD', observer=metrics).to_svg()
+        snapshot = metrics.snapshot()
+        self.assertEqual(set(snapshot['stages']), set(STAGES))
+        for summary in snapshot['stages'].values():
+            self.assertEqual(summary['count'], 1)
+        self.assertEqual(snapshot['histograms']['error'], {'M': 1})
+        self.assertIn('best_score', snapshot['counters'])
+        self.assertIn('output_bytes', snapshot['counters'])
+
+    def test_percentiles(self):
+        metrics = Aggregator(window=100)
+        for value in range(1, 101):
+            metrics.count('segments', value)
+        self.assertEqual(metrics.snapshot()['counters']['segments'],
+            {'p50': 50, 'p90': 90, 'p99': 99, 'max': 100})
+
+
+class TestRecorder(unittest.TestCase):
+
+    def test_replay(self):
+        recorder = Recorder()
+        encode('L', 'HELLO', observer=recorder)
+        events = pickle.loads(pickle.dumps(recorder.events))
+        metrics = Aggregator()
+        replay(events, metrics)
+        self.assertEqual(metrics.snapshot()['stages']['encode']['count'], 1)
+
+
+class TestEncodeMany(unittest.TestCase):
+
+    ITEMS = ['item %d' % i for i in range(10)]
+
+    def check(self, metrics, results):
+        for result in results:
+            self.assertIsNone(result.error)
+            result.matrix.to_svg()
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['stages']['encode']['count'],
+            len(self.ITEMS))
+        self.assertEqual(snapshot['stages']['render']['count'],
+            len(self.ITEMS))
+        self.assertEqual(sum(snapshot['histograms']['error'].values()),
+            len(self.ITEMS))
+
+    def test_observer(self):
+        metrics = Aggregator()
+        self.check(metrics, list(encode_many(self.ITEMS, 'M', workers=2,
+            chunksize=3, observer=metrics)))
+
+    def test_class_observer(self):
+        metrics = QR.OBSERVER = Aggregator()
+        try:
+            results = list(encode_many(self.ITEMS, 'M', workers=2,
+                chunksize=3))
+        finally:
+            QR.OBSERVER = None
+        self.check(metrics, results)
+
+    def test_no_observer(self):
+        results = list(encode_many(self.ITEMS, 'M', workers=2, chunksize=3))
+        self.assertEqual([result.index for result in results],
+            list(range(len(self.ITEMS))))
+        self.assertIsNone(results[0].matrix.observer)
+
+
+if __name__ == '__main__':
+    unittest.main()
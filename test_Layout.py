@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of the module placement of every version against table 1 and annex
+# D of the ISO specification.
+
+from QR import QR
+from Layout import get_layout, version_information, MASK_PATTERNS
+import unittest
+
+# Remainder bits after the last codeword, table 1 of the specification.
+REMAINDER_BITS = dict([(1, 0)] + [(version, 7) for version in range(2, 7)] +
+    [(version, 0) for version in range(7, 14)] + [(version, 3) for version in
+    range(14, 21)] + [(version, 4) for version in range(21, 28)] + [(version,
+    3) for version in range(28, 35)] + [(version, 0) for version in range(35,
+    41)])
+
+
+def get_total_codewords(version, error_char):
+    ec, blocks_1, data_1, blocks_2, data_2 = QR.TABLE_9[version][error_char]
+    return blocks_1 * (data_1 + ec) + blocks_2 * (data_2 + ec)
+
+
+class TestLayout(unittest.TestCase):
+
+    def test_bit_positions(self):
+        for version in range(1, 41):
+            layout = get_layout(version)
+            totals = set(get_total_codewords(version, error_char) for
+                error_char in 'LMQH')
+            self.assertEqual(len(totals), 1)
+            positions = layout.bit_positions
+            self.assertEqual(len(positions), totals.pop() * 8 +
+                REMAINDER_BITS[version])
+            self.assertEqual(len(set(positions)), len(positions))
+            for x, y in positions:
+                self.assertFalse(layout.reserved[x][y])
+        self.assertEqual(get_total_codewords(40, 'M'), 3706)
+
+    def test_version_information(self):
+        self.assertEqual(version_information(7), 0x07C94)
+        self.assertEqual(version_information(40), 0x28C69)
+
+    def test_templates(self):
+        for version in (1, 7, 40):
+            layout = get_layout(version)
+            self.assertIs(get_layout(version), layout)
+            size = layout.size
+            patterns = layout.function_patterns
+            self.assertEqual(len(patterns), size)
+            for x in range(size):
+                for y in range(size):
+                    if patterns[x][y]:
+                        self.assertTrue(layout.reserved[x][y])
+            self.assertEqual(patterns[8][size - 8], 1)
+            matrix = QR('M', 'HELLO', version=version).matrix
+            for x in range(8):
+                for y in range(8):
+                    self.assertEqual(matrix[x][y], patterns[x][y])
+            for n in range(8):
+                mask = layout.get_mask(n)
+                self.assertIs(layout.get_mask(n), mask)
+                for x in range(size):
+                    for y in range(size):
+                        expected = 0 if layout.reserved[x][y] else int(
+                            MASK_PATTERNS[n](y, x))
+                        self.assertEqual(mask[x][y], expected)
+
+    def test_bad_version(self):
+        for version in (0, 41):
+            with self.assertRaises(ValueError):
+                get_layout(version)
+
+
+if __name__ == '__main__':
+    unittest.main()
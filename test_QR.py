@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of the encoder against its own decoder.  Run with python -m
+# unittest or pytest.
+
+from QR import QR, QRMatrix, encode, encode_many, DataTooLongError
+from Layout import get_layout
+from Decoder import decode, decode_bytes, read_symbol, verify, \
+    VerificationError
+import os
+import pickle
+import random
+import unittest
+from unittest import mock
+
+try:
+    import numpy
+    import MaskNumPy
+except ImportError:
+    numpy = None
+
+PAYLOADS = ['0', '01234567890123456789', 'HELLO WORLD', 'Hello, World!',
+    'https://x.io/ABC123', 'Grüße', '漢字と仮名', 'Grüße, 世界 €5', '',
+    'MIXED 12345 lower 漢字 ÀÉ']
+LEVELS = ('L', 'M', 'Q', 'H')
+
+
+def random_text(generator, length):
+    alphabet = '0123456789ABCXYZ $%:abcxyzéü€漢字と'
+    return ''.join(generator.choice(alphabet) for i in range(length))
+
+
+class TestRoundTrip(unittest.TestCase):
+
+    def test_text(self):
+        for data in PAYLOADS:
+            for error in LEVELS:
+                matrix = encode(error, data)
+                self.assertEqual(decode(matrix), data)
+                verify(matrix, data)
+
+    def test_versions(self):
+        generator = random.Random(1)
+        for version in (1, 9, 10, 26, 27, 40):
+            data = random_text(generator, 6)
+            matrix = encode('M', data, version=version)
+            self.assertEqual(matrix.version, version)
+            self.assertEqual(decode(matrix), data)
+
+    def test_no_side_effects(self):
+        before = set(os.listdir('.'))
+        matrix = encode('M', 'HELLO')
+        self.assertEqual(set(os.listdir('.')), before)
+        self.assertEqual(len(matrix), 21)
+        self.assertTrue(matrix.to_svg().startswith(b'<'))
+
+    def test_too_long(self):
+        with self.assertRaises(DataTooLongError):
+            encode('H', '漢' * 2000)
+
+
+class TestMatrix(unittest.TestCase):
+
+    def test_layout(self):
+        matrix = encode('M', 'HELLO WORLD')
+        columns = matrix.modules
+        self.assertEqual(len(columns), len(matrix))
+        for x in range(len(matrix)):
+            self.assertEqual(list(matrix[x]), columns[x])
+            self.assertEqual(list(matrix.row(x)), [column[x] for column in
+                columns])
+        self.assertEqual(QRMatrix(columns, matrix.version, matrix.error_char,
+            matrix.mask), matrix)
+        self.assertEqual(bytes(matrix.buffer), bytes(matrix.data))
+        with self.assertRaises(IndexError):
+            matrix[len(matrix)]
+        with self.assertRaises(ValueError):
+            QRMatrix(columns[1:], matrix.version, 'M', 0)
+
+    def test_serialisation(self):
+        for data in ('HELLO', 'x' * 100):
+            matrix = encode('Q', data)
+            self.assertEqual(QRMatrix.from_packed(matrix.to_packed()), matrix)
+            self.assertEqual(pickle.loads(pickle.dumps(matrix)), matrix)
+
+    def test_copy_and_xor(self):
+        matrix = encode('M', 'HELLO')
+        copy = matrix.copy()
+        self.assertEqual(copy, matrix)
+        copy.xor(matrix)
+        self.assertEqual(set(copy.data), {0})
+        self.assertNotEqual(copy, matrix)
+        copy.xor(matrix.modules)
+        self.assertEqual(copy, matrix)
+        with self.assertRaises(ValueError):
+            copy.xor(bytes(3))
+
+
+class TestEncodeMany(unittest.TestCase):
+
+    def test_order(self):
+        data = ['item %d' % i for i in range(23)]
+        for workers in (1, 2):
+            results = list(encode_many(iter(data), 'Q', workers=workers,
+                chunksize=4, mask=2))
+            self.assertEqual([result.index for result in results],
+                list(range(len(data))))
+            for result, item in zip(results, data):
+                self.assertIsNone(result.error)
+                self.assertEqual(result.data, item)
+                self.assertEqual(result.matrix, encode('Q', item, mask=2))
+
+    def test_failure(self):
+        data = ['first', '9' * 8000, 'last']
+        for workers in (1, 2):
+            results = list(encode_many(data, workers=workers, chunksize=2))
+            self.assertEqual([result.data for result in results], data)
+            self.assertIsInstance(results[1].error, DataTooLongError)
+            self.assertIsNone(results[1].matrix)
+            self.assertEqual(decode(results[2].matrix), 'last')
+
+    def test_empty(self):
+        self.assertEqual(list(encode_many([], workers=2)), [])
+
+    def test_verify(self):
+        data = ['HELLO', 'Grüße', b'\xff\x00']
+        for workers in (1, 2):
+            for result in encode_many(data, workers=workers, verify=True):
+                self.assertIsNone(result.error)
+        wrong = encode('M', 'WRONG')
+        with mock.patch('QR.encode', lambda *args, **options: wrong):
+            results = list(encode_many(data, workers=1, verify=True))
+        for result in results:
+            self.assertIsInstance(result.error, VerificationError)
+
+
+class TestVerify(unittest.TestCase):
+
+    def test_damaged(self):
+        matrix = encode('M', 'HELLO WORLD')
+        verify(matrix, 'HELLO WORLD')
+        with self.assertRaises(VerificationError):
+            verify(matrix, 'HELLO')
+        column = matrix[len(matrix) - 1]
+        column[len(matrix) - 1] ^= 1
+        with self.assertRaises(VerificationError):
+            verify(matrix, 'HELLO WORLD')
+
+
+class TestMasks(unittest.TestCase):
+
+    def get_backends(self):
+        return ('python', 'bitboard') + (('numpy',) if numpy else ())
+
+    def test_backends_agree(self):
+        for data in PAYLOADS[:6]:
+            results = [QR('Q', data, backend=backend) for backend in
+                self.get_backends()]
+            for qr in results[1:]:
+                self.assertEqual(qr.scores, results[0].scores)
+                self.assertEqual(qr.mask, results[0].mask)
+                self.assertEqual(qr.matrix, results[0].matrix)
+
+    def test_fixed_mask(self):
+        for backend in self.get_backends():
+            for mask in range(8):
+                matrix = encode('M', 'HELLO WORLD', backend=backend,
+                    mask=mask)
+                self.assertEqual(matrix.mask, mask)
+                self.assertEqual(decode(matrix), 'HELLO WORLD')
+
+    def test_pruned_matches_full(self):
+        generator = random.Random(2)
+        for i in range(20):
+            data = random_text(generator, generator.randint(1, 120))
+            for backend in self.get_backends():
+                full = encode('M', data, backend=backend)
+                pruned = encode('M', data, backend=backend, strategy='pruned')
+                self.assertEqual(pruned.mask, full.mask)
+                self.assertEqual(pruned, full)
+
+    def test_sampled_reads_back(self):
+        data = 'https://x.io/ABC123'
+        self.assertEqual(decode(encode('M', data, backend='bitboard',
+            strategy='sampled')), data)
+        with self.assertRaises(ValueError):
+            encode('M', data, strategy='fastest')
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestMaskNumPy(unittest.TestCase):
+
+    def test_rules_match(self):
+        for data in PAYLOADS[:6]:
+            matrix = encode('L', data)
+            candidates = numpy.frombuffer(matrix.buffer, numpy.uint8).reshape(
+                len(matrix), len(matrix))[None] ^ MaskNumPy.get_masks(
+                matrix.version)
+            expected = [QR.test_one(a) + QR.test_two(a) + QR.test_three(a) +
+                QR.test_four(a) for a in candidates.tolist()]
+            self.assertEqual(MaskNumPy.score(candidates), expected)
+
+    def test_masks_match_layout(self):
+        for version in (1, 7, 40):
+            masks = MaskNumPy.get_masks(version).tolist()
+            for n in range(8):
+                self.assertEqual(masks[n], [list(column) for column in
+                    get_layout(version).get_mask(n)])
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestErrorCodewordsMany(unittest.TestCase):
+
+    def test_matches_single(self):
+        generator = random.Random(6)
+        for version, error in ((1, 'M'), (5, 'Q'), (40, 'H')):
+            length = QR.get_data_codeword_count(version, error)
+            data = numpy.array([[generator.randrange(256) for i in
+                range(length)] for j in range(5)], dtype=numpy.uint8)
+            many = QR.add_error_codewords_many(version, error, data)
+            for row, result in zip(data, many):
+                self.assertEqual(bytes(result), bytes(QR.add_error_codewords(
+                    version, error, bytes(row))))
+
+    def test_empty_and_bad_rows(self):
+        length = QR.get_data_codeword_count(5, 'Q')
+        self.assertEqual(QR.add_error_codewords_many(5, 'Q', numpy.zeros((0,
+            length), dtype=numpy.uint8)).shape, (0, 134))
+        with self.assertRaises(ValueError):
+            QR.add_error_codewords_many(5, 'Q', numpy.zeros((2, length - 1),
+                dtype=numpy.uint8))
+
+
+class TestBytes(unittest.TestCase):
+
+    def test_bytes(self):
+        data = bytes(range(256))
+        for value in (data, bytearray(data), memoryview(data)):
+            matrix = encode('L', value)
+            self.assertEqual(decode_bytes(matrix), data)
+            verify(matrix, value)
+
+    def test_eci(self):
+        matrix = encode('M', 'Grüße, 世界', eci=True)
+        self.assertEqual(read_symbol(matrix)[0], ('E', QR.ECI_UTF8))
+        self.assertEqual(decode(matrix), 'Grüße, 世界')
+        for designator in (0, 127, 128, 16383, 16384, 999999):
+            matrix = encode('M', b'xyz', eci=designator)
+            self.assertEqual(read_symbol(matrix)[0], ('E', designator))
+        self.assertEqual(decode(encode('M', 'Grüße', eci=3)), 'Grüße')
+
+    def test_eci_errors(self):
+        for designator in (-1, 1000000):
+            with self.assertRaisesRegex(ValueError, '0 to 999999'):
+                encode('M', b'xyz', eci=designator)
+        with self.assertRaises(ValueError):
+            encode('M', 'text', eci=899)
+        with self.assertRaisesRegex(ValueError, 'designator 3 '):
+            encode('M', '漢字', eci=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
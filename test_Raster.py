@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Raster.py by reading each format back into pixels.
+
+from QR import encode
+from Raster import Raster
+import struct
+import unittest
+import zlib
+
+
+def get_expected(matrix, module_size, quiet_zone):
+    # Rows of pixels, 1 for dark, of matrix scaled and bordered.
+    size = len(matrix)
+    side = (size + 2 * quiet_zone) * module_size
+    pixels = [[0] * side for y in range(side)]
+    for x in range(size):
+        for y in range(size):
+            if matrix[x][y]:
+                for i in range(module_size):
+                    for j in range(module_size):
+                        pixels[(y + quiet_zone) * module_size + j][(x +
+                            quiet_zone) * module_size + i] = 1
+    return pixels
+
+
+def unpack(data, width, height, dark_bit):
+    # Rows of pixels from rows of bits padded to whole bytes.
+    length = (width + 7) // 8
+    pixels = []
+    for y in range(height):
+        row = data[y * length:(y + 1) * length]
+        pixels.append([int((row[x // 8] >> (7 - x % 8)) & 1 == dark_bit) for
+            x in range(width)])
+    return pixels
+
+
+def read_pbm(content):
+    magic, size, data = content.split(b'\n', 2)
+    width, height = [int(value) for value in size.split()]
+    return magic, unpack(data, width, height, 1)
+
+
+def read_pgm(content):
+    magic, size, depth, data = content.split(b'\n', 3)
+    width, height = [int(value) for value in size.split()]
+    return magic, depth, [[int(data[y * width + x] == 0) for x in
+        range(width)] for y in range(height)]
+
+
+def read_png(content):
+    # Pixels of a 1-bit greyscale PNG with unfiltered rows, checking every
+    # chunk's CRC.
+    if content[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('Not a PNG')
+    position = 8
+    chunks = []
+    while position < len(content):
+        length, = struct.unpack('>I', content[position:position + 4])
+        kind = content[position + 4:position + 8]
+        data = content[position + 8:position + 8 + length]
+        crc, = struct.unpack('>I', content[position + 8 + length:position +
+            12 + length])
+        if zlib.crc32(kind + data) & 0xFFFFFFFF != crc:
+            raise ValueError('Bad CRC')
+        chunks.append((kind, data))
+        position += 12 + length
+    kinds = [kind for kind, data in chunks]
+    if kinds[0] != b'IHDR' or kinds[-1] != b'IEND':
+        raise ValueError('Bad chunk order')
+    width, height, depth, colour, compression, filter, interlace = \
+        struct.unpack('>IIBBBBB', chunks[0][1])
+    if (depth, colour, interlace) != (1, 0, 0):
+        raise ValueError('Not 1-bit greyscale')
+    raw = zlib.decompress(b''.join(data for kind, data in chunks if kind ==
+        b'IDAT'))
+    length = (width + 7) // 8 + 1
+    if any(raw[y * length] for y in range(height)):
+        raise ValueError('Filtered row')
+    data = b''.join(raw[y * length + 1:(y + 1) * length] for y in
+        range(height))
+    return unpack(data, width, height, 0)
+
+
+class TestRaster(unittest.TestCase):
+
+    def test_formats(self):
+        for data, module_size, quiet_zone in (('HELLO', 1, 4), ('HELLO',
+                3, 0), ('https://x.io/ABC123', 2, 1)):
+            matrix = encode('M', data)
+            expected = get_expected(matrix, module_size, quiet_zone)
+            options = {'module_size': module_size, 'quiet_zone': quiet_zone}
+            self.assertEqual(read_png(matrix.to_png(**options)), expected)
+            magic, pixels = read_pbm(matrix.to_bytes('pbm', **options))
+            self.assertEqual((magic, pixels), (b'P4', expected))
+            magic, depth, pixels = read_pgm(matrix.to_bytes('pgm', **options))
+            self.assertEqual((magic, depth, pixels), (b'P5', b'255',
+                expected))
+
+    def test_size(self):
+        matrix = encode('M', 'HELLO')
+        self.assertEqual(Raster(5, 2).get_size(matrix), (125, 125))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Raster().to_bytes(encode('M', 'HELLO'), 'gif')
+
+
+if __name__ == '__main__':
+    unittest.main()
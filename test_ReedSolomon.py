@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of the table-driven Reed-Solomon encoder against the worked example
+# of the ISO specification and plain polynomial division.
+
+import ReedSolomon
+import random
+import unittest
+
+
+def evaluate(polynomial, x):
+    # polynomial, highest power first, at x by Horner's rule.
+    value = 0
+    for coefficient in polynomial:
+        value = ReedSolomon.multiply(value, x) ^ coefficient
+    return value
+
+
+def divide(message, degree):
+    # The remainder of message(x) * x^degree divided by the generator, one
+    # term at a time.
+    generator = ReedSolomon.generator_polynomial(degree)
+    register = list(message) + [0] * degree
+    for i in range(len(message)):
+        lead = register[i]
+        if lead:
+            for j, coefficient in enumerate(generator):
+                register[i + j] ^= ReedSolomon.multiply(lead, coefficient)
+    return bytes(register[len(message):])
+
+
+class TestReedSolomon(unittest.TestCase):
+
+    def test_example(self):
+        # '01234567' as a version 1-M symbol, annex I of the specification.
+        data = bytes.fromhex('10200c566180ec11ec11ec11ec11ec11')
+        self.assertEqual(ReedSolomon.remainder(data, 10),
+            bytes.fromhex('a524d4c1ed36c7872c55'))
+
+    def test_generator_roots(self):
+        for degree in (7, 10, 30):
+            generator = ReedSolomon.generator_polynomial(degree)
+            self.assertEqual(len(generator), degree + 1)
+            for i in range(degree):
+                self.assertEqual(evaluate(generator, ReedSolomon.EXP[i]), 0)
+
+    def test_matches_division(self):
+        generator = random.Random(8)
+        for degree in (7, 18, 30):
+            for length in (0, 1, 19, 118):
+                message = [generator.randrange(256) for i in range(length)]
+                self.assertEqual(ReedSolomon.remainder(message, degree),
+                    divide(message, degree))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks that the SVG path draws exactly the dark modules of a symbol.
+
+from QR import encode
+from SVG import SVG
+import io
+import re
+import unittest
+
+
+def read_path(content, size, quiet_zone):
+    # The dark modules drawn by the path of content, as a set of (x, y)
+    # without the quiet zone, walking its moves and horizontal lines.
+    path = re.search(r' d="([^"]*)"', content).group(1)
+    dark = set()
+    x = y = 0.0
+    for command, arguments in re.findall(r'([MmHh])([^MmHh]*)', path):
+        values = [float(value) for value in arguments.split()]
+        if command == 'M':
+            x, y = values
+        elif command == 'm':
+            x, y = x + values[0], y + values[1]
+        else:
+            for i in range(int(values[0])):
+                dark.add((int(x) + i - quiet_zone, int(y) - quiet_zone))
+            x += values[0]
+    return dark
+
+
+class TestSVG(unittest.TestCase):
+
+    def test_modules(self):
+        for data, quiet_zone in (('HELLO WORLD', 4), ('https://x.io/ABC', 0),
+                ('漢字' * 40, 2)):
+            matrix = encode('Q', data)
+            content = matrix.to_svg(quiet_zone=quiet_zone).decode('utf-8')
+            size = len(matrix)
+            expected = set((x, y) for x in range(size) for y in range(size)
+                if matrix[x][y])
+            self.assertEqual(read_path(content, size, quiet_zone), expected)
+            side = size + 2 * quiet_zone
+            self.assertIn('viewBox="0 0 %d %d"' % (side, side), content)
+
+    def test_options(self):
+        matrix = encode('M', 'HELLO')
+        content = matrix.to_svg(module_size=3, dark='red',
+            light='white').decode('utf-8')
+        self.assertIn('width="87" height="87"', content)
+        self.assertIn('<rect width="29" height="29" fill="white"/>', content)
+        self.assertIn('stroke="red"', content)
+        self.assertNotIn('<rect', matrix.to_svg().decode('utf-8'))
+
+    def test_streams(self):
+        matrix = encode('M', 'HELLO')
+        text = io.StringIO()
+        SVG().write(matrix, text)
+        self.assertEqual(text.getvalue().encode('utf-8'), matrix.to_svg())
+        columns = [list(matrix[x]) for x in range(len(matrix))]
+        self.assertEqual(SVG().to_bytes(columns), matrix.to_svg())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Segment.py against an exhaustive search of every split.
+
+from QR import QR
+from Segment import Segment, segment, get_encoding, NUMERIC, ALPHANUMERIC, \
+    is_kanji
+import itertools
+import random
+import unittest
+
+
+def get_count_bits(version):
+    return dict((mode_char, QR.get_count_bits(version, mode_char)) for
+        mode_char in QR.TABLE_3)
+
+
+def get_cheapest(text, count_bits, encoding):
+    # The fewest bits of any assignment of a mode to each character.
+    choices = []
+    for character in text:
+        modes = ['B']
+        if character in NUMERIC:
+            modes.append('N')
+        if character in ALPHANUMERIC:
+            modes.append('A')
+        if is_kanji(character):
+            modes.append('K')
+        choices.append(modes)
+    best = None
+    for modes in itertools.product(*choices):
+        segments = []
+        start = 0
+        for mode_char, group in itertools.groupby(modes):
+            end = start + len(list(group))
+            data = text[start:end]
+            if mode_char == 'B':
+                data = data.encode(encoding)
+            elif mode_char == 'K':
+                data = data.encode('shift_jis')
+            segments.append(Segment(mode_char, data))
+            start = end
+        length = QR.get_segments_bit_length(segments, count_bits)
+        if best is None or length < best:
+            best = length
+    return best
+
+
+class TestSegment(unittest.TestCase):
+
+    def check(self, text, version):
+        count_bits = get_count_bits(version)
+        encoding = get_encoding(text)
+        segments = segment(text, count_bits)
+        self.assertEqual(QR.get_segments_bit_length(segments, count_bits),
+            get_cheapest(text, count_bits, encoding))
+        joined = ''
+        for item in segments:
+            if item.mode_char == 'B':
+                joined += item.data.decode(encoding)
+            elif item.mode_char == 'K':
+                joined += item.data.decode('shift_jis')
+            else:
+                joined += item.data
+        self.assertEqual(joined, text)
+
+    def test_optimal(self):
+        generator = random.Random(7)
+        alphabet = '0123ABZ a:é漢'
+        for i in range(150):
+            text = ''.join(generator.choice(alphabet) for j in range(
+                generator.randint(1, 9)))
+            for version in (1, 10, 27):
+                self.check(text, version)
+
+    def test_single_mode(self):
+        self.assertEqual([(item.mode_char, item.data) for item in segment(
+            '0123', get_count_bits(1))], [('N', '0123')])
+        self.assertEqual([(item.mode_char, len(item)) for item in segment(
+            '漢字', get_count_bits(1))], [('K', 2)])
+        self.assertEqual(segment('', get_count_bits(1)), [])
+
+    def test_bytes(self):
+        for value in (b'123', bytearray(b'123'), memoryview(b'123')):
+            segments = segment(value, get_count_bits(1))
+            self.assertEqual([(item.mode_char, item.data) for item in
+                segments], [('B', b'123')])
+        self.assertEqual(segment(b'', get_count_bits(1)), [])
+
+    def test_encoding(self):
+        self.assertEqual(get_encoding('Grüße'), 'iso-8859-1')
+        self.assertEqual(get_encoding('€'), 'utf-8')
+        segments = segment('ab€', get_count_bits(1), 'utf-8')
+        self.assertEqual(segments[-1].data, 'ab€'.encode('utf-8'))
+
+
+if __name__ == '__main__':
+    unittest.main()
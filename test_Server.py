@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Server.py over real connections to a server on a free port.
+
+from Server import Server, serve
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import asyncio
+import http.client
+import socket
+import threading
+import unittest
+
+
+class ServerTestCase(unittest.TestCase):
+
+    # One server, with two workers, for every test of the class.
+
+    @classmethod
+    def setUpClass(cls):
+        started = threading.Event()
+        cls.loop = asyncio.new_event_loop()
+        def ready(listener):
+            cls.port = listener.sockets[0].getsockname()[1]
+            started.set()
+        def run():
+            asyncio.set_event_loop(cls.loop)
+            cls.task = cls.loop.create_task(serve(port=0, workers=2,
+                ready=ready))
+            try:
+                cls.loop.run_until_complete(cls.task)
+            except asyncio.CancelledError:
+                pass
+        cls.thread = threading.Thread(target=run)
+        cls.thread.start()
+        if not started.wait(60):
+            raise RuntimeError('Server did not start.')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.call_soon_threadsafe(cls.task.cancel)
+        cls.thread.join(60)
+        cls.loop.close()
+
+    def get(self, target, headers=None):
+        connection = http.client.HTTPConnection('127.0.0.1', self.port,
+            timeout=30)
+        try:
+            connection.request('GET', target, headers=headers or {})
+            response = connection.getresponse()
+            return response, response.read()
+        finally:
+            connection.close()
+
+
+class TestServer(ServerTestCase):
+
+    def test_png(self):
+        response, body = self.get('/qr?data=HELLO&format=png')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Type'), 'image/png')
+        self.assertTrue(body.startswith(b'\x89PNG'))
+
+    def test_close_ends_connection(self):
+        # The server closes the connection after a Connection: close
+        # response, no worker process holds the socket open.
+        for i in range(3):
+            client = socket.create_connection(('127.0.0.1', self.port),
+                timeout=30)
+            try:
+                client.sendall(b'GET /qr?data=%d HTTP/1.1\r\nHost: x\r\n'
+                    b'Connection: close\r\n\r\n' % i)
+                received = b''
+                while True:
+                    chunk = client.recv(65536)
+                    if not chunk:
+                        break
+                    received += chunk
+            finally:
+                client.close()
+            self.assertTrue(received.startswith(b'HTTP/1.1 200 OK'))
+
+    def test_too_large(self):
+        response, body = self.get('/qr?data=' + '9' * 7089 + '&level=L'
+            '&format=pgm&module_size=100')
+        self.assertEqual(response.status, 413)
+        self.assertIn(b'pixels', body)
+        response, body = self.get('/qr?data=' + '9' * 7090 + '&level=L')
+        self.assertEqual(response.status, 413)
+        # Vector output has no pixels to limit.
+        response, body = self.get('/qr?data=HELLO&module_size=100')
+        self.assertEqual(response.status, 200)
+
+    def test_etag(self):
+        response, body = self.get('/qr?data=HELLO')
+        self.assertEqual(response.status, 200)
+        etag = response.getheader('ETag')
+        response, body = self.get('/qr?data=HELLO', {'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(body, b'')
+
+    def test_errors(self):
+        for target, status in (('/qr', 400), ('/qr?data=x&level=Z', 400),
+                ('/qr?data=x&format=gif', 400), ('/qr?data=x&dark=%22',
+                400), ('/qr?data=x&module_size=0', 400), ('/other', 404)):
+            response, body = self.get(target)
+            self.assertEqual(response.status, status, target)
+        connection = http.client.HTTPConnection('127.0.0.1', self.port,
+            timeout=30)
+        connection.request('POST', '/qr?data=x')
+        response = connection.getresponse()
+        self.assertEqual(response.status, 405)
+        connection.close()
+
+
+class TestRespond(unittest.TestCase):
+
+    def test_worker_failure(self):
+        # Any exception from a worker is answered 500.
+        def fail(*arguments):
+            raise ValueError('boom')
+        server = Server(workers=1)
+        server.executor = ThreadPoolExecutor(1)
+        try:
+            with mock.patch('Server.render', fail):
+                status, headers, body = asyncio.run(server.respond('GET',
+                    '/qr?data=x', {}))
+        finally:
+            server.close()
+        self.assertEqual(status, 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
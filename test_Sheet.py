@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of the SVG and PDF label sheets made by Sheet.py.
+
+from QR import encode
+from Sheet import Sheet, get_runs, get_rgb
+import io
+import re
+import unittest
+import zlib
+
+
+def get_items(count):
+    return [(encode('M', 'LABEL %d' % i), 'Label <%d>' % i) for i in
+        range(count)]
+
+
+class TestSheet(unittest.TestCase):
+
+    def test_runs(self):
+        matrix = encode('Q', 'https://x.io/ABC123')
+        size = len(matrix)
+        drawn = set()
+        for x, y, length in get_runs(matrix):
+            drawn.update((x + i, y) for i in range(length))
+        finder = set((x, y) for x in range(7) for y in range(7) if max(abs(
+            x - 3), abs(y - 3)) != 2)
+        for left, top in ((0, 0), (size - 7, 0), (0, size - 7)):
+            drawn.update((left + x, top + y) for x, y in finder)
+        self.assertEqual(drawn, set((x, y) for x in range(size) for y in
+            range(size) if matrix[x][y]))
+
+    def test_svg_pages(self):
+        pages = list(Sheet(columns=3, rows=2).svg_pages(get_items(8)))
+        self.assertEqual(len(pages), 2)
+        for page, count in zip(pages, (6, 2)):
+            content = page.decode('utf-8')
+            self.assertEqual(content.count('<use '), 3 * count)
+            self.assertEqual(content.count('<text '), count)
+        self.assertIn('Label &lt;0&gt;', pages[0].decode('utf-8'))
+
+    def test_pages_are_lazy(self):
+        read = []
+        def items():
+            for i, item in enumerate(get_items(10)):
+                read.append(i)
+                yield item[0]
+        pages = Sheet(columns=2, rows=2).svg_pages(items())
+        next(pages)
+        self.assertEqual(len(read), 4)
+        self.assertEqual(len(list(pages)), 2)
+
+    def test_pdf(self):
+        stream = io.BytesIO()
+        count = Sheet(columns=2, rows=2, light='#fff').write_pdf(get_items(
+            5), stream)
+        self.assertEqual(count, 2)
+        content = stream.getvalue()
+        self.assertTrue(content.startswith(b'%PDF-1.4'))
+        start = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', content).group(
+            1))
+        self.assertTrue(content[start:].startswith(b'xref\n'))
+        offsets = [int(offset) for offset in re.findall(rb'(\d{10}) 00000 n ',
+            content[start:])]
+        for number, offset in enumerate(offsets, 1):
+            self.assertTrue(content[offset:].startswith(b'%d 0 obj\n' %
+                number))
+        self.assertIn(b'/Count 2 >>', content)
+        streams = [zlib.decompress(data) for data in re.findall(
+            rb'/FlateDecode /Length \d+ >>\nstream\n(.*?)\nendstream', content,
+            re.S)]
+        self.assertEqual(len(streams), 2)
+        self.assertEqual(streams[0].count(b'/F Do'), 12)
+        self.assertIn(b'(Label <0>) Tj', streams[0])
+
+    def test_colours(self):
+        self.assertEqual(get_rgb('#fff'), '1 1 1')
+        self.assertEqual(get_rgb('#000000'), '0 0 0')
+        with self.assertRaises(ValueError):
+            get_rgb('black')
+        with self.assertRaises(ValueError):
+            Sheet(columns=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
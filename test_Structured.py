@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks of Structured.py against the decoder.
+
+from QR import QR, DataTooLongError
+from Decoder import decode_structured, read_symbol, segment_bytes
+from Structured import encode_structured
+import random
+import unittest
+
+
+def random_text(generator, length):
+    alphabet = '0123456789ABCXYZ $%:abcxyzéü€漢字と'
+    return ''.join(generator.choice(alphabet) for i in range(length))
+
+
+class TestStructured(unittest.TestCase):
+
+    def check(self, group, data):
+        # Every symbol shares the parity of the bytes the symbols hold.
+        segments = [item for matrix in group for item in read_symbol(
+            matrix)[1:]]
+        parity = 0
+        for byte in segment_bytes(segments):
+            parity ^= byte
+        self.assertEqual(group.parity, parity)
+        self.assertEqual(decode_structured(reversed(list(group))), data)
+
+    def test_round_trip(self):
+        generator = random.Random(4)
+        for i in range(5):
+            data = random_text(generator, generator.randint(100, 400))
+            self.check(encode_structured('M', data, version=5, workers=1),
+                data)
+
+    def test_workers(self):
+        data = 'HELLO WORLD ' * 40
+        group = encode_structured('Q', data, version=3, workers=2)
+        self.assertEqual(list(group), list(encode_structured('Q', data,
+            version=3, workers=1)))
+        self.check(group, data)
+
+    def test_smallest_version(self):
+        data = '0123456789' * 100
+        group = encode_structured('M', data, max_symbols=4, workers=1)
+        self.assertLessEqual(len(group), 4)
+        self.check(group, data)
+
+    def test_one_character_set(self):
+        data = 'é' * 61 + '€' * 3
+        group = encode_structured('M', data, version=2, workers=1)
+        stored = b''.join(value for matrix in group for mode_char, value in
+            read_symbol(matrix) if mode_char == 'B')
+        self.assertEqual(stored.decode('utf-8'), data)
+        self.check(group, data)
+
+    def test_kanji_parity(self):
+        group = encode_structured('M', '漢字と', workers=1)
+        self.assertEqual(group.parity, 101)
+        self.check(group, '漢字と')
+
+    def test_eci(self):
+        data = 'é' * 300 + '€'
+        group = encode_structured('M', data, version=5, workers=1, eci=True)
+        self.assertEqual(read_symbol(group[0])[1], ('E', QR.ECI_UTF8))
+        self.check(group, data)
+
+    def test_bytes(self):
+        data = bytes(range(256)) * 3
+        group = encode_structured('M', memoryview(data), version=5,
+            workers=1)
+        self.assertEqual(segment_bytes([item for matrix in group for item in
+            read_symbol(matrix)]), data)
+
+    def test_too_long(self):
+        with self.assertRaises(DataTooLongError):
+            encode_structured('H', '9' * 2000, version=1, workers=1)
+        with self.assertRaises(ValueError):
+            encode_structured('M', 'HELLO', max_symbols=17)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Checks that Template makes symbols which read back as prefix and suffix.
+
+from QR import DataTooLongError
+from Decoder import decode
+from Template import Template
+import random
+import unittest
+
+
+class TestTemplate(unittest.TestCase):
+
+    def test_round_trip(self):
+        generator = random.Random(3)
+        for prefix, length, characters in (('HTTPS://T.CO/X/', 8,
+                '0123456789'), ('https://x.io/', 6, 'ABC123'), ('id=', 5,
+                'abcé-')):
+            for mask in (None, 3):
+                template = Template('M', prefix, length, characters,
+                    mask=mask)
+                for i in range(10):
+                    suffix = ''.join(generator.choice(characters) for j in
+                        range(length))
+                    matrix = template.encode(suffix)
+                    self.assertEqual(decode(matrix), prefix + suffix)
+                    if mask is not None:
+                        self.assertEqual(matrix.mask, mask)
+
+    def test_version(self):
+        template = Template('H', 'SN', 4, version=7)
+        matrix = template.encode('0042')
+        self.assertEqual(matrix.version, 7)
+        self.assertEqual(decode(matrix), 'SN0042')
+
+    def test_bad_suffix(self):
+        template = Template('M', 'A', 4)
+        with self.assertRaises(ValueError):
+            template.encode('12345')
+        with self.assertRaises(ValueError):
+            template.encode('12A4')
+
+    def test_too_long(self):
+        with self.assertRaises(DataTooLongError):
+            Template('H', 'x' * 1300, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()